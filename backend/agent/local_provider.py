@@ -0,0 +1,71 @@
+import os
+import uuid
+import asyncio
+import logging
+from typing import Optional
+
+from agent.prompts import SQLCODER_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SQL_MODEL = os.getenv("LOCAL_SQL_MODEL", "defog/sqlcoder-7b-2")
+
+# defog's SQLCoder prompt format; the schema block is DDL (prompts.SQLCODER_SCHEMA)
+SQLCODER_TEMPLATE = """### Task
+Generate a SQL query to answer [QUESTION]{question}[/QUESTION]
+
+### Database Schema
+The query will run on a database with the following schema:
+{schema}
+
+### Answer
+Given the database schema, here is the SQL query that answers [QUESTION]{question}[/QUESTION]
+[SQL]
+"""
+
+
+class LocalSQLProvider:
+    """
+    Text-to-SQL on a local SQLCoder model served by vLLM.
+
+    Used instead of the OpenAI API when LOCAL_MODEL=1. The async engine does
+    continuous batching, so concurrent agent requests share forward passes.
+    The model loads in a worker thread started from the app lifespan
+    (start), so the event loop keeps serving meanwhile; requests arriving
+    before it is ready wait for it.
+    """
+
+    def __init__(self, model: str = LOCAL_SQL_MODEL, quantization: Optional[str] = "awq"):
+        self.model = model
+        self.quantization = quantization
+        self._engine = None
+        self._sampling_params = None
+        self._loading: Optional[asyncio.Future] = None
+
+    def _load(self):
+        # Imported here so the API runs without vllm unless LOCAL_MODEL=1
+        from vllm import AsyncEngineArgs, AsyncLLMEngine, SamplingParams
+
+        logger.info(f"Loading local SQL model {self.model} (quantization={self.quantization})")
+        self._engine = AsyncLLMEngine.from_engine_args(
+            AsyncEngineArgs(model=self.model, quantization=self.quantization)
+        )
+        self._sampling_params = SamplingParams(temperature=0, max_tokens=200, stop=["[/SQL]"])
+
+    def start(self) -> asyncio.Future:
+        """Begin loading the model off the event loop (once; later calls return the same future)"""
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(asyncio.to_thread(self._load))
+        return self._loading
+
+    async def generate_sql(self, question: str) -> str:
+        await self.start()
+
+        prompt = SQLCODER_TEMPLATE.format(question=question, schema=SQLCODER_SCHEMA)
+        final = None
+        async for output in self._engine.generate(prompt, self._sampling_params, str(uuid.uuid4())):
+            final = output
+        return final.outputs[0].text.strip()
+
+
+local_provider = LocalSQLProvider() if os.getenv("LOCAL_MODEL") == "1" else None
@@ -1,7 +1,8 @@
-from typing import List
+import sys
+from typing import Any, Dict, Tuple
 
 # 10 Predefined Questions (Slovenian)
-PREDEFINED_QUESTIONS = [
+PREDEFINED_QUESTIONS: Tuple[str, ...] = (
     "Ali je parcela 123/4 v KO Center (1723) poplavno ogrožena?",
     "Kakšna je povprečna cena m2 v Ljubljani?",
     "Poišči parcele večje od 1000 m2 v Mariboru.",
@@ -12,10 +13,51 @@ PREDEFINED_QUESTIONS = [
     "Izračunaj potencialni davek za to nepremičnino.",
     "Primerjaj ceno te parcele s sosednjimi.",
     "Ali so na parceli vpisana bremena?"
-]
+)
+
+# Hand-written SQL for the predefined questions the schema can answer, keyed by
+# index into PREDEFINED_QUESTIONS: (SQL with bind params, default params).
+# These run directly without the LLM; the rest fall back to text-to-SQL.
+PREDEFINED_SQL: Dict[int, Tuple[str, Dict[str, Any]]] = {
+    0: (
+        "SELECT w.type, w.name, ST_Distance(p.geom, w.geom) AS distance_m "
+        "FROM parcele p JOIN water_bodies w ON ST_DWithin(p.geom, w.geom, :radius_m) "
+        "WHERE p.parcela_stevilka = :parcela_stevilka AND p.ko_sifra = :ko_sifra "
+        "ORDER BY distance_m LIMIT 5",
+        {"parcela_stevilka": "123/4", "ko_sifra": "1723", "radius_m": 100},
+    ),
+    1: (
+        "SELECT ROUND(AVG(t.price_m2)::numeric, 2) AS povprecna_cena_m2, COUNT(*) AS st_poslov "
+        "FROM transactions t JOIN parcele p ON ST_Intersects(p.geom, t.geom) "
+        "WHERE p.ko_ime ILIKE '%' || :ko_ime || '%'",
+        {"ko_ime": "Ljubljana"},
+    ),
+    2: (
+        "SELECT id, parcela_stevilka, ko_ime, povrsina FROM parcele "
+        "WHERE povrsina > :min_povrsina AND ko_ime ILIKE '%' || :ko_ime || '%' "
+        "ORDER BY povrsina DESC LIMIT 100",
+        {"min_povrsina": 1000, "ko_ime": "Maribor"},
+    ),
+    3: (
+        "SELECT DISTINCT n.parcela_stevilka, l.ime, l.pravica "
+        "FROM parcele p JOIN parcele n ON n.id <> p.id AND ST_Touches(p.geom, n.geom) "
+        "JOIN lastniki l ON l.parcela_id = n.id "
+        "WHERE p.parcela_stevilka = :parcela_stevilka LIMIT 100",
+        {"parcela_stevilka": "500/1"},
+    ),
+    6: (
+        "SELECT date_trunc('month', date) AS mesec, ROUND(AVG(price_m2)::numeric, 2) AS povprecna_cena_m2, "
+        "COUNT(*) AS st_poslov FROM transactions "
+        "WHERE date >= CURRENT_DATE - make_interval(months => :months) GROUP BY 1 ORDER BY 1",
+        {"months": 6},
+    ),
+}
 
 # System Prompt for the AI Agent
-SYSTEM_PROMPT = """
+# Kept byte-identical across requests (no f-strings, no timestamps) and longer
+# than 1024 tokens so the provider can cache it as a prompt prefix.
+# The user question is always sent last, in its own message.
+SYSTEM_PROMPT = sys.intern("""
 You are an expert SQL Assistant for the GNEP (Geodetic Real Estate Platform) database.
 Your role is to translate natural language questions (mostly in Slovenian) into executable PostgreSQL queries.
 
@@ -24,22 +66,39 @@ Your role is to translate natural language questions (mostly in Slovenian) into
 1. Table: `parcele`
    - id (int)
    - parcela_stevilka (text) - e.g. "123/4"
+   - ko_sifra (text) - Cadastral municipality code, e.g. "1723"
    - ko_ime (text) - Cadastral municipality name
    - povrsina (int) - Area in m2
    - geom (geometry) - PostGIS geometry
 
-2. Table: `water_bodies` (Hydrography)
+2. Table: `stavbe` (Buildings)
+   - id (int)
+   - parcela_id (int) - References parcele.id
+   - leto_izgradnje (int) - Construction year
+   - neto_tloris (float) - Net floor area in m2
+   - stevilo_etaz (int) - Number of floors
+   - tip (text) - Building type, e.g. "Stanovanjska stavba"
+   - naslov_ulica (text), naslov_hisna_st (text), naslov_naselje (text)
+
+3. Table: `lastniki` (Owners)
+   - id (int)
+   - parcela_id (int) - References parcele.id
+   - ime (text) - Owner name
+   - vrsta (text) - "fizična oseba" or "pravna oseba"
+   - pravica (text) - Type of right, e.g. "lastništvo", "služnost"
+
+4. Table: `water_bodies` (Hydrography)
    - id (int)
-   - type (text) - e.g. "tekoce_vode", "stojece_vode"
+   - type (text) - e.g. "RUNNING_WATER", "STANDING_WATER", "WETLAND", "SEA"
    - name (text)
    - geom (geometry)
 
-3. Table: `transactions` (Real Estate Sales)
+5. Table: `transactions` (Real Estate Sales)
    - id (int)
    - price (float)
    - date (date)
    - price_m2 (float)
-   - geom_wkt (text)
+   - geom (geometry Point, EPSG:3794)
 
 ## RULES:
 
@@ -49,4 +108,82 @@ Your role is to translate natural language questions (mostly in Slovenian) into
 4. If a user asks about flood risk, check intersections with `water_bodies`.
 5. Assume the user speaks Slovenian, but column names are often mixed (Slo/Eng).
 6. NEVER Generate DELETE, DROP, or UPDATE queries. READ-ONLY Access.
-"""
+7. All geometries use the Slovenian grid D96/TM (EPSG:3794), so distances are in meters.
+8. Match municipality names with ILIKE (e.g. ko_ime ILIKE '%Maribor%').
+9. Always add a LIMIT (at most 100 rows) to queries that return individual rows.
+
+## EXAMPLES:
+
+Question: Ali je parcela 123/4 v KO Center (1723) poplavno ogrožena?
+SQL: SELECT w.type, w.name, ST_Distance(p.geom, w.geom) AS distance_m FROM parcele p JOIN water_bodies w ON ST_DWithin(p.geom, w.geom, 100) WHERE p.parcela_stevilka = '123/4' AND p.ko_sifra = '1723' ORDER BY distance_m LIMIT 5;
+
+Question: Kakšna je povprečna cena m2 v Ljubljani?
+SQL: SELECT ROUND(AVG(t.price_m2)::numeric, 2) AS povprecna_cena_m2, COUNT(*) AS st_poslov FROM transactions t JOIN parcele p ON ST_Intersects(p.geom, t.geom) WHERE p.ko_ime ILIKE '%Ljubljana%';
+
+Question: Poišči parcele večje od 1000 m2 v Mariboru.
+SQL: SELECT id, parcela_stevilka, ko_ime, povrsina FROM parcele WHERE povrsina > 1000 AND ko_ime ILIKE '%Maribor%' ORDER BY povrsina DESC LIMIT 100;
+
+Question: Kdo so lastniki sosednjih parcel parcele 500/1?
+SQL: SELECT DISTINCT n.parcela_stevilka, l.ime, l.pravica FROM parcele p JOIN parcele n ON n.id <> p.id AND ST_Touches(p.geom, n.geom) JOIN lastniki l ON l.parcela_id = n.id WHERE p.parcela_stevilka = '500/1' LIMIT 100;
+
+Question: Kakšni so trendi cen v zadnjih 6 mesecih?
+SQL: SELECT date_trunc('month', date) AS mesec, ROUND(AVG(price_m2)::numeric, 2) AS povprecna_cena_m2, COUNT(*) AS st_poslov FROM transactions WHERE date >= CURRENT_DATE - INTERVAL '6 months' GROUP BY 1 ORDER BY 1;
+
+Question: Koliko stavb je v KO Bled in kakšna je njihova povprečna neto površina?
+SQL: SELECT COUNT(s.id) AS st_stavb, ROUND(AVG(s.neto_tloris)::numeric, 1) AS povprecni_tloris_m2 FROM stavbe s JOIN parcele p ON p.id = s.parcela_id WHERE p.ko_ime ILIKE '%Bled%';
+
+Question: Katere hiše v Kranju so bile zgrajene po letu 2010?
+SQL: SELECT p.parcela_stevilka, s.leto_izgradnje, s.neto_tloris, s.naslov_ulica, s.naslov_hisna_st FROM stavbe s JOIN parcele p ON p.id = s.parcela_id WHERE s.leto_izgradnje > 2010 AND s.tip ILIKE '%stanovanjska%' AND p.ko_ime ILIKE '%Kranj%' LIMIT 100;
+""")
+
+# Built once and shared by every completion request
+SYSTEM_PROMPT_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+
+# The tables of SYSTEM_PROMPT's schema section as DDL, the "Database Schema"
+# block SQLCoder (agent/local_provider.py) is trained on; rules and examples
+# are for the chat models only
+SQLCODER_SCHEMA = """
+CREATE TABLE parcele (
+  id INTEGER PRIMARY KEY,
+  parcela_stevilka TEXT, -- Parcel number, e.g. '123/4'
+  ko_sifra TEXT, -- Cadastral municipality code, e.g. '1723'
+  ko_ime TEXT, -- Cadastral municipality name
+  povrsina INTEGER, -- Area in m2
+  geom GEOMETRY -- PostGIS geometry, EPSG:3794 (meters)
+);
+
+CREATE TABLE stavbe ( -- Buildings
+  id INTEGER PRIMARY KEY,
+  parcela_id INTEGER REFERENCES parcele(id),
+  leto_izgradnje INTEGER, -- Construction year
+  neto_tloris FLOAT, -- Net floor area in m2
+  stevilo_etaz INTEGER, -- Number of floors
+  tip TEXT, -- Building type, e.g. 'Stanovanjska stavba'
+  naslov_ulica TEXT,
+  naslov_hisna_st TEXT,
+  naslov_naselje TEXT
+);
+
+CREATE TABLE lastniki ( -- Owners
+  id INTEGER PRIMARY KEY,
+  parcela_id INTEGER REFERENCES parcele(id),
+  ime TEXT, -- Owner name
+  vrsta TEXT, -- 'fizična oseba' or 'pravna oseba'
+  pravica TEXT -- Type of right, e.g. 'lastništvo', 'služnost'
+);
+
+CREATE TABLE water_bodies ( -- Hydrography
+  id INTEGER PRIMARY KEY,
+  type TEXT, -- 'RUNNING_WATER', 'STANDING_WATER', 'WETLAND' or 'SEA'
+  name TEXT,
+  geom GEOMETRY -- EPSG:3794
+);
+
+CREATE TABLE transactions ( -- Real estate sales
+  id INTEGER PRIMARY KEY,
+  price FLOAT,
+  date DATE,
+  price_m2 FLOAT,
+  geom GEOMETRY -- Point, EPSG:3794
+);
+""".strip()
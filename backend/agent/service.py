@@ -1,96 +1,468 @@
 import os
+import re
+import json
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
+from collections import OrderedDict
+from typing import Optional, List
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
 from sqlalchemy import text
 from fastapi import HTTPException
-from agent.prompts import SYSTEM_PROMPT
+from database.connection import readonly_role_configured
+from agent.prompts import SYSTEM_PROMPT, SYSTEM_PROMPT_MSG, PREDEFINED_QUESTIONS, PREDEFINED_SQL
+from agent.local_provider import local_provider
 
 logger = logging.getLogger(__name__)
 
+SQL_MODEL = local_provider.model if local_provider else "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMS = 1536
+
+# Cache keys depend on the prompt version, not its full text: hash it once at import
+SYSTEM_PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()
+
+# Whole words only, so columns such as updated_at or created_by stay allowed
+_FORBIDDEN_RE = re.compile(
+    r"\b(?:DROP|DELETE|UPDATE|INSERT|ALTER|TRUNCATE|GRANT|CREATE|COPY|EXECUTE)\b",
+    re.IGNORECASE
+)
+
+
+async def _discard(task: asyncio.Task):
+    """Cancel a task and wait for it, so it finishes before the request does"""
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        # Expected from task itself; a cancel aimed at the awaiting request must propagate
+        if asyncio.current_task().cancelling():
+            raise
+    except Exception:
+        pass  # Already failed (e.g. no connection): the caller raises its own error
+
+
+class LLMCache:
+    """
+    Cache of generated SQL keyed on (model, system prompt, normalized question).
+
+    Completions run with temperature=0, so the same question always yields the
+    same SQL. Entries live in an in-process LRU; when REDIS_URL is set they are
+    also shared across workers through Redis.
+    """
+
+    def __init__(self, maxsize: int = 1024, redis_url: Optional[str] = None, ttl: int = 86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._redis = None
+
+        if redis_url:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.Redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("REDIS_URL is set but redis is not installed. Using in-process cache only.")
+
+    @staticmethod
+    def cache_key(model: str, question: str) -> str:
+        payload = json.dumps(
+            {"model": model, "sys": SYSTEM_PROMPT_HASH, "q": question.strip().lower()},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(f"sql:{key}")
+            except Exception as e:
+                logger.warning(f"Redis cache read failed: {e}")
+                return None
+            if value is not None:
+                value = value.decode()
+                self._remember(key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value: str):
+        self._remember(key, value)
+        if self._redis is not None:
+            try:
+                await self._redis.setex(f"sql:{key}", self.ttl, value)
+            except Exception as e:
+                logger.warning(f"Redis cache write failed: {e}")
+
+    def _remember(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of (question embedding -> SQL) pairs.
+
+    Catches paraphrases the exact-match cache misses ("cena m2 v LJ" vs
+    "povprečna cena kvadrata Ljubljana"): one embedding call replaces a chat
+    completion when cosine similarity reaches the threshold. Vectors are kept
+    unit-normalized in float32 (the query's dtype, so a lookup is one BLAS
+    matrix-vector product with no upcast copy) in a buffer that doubles up to
+    max_entries and then overwrites the oldest slot. Entries are keyed on the
+    normalized question: asking it again replaces its slot instead of adding
+    a duplicate.
+
+    Persisting to path (ordering and serialization included) runs in a worker
+    thread, every save_every adds and at shutdown. While a save reads the
+    buffer, the next add writes to a copy instead.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 10000, path: Optional[str] = None,
+                 save_every: int = 50):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.save_every = save_every
+        self._vectors = np.empty((min(256, max_entries), EMBEDDING_DIMS), dtype=np.float32)
+        self._questions: List[str] = []
+        self._sql: List[str] = []
+        self._slots: dict[str, int] = {}
+        self._next = 0  # Slot overwritten next once the buffer is full
+        self._unsaved = 0
+        self._save_task: Optional[asyncio.Task] = None
+        self._saving: Optional[np.ndarray] = None  # Buffer a running save reads
+
+        if path:
+            self._load()
+
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        if not self._sql:
+            return None
+        similarities = self._vectors[:len(self._sql)] @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return self._sql[best]
+        return None
+
+    def add(self, question: str, embedding: List[float], sql: str):
+        key = self._key(question)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._claim_slot()
+            self._slots[key] = slot
+        if self._vectors is self._saving:
+            self._vectors = self._vectors.copy()
+        self._vectors[slot] = self._normalize(embedding)
+        self._questions[slot] = key
+        self._sql[slot] = sql
+
+        self._unsaved += 1
+        if self.path and self._unsaved >= self.save_every and (self._save_task is None or self._save_task.done()):
+            self._save_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Persist unsaved entries to path in a worker thread"""
+        task = self._save_task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            await task  # One save at a time (shutdown flush after a periodic one)
+        if not self.path or not self._unsaved:
+            return
+        self._unsaved = 0
+        # Only references and list copies here; the thread reorders and writes
+        self._saving = self._vectors
+        try:
+            await asyncio.to_thread(
+                self._save, self.path, self._vectors, list(self._questions), list(self._sql), self._next
+            )
+        finally:
+            self._saving = None
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return question.strip().lower()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _claim_slot(self) -> int:
+        size = len(self._sql)
+        if size < self.max_entries:
+            if size == len(self._vectors):
+                grown = np.empty((min(2 * size, self.max_entries), EMBEDDING_DIMS), dtype=np.float32)
+                grown[:size] = self._vectors
+                self._vectors = grown
+            self._questions.append("")
+            self._sql.append("")
+            return size
+        # Full: evict the oldest entry
+        slot = self._next
+        self._next = (slot + 1) % self.max_entries
+        del self._slots[self._questions[slot]]
+        return slot
+
+    def _load(self):
+        try:
+            vectors = np.load(f"{self.path}.npy")
+            with open(f"{self.path}.json", "r", encoding="utf-8") as f:
+                entries = [(str(question), str(sql)) for question, sql in json.load(f)]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Could not load semantic cache from {self.path}: {e}")
+            return
+        if len(vectors) != len(entries):
+            return
+        for vector, (question, sql) in zip(vectors, entries):
+            slot = self._slots.get(question)
+            if slot is None:
+                slot = self._slots[question] = self._claim_slot()
+            self._vectors[slot] = vector
+            self._questions[slot] = question
+            self._sql[slot] = sql
+
+    @staticmethod
+    def _save(path: str, vectors: np.ndarray, questions: List[str], sql: List[str], start: int):
+        # Oldest first (the ring starts at start once full), so a reload evicts in the same order
+        size = len(sql)
+        order = [(start + i) % size for i in range(size)]
+        try:
+            np.save(f"{path}.npy", vectors[order])
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                json.dump([(questions[i], sql[i]) for i in order], f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"Could not persist semantic cache to {path}: {e}")
+
+
+# Shared across requests (AgentService is created per request)
+sql_cache = LLMCache(redis_url=os.getenv("REDIS_URL"))
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    path=os.getenv("SEMANTIC_CACHE_PATH")
+)
+
+# SQL for the predefined UI questions, filled by AgentService.prewarm()
+prewarmed_sql: dict[str, str] = {}
+
+
+def create_openai_client() -> Optional[AsyncOpenAI]:
+    """
+    Build the process-wide OpenAI client (None without OPENAI_API_KEY)
+
+    Created once in the app lifespan and injected into every AgentService, so
+    requests reuse pooled keep-alive HTTP/2 connections instead of paying a
+    TLS handshake each.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    # Configure Client (Support for Vercel AI Gateway)
+    if not api_key:
+        logger.warning("OPENAI_API_KEY is not set. Agent will not function.")
+        return None
+
+    # Vercel AI Gateway support
+    # Note: vck_ keys often require the gateway URL. 
+    # If the user is using a pure Vercel AI SDK key, it might need 'https://gateway.ai.vercel.dev/v1' 
+    # but some specific integrations use other URLs.
+    base_url = None
+    if api_key.startswith("vck_"):
+        logger.info("Detected Vercel AI Gateway Key.")
+        base_url = "https://gateway.ai.vercel.dev/v1"
+
+    logger.info(f"Initializing OpenAI Client with {'custom base_url' if base_url else 'defualt base_url'}")
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+    )
+
+
 class AgentService:
-    def __init__(self, db_session):
+    def __init__(self, db_session, client: Optional[AsyncOpenAI] = None):
         self.db = db_session
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        
-        # Configure Client (Support for Vercel AI Gateway)
-        if not self.api_key:
-            logger.warning("OPENAI_API_KEY is not set. Agent will not function.")
-            self.client = None
-        else:
-            # Vercel AI Gateway support
-            # Note: vck_ keys often require the gateway URL. 
-            # If the user is using a pure Vercel AI SDK key, it might need 'https://gateway.ai.vercel.dev/v1' 
-            # but some specific integrations use other URLs.
-            base_url = None
-            if self.api_key.startswith("vck_"):
-                logger.info("Detected Vercel AI Gateway Key.")
-                base_url = "https://gateway.ai.vercel.dev/v1"
-            
-            logger.info(f"Initializing OpenAI Client with {'custom base_url' if base_url else 'defualt base_url'}")
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=base_url
-            )
+        # Shared client from create_openai_client(); None disables OpenAI calls
+        self.client = client
 
-    def process_query(self, user_question: str):
+        # A local SQLCoder model (LOCAL_MODEL=1) works without an API key;
+        # the OpenAI client is then only used for semantic-cache embeddings
+        self.available = self.client is not None or local_provider is not None
+
+    async def process_query(self, user_question: Optional[str], question_id: Optional[int] = None, params: Optional[dict] = None):
         """
         1. Convert User Question -> SQL (using GPT-4o-mini)
         2. Execute SQL (Locally)
         3. Return Results (Raw)
+
+        Predefined questions (by question_id or exact text) with a hand-written
+        template skip the LLM and run with bound params.
         """
-        if not self.api_key:
+        if question_id is None and user_question in PREDEFINED_QUESTIONS:
+            question_id = PREDEFINED_QUESTIONS.index(user_question)
+        if question_id is not None:
+            if not 0 <= question_id < len(PREDEFINED_QUESTIONS):
+                raise HTTPException(status_code=400, detail="Unknown question_id")
+            if question_id in PREDEFINED_SQL:
+                return await self._run_template(question_id, params or {})
+            user_question = PREDEFINED_QUESTIONS[question_id]
+
+        if not self.available:
             raise HTTPException(status_code=503, detail="AI Service unavailable (Missing API Key)")
 
-        # 1. Generate SQL
+        # Check out the pooled connection while the SQL is being generated
+        connection_task = asyncio.create_task(self.db.connection())
+
+        # 1. Generate SQL (predefined questions are translated at startup)
+        embedding = None
         try:
-            sql_query = self._generate_sql(user_question)
+            sql_query = prewarmed_sql.get(user_question)
+            if sql_query is None:
+                sql_query = await sql_cache.get(LLMCache.cache_key(SQL_MODEL, user_question))
+            if sql_query is None:
+                embedding = await self._embed(user_question)
+                if embedding is not None:
+                    sql_query = semantic_cache.lookup(embedding)
+                    if sql_query is not None:
+                        embedding = None  # Hit: nothing to write back
+            if sql_query is None:
+                sql_query = await self._generate_sql(user_question)
             logger.info(f"Generated SQL: {sql_query}")
         except Exception as e:
             logger.error(f"OpenAI Error: {e}")
+            await _discard(connection_task)
             raise HTTPException(status_code=500, detail="Failed to interpret question.")
 
-        # 2. Execute SQL (Read-Only Safety Check)
-        if not self._is_safe_sql(sql_query):
+        # 2. Execute SQL. With the read-only role Postgres enforces safety itself;
+        # the keyword filter is only a fallback for deployments without it.
+        if not readonly_role_configured() and not self._is_safe_sql(sql_query):
+            await _discard(connection_task)
             raise HTTPException(status_code=400, detail="Unsafe query formulation.")
 
         try:
-            result = self.db.execute(text(sql_query))
-            rows = result.fetchall()
-            columns = result.keys()
+            await connection_task
+            result = await self.db.execute(text(sql_query))
+            rows = [dict(row) for row in result.mappings()]
+
+            if embedding is not None:
+                semantic_cache.add(user_question, embedding, sql_query)
             
             return {
                 "question": user_question,
                 "sql": sql_query,
-                "result": [dict(zip(columns, row)) for row in rows]
+                "result": rows
             }
 
         except Exception as e:
             logger.error(f"SQL Execution Error: {e}")
             raise HTTPException(status_code=400, detail=f"Database query failed: {str(e)}")
 
-    def _generate_sql(self, question: str) -> str:
+    async def _run_template(self, question_id: int, params: dict):
+        """Execute a predefined SQL template; only known params override the defaults"""
+        sql_query, defaults = PREDEFINED_SQL[question_id]
+        bound = {name: params.get(name, default) for name, default in defaults.items()}
+
+        try:
+            result = await self.db.execute(text(sql_query), bound)
+            rows = [dict(row) for row in result.mappings()]
+        except Exception as e:
+            logger.error(f"SQL Execution Error: {e}")
+            raise HTTPException(status_code=400, detail=f"Database query failed: {str(e)}")
+
+        return {
+            "question": PREDEFINED_QUESTIONS[question_id],
+            "sql": sql_query,
+            "params": bound,
+            "result": rows
+        }
+
+    async def prewarm(self):
+        """Translate the predefined UI questions concurrently so button clicks skip the LLM"""
+        questions = [q for i, q in enumerate(PREDEFINED_QUESTIONS) if i not in PREDEFINED_SQL]
+        results = await asyncio.gather(
+            *[self._generate_sql(question) for question in questions],
+            return_exceptions=True
+        )
+        for question, sql in zip(questions, results):
+            if isinstance(sql, Exception):
+                logger.warning(f"Prewarm failed for '{question}': {sql}")
+            else:
+                prewarmed_sql[question] = sql
+        logger.info("Agent SQL cache prewarmed")
+
+    async def _embed(self, question: str) -> Optional[List[float]]:
+        """Embed the normalized question for the semantic cache (None if the provider has no embeddings)"""
+        if self.client is None:
+            return None
+        try:
+            response = await self.client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=question.strip().lower()
+            )
+            return response.data[0].embedding
+        except Exception as e:
+            logger.warning(f"Embedding failed, skipping semantic cache: {e}")
+            return None
+
+    async def _generate_sql(self, question: str) -> str:
         """Call OpenAI (or Vercel Gateway) to translate question to SQL"""
+        key = LLMCache.cache_key(SQL_MODEL, question)
+        cached = await sql_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if local_provider is not None:
+            sql = await local_provider.generate_sql(question)
+            sql = sql.replace("```sql", "").replace("```", "").strip()
+            await sql_cache.set(key, sql)
+            return sql
+
         # Vercel Gateway requires specific model names sometimes, but standard usually work.
         # Ensure we use a cheap model.
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini", 
+        # Streamed so tokens arrive while the DB connection is being checked out
+        stream = await self.client.chat.completions.create(
+            model=SQL_MODEL, 
             messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
+                SYSTEM_PROMPT_MSG,
                 {"role": "user", "content": question}
             ],
             temperature=0,
-            max_tokens=200
+            max_tokens=200,
+            stream=True,
+            stream_options={"include_usage": True}
         )
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if chunk.usage is not None:
+                self._log_prompt_cache(chunk)
+
         # Clean up response (remove markdown if present)
-        sql = response.choices[0].message.content.strip()
+        sql = "".join(parts).strip()
         sql = sql.replace("```sql", "").replace("```", "").strip()
+        await sql_cache.set(key, sql)
         return sql
 
+    def _log_prompt_cache(self, response):
+        """Log how much of the (static) system prompt was served from the provider's prompt cache"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        logger.info(f"Prompt tokens: {usage.prompt_tokens} (cached: {cached_tokens})")
+
     def _is_safe_sql(self, sql: str) -> bool:
         """Basic safety check"""
-        forbidden = ["DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "TRUNCATE", "GRANT"]
-        upper_sql = sql.upper()
-        for term in forbidden:
-            if term in upper_sql:
-                return False
-        return True
+        return _FORBIDDEN_RE.search(sql) is None
@@ -1,5 +1,4 @@
 
-from sqlalchemy import create_engine, text
 import os
 import sys
 
@@ -7,15 +6,24 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-if not DATABASE_URL:
-    print("DATABASE_URL missing")
-    sys.exit(1)
+_engine = None
 
-engine = create_engine(DATABASE_URL)
 
-def run_diagnostic():
+def get_engine():
+    """Create the engine on first use (reused when imported as a library)"""
+    global _engine
+    if _engine is None:
+        # Imported here so a missing DATABASE_URL exits without loading SQLAlchemy
+        from sqlalchemy import create_engine
+        _engine = create_engine(DATABASE_URL)
+    return _engine
+
+
+def run_diagnostic() -> int:
+    from sqlalchemy import text
+
     try:
-        with engine.connect() as conn:
+        with get_engine().connect() as conn:
             print("--- Extension Diagnostic ---")
             result = conn.execute(text("SELECT extname FROM pg_extension;")).fetchall()
             extensions = [r[0] for r in result]
@@ -42,9 +50,14 @@ def run_diagnostic():
             print("\n--- Search Path ---")
             path = conn.execute(text("SHOW search_path;")).fetchone()
             print(f"Search Path: {path[0]}")
+            return 0
 
     except Exception as e:
         print(f"❌ Global Diagnostic Error: {e}")
+        return 1
 
 if __name__ == "__main__":
-    run_diagnostic()
+    if not DATABASE_URL:
+        print("DATABASE_URL missing")
+        sys.exit(1)
+    sys.exit(run_diagnostic())
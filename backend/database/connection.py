@@ -4,13 +4,15 @@ Handles PostgreSQL/PostGIS connections using SQLAlchemy
 """
 
 import os
-from contextlib import contextmanager
-from typing import Generator
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from typing import Generator, AsyncGenerator
 
-from sqlalchemy import create_engine, event
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,8 +23,12 @@ class DatabaseConfig:
     """Database configuration from environment variables"""
     
     def __init__(self):
+        # PgBouncer (transaction pooling) takes precedence when configured
+        pgbouncer_url = os.getenv('PGBOUNCER_URL')
+        self.uses_pgbouncer = bool(pgbouncer_url)
+
         # Check for DATABASE_URL first (Railway, Render, Heroku style)
-        database_url = os.getenv('DATABASE_URL')
+        database_url = pgbouncer_url or os.getenv('DATABASE_URL')
         
         if database_url:
             # Normalize postgres:// to postgresql:// for SQLAlchemy 1.4+ compatibility
@@ -40,6 +46,12 @@ class DatabaseConfig:
             self.password = os.getenv('DB_PASSWORD', '')
             self.echo = os.getenv('DB_ECHO', 'false').lower() == 'true'
             self._connection_string = None
+
+        # Optional SELECT-only role for AI agent queries (see database/readonly_role.sql)
+        readonly_url = os.getenv('DATABASE_URL_READONLY')
+        if readonly_url and readonly_url.startswith("postgres://"):
+            readonly_url = readonly_url.replace("postgres://", "postgresql://", 1)
+        self.readonly_connection_string = readonly_url
     
     @property
     def connection_string(self) -> str:
@@ -51,11 +63,39 @@ class DatabaseConfig:
             f"{self.host}:{self.port}/{self.database}"
         )
 
+    @property
+    def async_connection_string(self) -> str:
+        """Connection string for the asyncpg driver (used by the async engine)"""
+        return self.connection_string.replace("postgresql://", "postgresql+asyncpg://", 1)
+
 
 # Global engine and session factory
 _engine: Engine = None
 _SessionFactory: sessionmaker = None
 
+# Connection budget per worker and engine: N uvicorn workers x (POOL_SIZE +
+# MAX_OVERFLOW) per pool must stay below Postgres max_connections
+POOL_SIZE = 5
+MAX_OVERFLOW = 5
+
+# Per-connection prepared-statement LRU (asyncpg); hot endpoints reuse a few fixed
+# statements, so Postgres parses and plans each of them once per connection
+STATEMENT_CACHE_SIZE = 1024
+
+# Global async engine and session factory (API request path)
+_async_engine: AsyncEngine = None
+_AsyncSessionFactory: async_sessionmaker = None
+
+# Global read-only async engine and session factory (AI agent queries)
+_readonly_engine: AsyncEngine = None
+_ReadonlySessionFactory: async_sessionmaker = None
+
+# Applied on every read-only connection in addition to the role defaults
+READONLY_SERVER_SETTINGS = {
+    "statement_timeout": "5000",
+    "default_transaction_read_only": "on",
+}
+
 
 def initialize_database(config: DatabaseConfig = None) -> Engine:
     """
@@ -73,13 +113,17 @@ def initialize_database(config: DatabaseConfig = None) -> Engine:
         config = DatabaseConfig()
     
     # Create engine with connection pooling
+    # Kept small per worker (POOL_SIZE, MAX_OVERFLOW). Connections are pre-pinged
+    # on checkout unless PgBouncer is in front (it replaces dead server connections
+    # itself); direct connections, as on Render, would otherwise fail the request.
     _engine = create_engine(
         config.connection_string,
         echo=config.echo,
         poolclass=QueuePool,
-        pool_size=10,
-        max_overflow=20,
-        pool_pre_ping=True,  # Verify connections before using
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_recycle=300,
+        pool_pre_ping=not config.uses_pgbouncer,
     )
     
     # PostGIS extension - Railway PostgreSQL already has it installed
@@ -150,6 +194,218 @@ def session_scope() -> Generator[Session, None, None]:
         session.close()
 
 
+def initialize_async_database(config: DatabaseConfig = None) -> AsyncEngine:
+    """
+    Initialize async (asyncpg) engine and session factory
+
+    The sync engine stays in use for the ORM matcher and import scripts;
+    request handlers that only run SQL use this engine so DB waits yield
+    the event loop instead of blocking a worker thread.
+
+    Args:
+        config: DatabaseConfig instance (uses default if None)
+
+    Returns:
+        SQLAlchemy AsyncEngine instance
+    """
+    global _async_engine, _AsyncSessionFactory
+
+    if config is None:
+        config = DatabaseConfig()
+
+    url = make_url(config.async_connection_string)
+    url = url.update_query_dict({"prepared_statement_cache_size": str(STATEMENT_CACHE_SIZE)})
+    connect_args = {"statement_cache_size": STATEMENT_CACHE_SIZE}
+    if config.uses_pgbouncer:
+        # Transaction pooling can hand each statement a different server
+        # connection, so neither asyncpg nor SQLAlchemy may cache prepared statements
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+
+    _async_engine = create_async_engine(
+        url,
+        echo=config.echo,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_recycle=300,
+        pool_pre_ping=not config.uses_pgbouncer,
+        connect_args=connect_args,
+    )
+
+    _AsyncSessionFactory = async_sessionmaker(_async_engine, expire_on_commit=False)
+
+    return _async_engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Get async database engine (initializes if needed)
+
+    Returns:
+        SQLAlchemy AsyncEngine instance
+    """
+    if _async_engine is None:
+        initialize_async_database()
+    return _async_engine
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide a transactional scope for async database operations
+
+    Usage:
+        async with async_session_scope() as session:
+            result = await session.execute(text("SELECT 1"))
+
+    Yields:
+        SQLAlchemy AsyncSession instance
+    """
+    if _AsyncSessionFactory is None:
+        initialize_async_database()
+
+    async with _AsyncSessionFactory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+def initialize_readonly_database(config: DatabaseConfig = None) -> AsyncEngine:
+    """
+    Initialize the read-only async engine used for AI-generated SQL
+
+    Only created when DATABASE_URL_READONLY is set. The role it connects as
+    has SELECT grants only, and every connection runs with a 5s statement
+    timeout and read-only transactions, so safety is enforced by Postgres.
+
+    Args:
+        config: DatabaseConfig instance (uses default if None)
+
+    Returns:
+        SQLAlchemy AsyncEngine instance, or None if no read-only URL is configured
+    """
+    global _readonly_engine, _ReadonlySessionFactory
+
+    if config is None:
+        config = DatabaseConfig()
+
+    if not config.readonly_connection_string:
+        return None
+
+    _readonly_engine = create_async_engine(
+        make_url(
+            config.readonly_connection_string.replace("postgresql://", "postgresql+asyncpg://", 1)
+        ).update_query_dict({"prepared_statement_cache_size": str(STATEMENT_CACHE_SIZE)}),
+        echo=config.echo,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_recycle=300,
+        pool_pre_ping=not config.uses_pgbouncer,
+        # Sent in the startup packet, so no extra round trip per connection
+        connect_args={"server_settings": READONLY_SERVER_SETTINGS, "statement_cache_size": STATEMENT_CACHE_SIZE},
+    )
+
+    _ReadonlySessionFactory = async_sessionmaker(_readonly_engine, expire_on_commit=False)
+
+    return _readonly_engine
+
+
+async def _init_pg_connection(conn: "asyncpg.Connection"):
+    """Decode json columns (e.g. ST_AsGeoJSON(...)::json) straight to dicts"""
+    # API-only dependency, like asyncpg (see create_pg_pool)
+    import orjson
+
+    await conn.set_type_codec(
+        'json',
+        encoder=lambda value: orjson.dumps(value).decode(),
+        decoder=orjson.loads,
+        schema='pg_catalog'
+    )
+
+
+async def create_pg_pool(config: DatabaseConfig = None) -> "asyncpg.Pool":
+    """
+    Create a raw asyncpg pool for the hot read-only endpoints (point lookup, tiles)
+
+    These run a single fixed statement per request, so they skip the
+    SQLAlchemy session layer entirely. Connections open on first use
+    (min_size=0), so an unreachable database doesn't stop the app from
+    starting, and the pool stays within the POOL_SIZE budget.
+
+    Args:
+        config: DatabaseConfig instance (uses default if None)
+
+    Returns:
+        asyncpg Pool instance
+    """
+    # Imported here: the import scripts use this module without the API's asyncpg
+    import asyncpg
+
+    if config is None:
+        config = DatabaseConfig()
+
+    # PgBouncer transaction pooling cannot keep server-side prepared statements
+    statement_cache_size = 0 if config.uses_pgbouncer else STATEMENT_CACHE_SIZE
+
+    return await asyncpg.create_pool(
+        config.connection_string,
+        min_size=0,
+        max_size=POOL_SIZE,
+        max_inactive_connection_lifetime=600,
+        statement_cache_size=statement_cache_size,
+        init=_init_pg_connection,
+    )
+
+
+def readonly_role_configured() -> bool:
+    """True when agent queries run through the SELECT-only role"""
+    return _readonly_engine is not None
+
+
+@asynccontextmanager
+async def readonly_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide a scope for read-only agent queries
+
+    Uses the read-only engine when configured, otherwise falls back to the
+    regular async engine (callers must then filter the SQL themselves).
+
+    Yields:
+        SQLAlchemy AsyncSession instance
+    """
+    if _ReadonlySessionFactory is None:
+        async with async_session_scope() as session:
+            yield session
+        return
+
+    async with _ReadonlySessionFactory() as session:
+        try:
+            yield session
+        finally:
+            await session.rollback()
+
+
+def refresh_parcel_tiles(engine: Engine = None):
+    """
+    Rebuild the subdivided parcel tile source after parcele changes
+
+    CONCURRENTLY keeps tiles servable while the view is rebuilt; cached
+    tiles are invalidated afterwards.
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY parcele_tiles;"))
+        # Pre-rendered tiles are stale now; the nightly build and live misses refill them
+        conn.execute(text("TRUNCATE tile_cache;"))
+
+    from database.tile_cache import bump_tile_generation
+    bump_tile_generation()
+
+
 def test_connection() -> bool:
     """
     Test database connection
@@ -160,7 +416,7 @@ def test_connection() -> bool:
     try:
         engine = get_engine()
         with engine.connect() as conn:
-            result = conn.execute("SELECT version();")
+            result = conn.execute(text("SELECT version();"))
             row = result.fetchone()
             print(f"✓ Database connection successful: {row[0]}")
             return True
@@ -169,6 +425,23 @@ def test_connection() -> bool:
         return False
 
 
+async def test_async_connection() -> bool:
+    """
+    Test database connection through the async engine
+
+    Returns:
+        True if connection successful, False otherwise
+    """
+    try:
+        engine = get_async_engine()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT version();"))
+            return True
+    except Exception as e:
+        print(f"✗ Async database connection failed: {e}")
+        return False
+
+
 def check_database_setup(engine: Engine):
     """
     Verify database has PostGIS and SRID 3794 (Slovenian Grid)
@@ -0,0 +1,25 @@
+-- ============================================================
+-- Read-only role for AI agent queries
+-- Run once as a superuser with psql, passing the password in a variable:
+--   psql <DATABASE_URL> -v reader_password='<password>' -f backend/database/readonly_role.sql
+-- then set
+--   DATABASE_URL_READONLY=postgresql://gnep_reader:<password>@host:5432/<db>
+-- ============================================================
+
+\if :{?reader_password}
+\else
+    \echo 'reader_password is not set: run with -v reader_password=...'
+    \quit
+\endif
+
+CREATE ROLE gnep_reader LOGIN PASSWORD :'reader_password';
+
+-- DBNAME is psql's current database, so the script runs against any database name
+GRANT CONNECT ON DATABASE :"DBNAME" TO gnep_reader;
+GRANT USAGE ON SCHEMA public TO gnep_reader;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO gnep_reader;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO gnep_reader;
+
+-- Enforced server-side even if a client forgets to set them
+ALTER ROLE gnep_reader SET default_transaction_read_only = on;
+ALTER ROLE gnep_reader SET statement_timeout = '5s';
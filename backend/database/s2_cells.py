@@ -0,0 +1,57 @@
+"""
+S2 cell index for point-to-parcel lookups
+Maps WGS84 coordinates to level-15 S2 cell ids stored in parcele_cells
+"""
+
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import s2geometry as s2
+except ImportError:
+    try:
+        import pywraps2 as s2
+    except ImportError:
+        s2 = None
+
+# ~280 m cells: a typical parcel covers 1-4 of them, a cell holds a few dozen parcels
+S2_LEVEL = 15
+
+_INT64_WRAP = 1 << 64
+
+
+def _to_bigint(cell_id: int) -> int:
+    """S2 ids are unsigned 64-bit; Postgres BIGINT is signed"""
+    return cell_id - _INT64_WRAP if cell_id >= 1 << 63 else cell_id
+
+
+def s2_available() -> bool:
+    return s2 is not None
+
+
+def point_cell(lat: float, lng: float) -> Optional[int]:
+    """Cell id containing a point, or None when s2geometry is not installed"""
+    if s2 is None:
+        return None
+    cell = s2.S2CellId(s2.S2LatLng.FromDegrees(lat, lng)).parent(S2_LEVEL)
+    return _to_bigint(cell.id())
+
+
+def covering_cells(lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> List[int]:
+    """
+    Cell ids covering a parcel's bounding box
+
+    The bbox covering is a superset of the polygon covering; lookups verify
+    candidates with ST_Intersects anyway, so it only costs a few extra rows.
+    """
+    rect = s2.S2LatLngRect.FromPointPair(
+        s2.S2LatLng.FromDegrees(lat_min, lng_min),
+        s2.S2LatLng.FromDegrees(lat_max, lng_max)
+    )
+    coverer = s2.S2RegionCoverer()
+    coverer.set_min_level(S2_LEVEL)
+    coverer.set_max_level(S2_LEVEL)
+    coverer.set_max_cells(1000)
+    return [_to_bigint(cell.id()) for cell in coverer.GetCovering(rect)]
@@ -27,12 +27,87 @@ CREATE TABLE IF NOT EXISTS parcele (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     -- Indexes for faster queries
+    -- (the unique B-tree also serves agent lookups by parcela_stevilka + ko_sifra)
     CONSTRAINT unique_parcela UNIQUE (parcela_stevilka, ko_sifra)
 );
 
 -- Create spatial index on geometry
 CREATE INDEX IF NOT EXISTS idx_parcele_geom ON parcele USING GIST(geom);
 
+-- Composite GiST for spatial queries narrowed to one cadastral municipality
+-- (btree_gist supplies the GiST opclass for the VARCHAR column)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE INDEX IF NOT EXISTS idx_parcele_ko_sifra_geom ON parcele USING GIST(ko_sifra, geom);
+
+-- Web Mercator copy for vector tiles, reprojected once on write instead of per tile request
+ALTER TABLE parcele ADD COLUMN IF NOT EXISTS geom_3857 GEOMETRY(GEOMETRY, 3857)
+    GENERATED ALWAYS AS (ST_Transform(ST_Force2D(ST_SetSRID(geom, 3794)), 3857)) STORED;
+-- SP-GiST (quad-tree) beats GiST for tile-envelope && parcel lookups; compare
+-- with `python debug_mvt.py --explain` if swapping back
+DROP INDEX IF EXISTS idx_parcele_geom_3857;
+CREATE INDEX IF NOT EXISTS idx_parcele_geom_3857_spgist ON parcele USING SPGIST(geom_3857);
+
+-- Web delivery copy: simplified to ~1 m (finer than a parcel outline shows below
+-- zoom 18) and reprojected to WGS84 on write; GeoJSON responses read this
+-- instead of transforming the full-precision polygon per request
+ALTER TABLE parcele ADD COLUMN IF NOT EXISTS geom_web GEOMETRY(GEOMETRY, 4326)
+    GENERATED ALWAYS AS (ST_Transform(ST_SimplifyPreserveTopology(ST_Force2D(ST_SetSRID(geom, 3794)), 1.0), 4326)) STORED;
+
+-- Tile source: large parcels split into <=256-vertex pieces so each tile only
+-- touches small slices. Tile queries restitch pieces per parcel id.
+-- Refreshed by the parcel import scripts (refresh_parcel_tiles in connection.py).
+CREATE MATERIALIZED VIEW IF NOT EXISTS parcele_tiles AS
+SELECT p.id, s.piece, p.parcela_stevilka, p.ko_ime, s.geom_3857
+FROM parcele p,
+     LATERAL ST_Subdivide(p.geom_3857, 256) WITH ORDINALITY AS s(geom_3857, piece);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_parcele_tiles_id_piece ON parcele_tiles(id, piece);
+CREATE INDEX IF NOT EXISTS idx_parcele_tiles_geom ON parcele_tiles USING SPGIST(geom_3857);
+
+-- Renders one parcel vector tile; shared by /api/tiles and scripts/build_tile_cache.py
+-- (debug_mvt.py keeps an inline copy so EXPLAIN can see inside it)
+CREATE OR REPLACE FUNCTION parcel_mvt(z INTEGER, x INTEGER, y INTEGER)
+RETURNS BYTEA AS $$
+    WITH bounds AS (
+        -- Envelope computed once; the margin matches ST_AsMVTGeom's default 256/4096 buffer
+        SELECT ST_TileEnvelope($1, $2, $3) AS env,
+               ST_TileEnvelope($1, $2, $3, margin => 0.0625) AS env_margin
+    ),
+    parcels AS (
+        -- Restitch the subdivided pieces touching this tile into one feature per parcel
+        SELECT t.id, t.parcela_stevilka, t.ko_ime, ST_Union(t.geom_3857) AS geom_3857
+        FROM parcele_tiles t, bounds b
+        WHERE t.geom_3857 && b.env_margin
+        GROUP BY t.id, t.parcela_stevilka, t.ko_ime
+    ),
+    mvtgeom AS (
+        SELECT p.id, p.parcela_stevilka, p.ko_ime, ST_AsMVTGeom(p.geom_3857, b.env) AS geom
+        FROM parcels p, bounds b
+    )
+    SELECT ST_AsMVT(mvtgeom.*, 'default', 4096, 'geom')
+    FROM mvtgeom
+    WHERE geom IS NOT NULL;
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
+
+-- Pre-rendered tiles (zoom 14+): filled nightly by scripts/build_tile_cache.py and on
+-- live misses over parcels (empty tiles are never stored), emptied by
+-- refresh_parcel_tiles() when parcels change
+CREATE TABLE IF NOT EXISTS tile_cache (
+    z INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    mvt BYTEA NOT NULL,
+    rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (z, x, y)
+);
+
+-- Level-15 S2 cells covering each parcel: point lookups probe this B-tree by cell id
+-- before any geometry math. Rebuilt by scripts/build_parcel_cells.py after imports.
+CREATE TABLE IF NOT EXISTS parcele_cells (
+    s2_cell BIGINT NOT NULL,
+    parcela_id INTEGER NOT NULL,
+    PRIMARY KEY (s2_cell, parcela_id)
+);
+
 -- Create indexes for fuzzy matching queries
 CREATE INDEX IF NOT EXISTS idx_parcele_povrsina ON parcele(povrsina);
 CREATE INDEX IF NOT EXISTS idx_parcele_ko_sifra ON parcele(ko_sifra);
@@ -42,6 +117,15 @@ CREATE INDEX IF NOT EXISTS idx_parcele_ko_ime ON parcele(ko_ime);
 -- Using 'simple' configuration (Supabase doesn't support 'slovenian')
 CREATE INDEX IF NOT EXISTS idx_parcele_ko_ime_gin ON parcele USING GIN(to_tsvector('simple', ko_ime));
 
+-- Normalized KO name, computed once on write (adding the column backfills existing rows)
+ALTER TABLE parcele ADD COLUMN IF NOT EXISTS ko_ime_norm VARCHAR(100)
+    GENERATED ALWAYS AS (lower(regexp_replace(ko_ime, '[[:punct:]]', '', 'g'))) STORED;
+
+-- Trigram index for fuzzy settlement matching (ko_ime_norm % :settlement in the matcher)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DROP INDEX IF EXISTS idx_parcele_ko_ime_trgm;
+CREATE INDEX IF NOT EXISTS idx_parcele_ko_ime_norm_trgm ON parcele USING GIN(ko_ime_norm gin_trgm_ops);
+
 -- ============================================================
 -- STAVBE (Buildings) Table
 -- ============================================================
@@ -96,7 +180,7 @@ CREATE TABLE IF NOT EXISTS lastniki (
     vrsta VARCHAR(50),                       -- Type (fizična oseba, pravna oseba)
     
     -- Ownership details
-    delež VARCHAR(50),                       -- Share/portion (e.g., "1/1", "1/2")
+    delez VARCHAR(50),                       -- Share/portion (e.g., "1/1", "1/2")
     pravica VARCHAR(100),                    -- Type of right (lastništvo, služnost, etc.)
     
     -- Metadata
@@ -104,8 +188,51 @@ CREATE TABLE IF NOT EXISTS lastniki (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Databases created before the share column was named like the ORM (Lastnik.delez)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'lastniki' AND column_name = 'delež'
+    ) THEN
+        ALTER TABLE lastniki RENAME COLUMN delež TO delez;
+    END IF;
+END $$;
+
 CREATE INDEX IF NOT EXISTS idx_lastniki_parcela_id ON lastniki(parcela_id);
 
+-- ============================================================
+-- TRANSACTIONS (Real Estate Sales) Table
+-- ============================================================
+CREATE TABLE IF NOT EXISTS transactions (
+    id SERIAL PRIMARY KEY,
+    price DOUBLE PRECISION,
+    date DATE,
+    price_m2 DOUBLE PRECISION,
+    geom GEOMETRY(POINT, 3794)               -- Sale location (binary, index-backed)
+);
+
+-- Migrate older databases that stored the location as WKT text
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS geom GEOMETRY(POINT, 3794);
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'transactions' AND column_name = 'geom_wkt'
+    ) THEN
+        UPDATE transactions SET geom = ST_GeomFromText(geom_wkt, 3794)
+        WHERE geom IS NULL AND geom_wkt IS NOT NULL;
+        ALTER TABLE transactions DROP COLUMN geom_wkt;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_geom ON transactions USING GIST(geom);
+-- Sales are appended roughly in date order, so a BRIN index serves date-range
+-- predicates ("last 6 months") at a fraction of a B-tree's size
+DROP INDEX IF EXISTS idx_transactions_sale_date;
+CREATE INDEX IF NOT EXISTS idx_transactions_date_brin ON transactions USING BRIN(date) WITH (pages_per_range = 32);
+CREATE INDEX IF NOT EXISTS idx_transactions_price_m2 ON transactions(price_m2) WHERE price_m2 IS NOT NULL;
+
 -- ============================================================
 -- Helper Functions
 -- ============================================================
@@ -119,13 +246,56 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Create triggers for auto-updating timestamps
+-- Flood risk of one parcel as a JSON document (property_detective/analyzers/flood_risk.py):
+-- nearest water bodies within 50m; direct intersection is High Risk, the rest Medium Risk.
+-- The LATERAL subquery walks the GiST index on water_bodies.geom in distance order (<->)
+-- and stops after 5 rows, so distance and intersection are computed on those 5 only.
+-- PL/pgSQL so the plan is cached per connection (and water_bodies, created by
+-- scripts/import_hydrography.py, need not exist yet when this file runs).
+CREATE OR REPLACE FUNCTION flood_risk(parcel_id INTEGER)
+RETURNS JSON AS $$
+BEGIN
+    RETURN (
+        SELECT json_build_object(
+            'overall_risk', CASE max(CASE d.risk_level WHEN 'HIGH' THEN 2 ELSE 1 END)
+                WHEN 2 THEN 'HIGH' WHEN 1 THEN 'MEDIUM' ELSE 'NONE' END,
+            'details', COALESCE(json_agg(json_build_object(
+                'type', d.type,
+                'name', d.name,
+                'level', d.risk_level,
+                'distance_m', round(d.distance::numeric, 1)
+            ) ORDER BY d.distance), '[]'::json)
+        )
+        FROM (
+            SELECT 
+                w.type,
+                w.name,
+                CASE WHEN ST_Intersects(w.geom, p.geom) THEN 'HIGH' ELSE 'MEDIUM' END AS risk_level,
+                ST_Distance(w.geom, p.geom) AS distance
+            FROM parcele p,
+            LATERAL (
+                SELECT wb.type, wb.name, wb.geom
+                FROM water_bodies wb
+                WHERE ST_DWithin(wb.geom, p.geom, 50) -- 50m check
+                ORDER BY wb.geom <-> p.geom
+                LIMIT 5
+            ) w
+            WHERE p.id = flood_risk.parcel_id
+        ) d
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Create triggers for auto-updating timestamps (dropped first so the file stays re-runnable)
+DROP TRIGGER IF EXISTS update_parcele_updated_at ON parcele;
 CREATE TRIGGER update_parcele_updated_at BEFORE UPDATE ON parcele
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_stavbe_updated_at ON stavbe;
 CREATE TRIGGER update_stavbe_updated_at BEFORE UPDATE ON stavbe
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_lastniki_updated_at ON lastniki;
 CREATE TRIGGER update_lastniki_updated_at BEFORE UPDATE ON lastniki
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -162,6 +332,9 @@ LEFT JOIN stavbe s ON p.id = s.parcela_id;
 COMMENT ON TABLE parcele IS 'GURS cadastral parcels (land plots) with spatial data';
 COMMENT ON TABLE stavbe IS 'Buildings registered in GURS cadastre';
 COMMENT ON TABLE lastniki IS 'Ownership information for parcels';
+COMMENT ON TABLE transactions IS 'Real estate sales used for price statistics';
 COMMENT ON COLUMN parcele.geom IS 'Parcel geometry in Slovenian coordinate system D96/TM (EPSG:3794)';
+COMMENT ON COLUMN parcele.geom_3857 IS 'Generated Web Mercator (EPSG:3857) copy of geom for vector tiles; do not write directly';
+COMMENT ON COLUMN parcele.geom_web IS 'Generated simplified WGS84 (EPSG:4326) copy of geom for GeoJSON responses; do not write directly';
 COMMENT ON COLUMN parcele.povrsina IS 'Parcel surface area in square meters';
 COMMENT ON COLUMN stavbe.neto_tloris IS 'Net floor area in square meters (key for matching)';
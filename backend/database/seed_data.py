@@ -12,16 +12,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.connection import session_scope, get_engine
 from property_detective.models import Parcela, Stavba, Base
-from sqlalchemy import text
+from sqlalchemy import text, insert
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def key_exists(session, model, **kwargs):
-    """Check if a record exists by its unique keys"""
-    return session.query(model).filter_by(**kwargs).first() is not None
-
 def seed_database():
     """Seed the database with sample data"""
     logger.info("Starting database initialization and seeding...")
@@ -57,104 +53,95 @@ def seed_database():
             logger.info(f"Database already contains {count} parcels. Skipping data seed.")
             return
 
-        # ==========================================
-        # 1. Ljubljana Center (House)
-        # ==========================================
-        if not key_exists(session, Parcela, parcela_stevilka="123/4", ko_sifra="1723"):
-            lj_parcel = Parcela(
-                parcela_stevilka="123/4",
-                ko_sifra="1723",
-                ko_ime="Ljubljana Center",
-                povrsina=542.0,
-                # Point in Ljubljana Center (approximate) - WKT
-                geom="POLYGON((460500 102500, 460520 102500, 460520 102525, 460500 102525, 460500 102500))"
-            )
-            session.add(lj_parcel)
-            session.flush() # Get ID
-
-            lj_building = Stavba(
-                parcela_id=lj_parcel.id,
-                stavba_stevilka="1122",
-                leto_izgradnje=1974,
-                neto_tloris=185.4,
-                stevilo_etaz=2,
-                tip="Stanovanjska stavba",
-                naslov_ulica="Slovenska cesta",
-                naslov_hisna_st="10",
-                naslov_naselje="Ljubljana",
-                naslov_posta="Ljubljana",
-                naslov_postna_st="1000"
-            )
-            session.add(lj_building)
-
-        # ==========================================
-        # 2. Maribor Center (Apartment Building)
-        # ==========================================
-        mb_parcel = Parcela(
-            parcela_stevilka="88/2",
-            ko_sifra="657",
-            ko_ime="Maribor Grad",
-            povrsina=1250.5,
-            geom="POLYGON((550500 155500, 550550 155500, 550550 155550, 550500 155550, 550500 155500))"
-        )
-        session.add(mb_parcel)
-        session.flush()
-
-        mb_building = Stavba(
-            parcela_id=mb_parcel.id,
-            stavba_stevilka="3344",
-            leto_izgradnje=1980, # Approximate for "without exact year" matching
-            neto_tloris=4000.0, # Multi-apartment building
-            stevilo_etaz=5,
-            tip="Večstanovanjska stavba",
-            naslov_ulica="Gosposka ulica",
-            naslov_hisna_st="5",
-            naslov_naselje="Maribor",
-            naslov_posta="Maribor",
-            naslov_postna_st="2000"
-        )
-        session.add(mb_building)
-
-        # ==========================================
-        # 3. Bled (Land Plot)
-        # ==========================================
-        bled_parcel = Parcela(
-            parcela_stevilka="999/1",
-            ko_sifra="2156",
-            ko_ime="Bled",
-            povrsina=3200.0,
-            geom="POLYGON((430500 135500, 430600 135500, 430600 135600, 430500 135600, 430500 135500))"
-        )
-        session.add(bled_parcel)
-        # No building for land plot
-
-        # ==========================================
-        # 4. Kranj (Modern House)
-        # ==========================================
-        kranj_parcel = Parcela(
-            parcela_stevilka="44/7",
-            ko_sifra="2100",
-            ko_ime="Kranj",
-            povrsina=876.3,
-            geom="POLYGON((450500 125500, 450530 125500, 450530 125530, 450500 125530, 450500 125500))"
-        )
-        session.add(kranj_parcel)
-        session.flush()
-
-        kranj_building = Stavba(
-            parcela_id=kranj_parcel.id,
-            stavba_stevilka="5566",
-            leto_izgradnje=2018,
-            neto_tloris=234.7,
-            stevilo_etaz=2,
-            tip="Stanovanjska stavba",
-            naslov_ulica="Cesta Staneta Žagarja",
-            naslov_hisna_st="22",
-            naslov_naselje="Kranj",
-            naslov_posta="Kranj",
-            naslov_postna_st="4000"
+        # Parcels are inserted in one executemany with RETURNING, then buildings are
+        # attached through the returned ids (no flush round trip per parcel).
+        # Geometries are EWKT so the SRID travels with the value.
+        parcels = [
+            # 1. Ljubljana Center (House) - point in Ljubljana Center (approximate)
+            {
+                "parcela_stevilka": "123/4",
+                "ko_sifra": "1723",
+                "ko_ime": "Ljubljana Center",
+                "povrsina": 542.0,
+                "geom": "SRID=3794;POLYGON((460500 102500, 460520 102500, 460520 102525, 460500 102525, 460500 102500))"
+            },
+            # 2. Maribor Center (Apartment Building)
+            {
+                "parcela_stevilka": "88/2",
+                "ko_sifra": "657",
+                "ko_ime": "Maribor Grad",
+                "povrsina": 1250.5,
+                "geom": "SRID=3794;POLYGON((550500 155500, 550550 155500, 550550 155550, 550500 155550, 550500 155500))"
+            },
+            # 3. Bled (Land Plot) - no building
+            {
+                "parcela_stevilka": "999/1",
+                "ko_sifra": "2156",
+                "ko_ime": "Bled",
+                "povrsina": 3200.0,
+                "geom": "SRID=3794;POLYGON((430500 135500, 430600 135500, 430600 135600, 430500 135600, 430500 135500))"
+            },
+            # 4. Kranj (Modern House)
+            {
+                "parcela_stevilka": "44/7",
+                "ko_sifra": "2100",
+                "ko_ime": "Kranj",
+                "povrsina": 876.3,
+                "geom": "SRID=3794;POLYGON((450500 125500, 450530 125500, 450530 125530, 450500 125530, 450500 125500))"
+            },
+        ]
+
+        # Buildings keyed by their parcel's (parcela_stevilka, ko_sifra)
+        buildings = {
+            ("123/4", "1723"): {
+                "stavba_stevilka": "1122",
+                "leto_izgradnje": 1974,
+                "neto_tloris": 185.4,
+                "stevilo_etaz": 2,
+                "tip": "Stanovanjska stavba",
+                "naslov_ulica": "Slovenska cesta",
+                "naslov_hisna_st": "10",
+                "naslov_naselje": "Ljubljana",
+                "naslov_posta": "Ljubljana",
+                "naslov_postna_st": "1000"
+            },
+            ("88/2", "657"): {
+                "stavba_stevilka": "3344",
+                "leto_izgradnje": 1980, # Approximate for "without exact year" matching
+                "neto_tloris": 4000.0, # Multi-apartment building
+                "stevilo_etaz": 5,
+                "tip": "Večstanovanjska stavba",
+                "naslov_ulica": "Gosposka ulica",
+                "naslov_hisna_st": "5",
+                "naslov_naselje": "Maribor",
+                "naslov_posta": "Maribor",
+                "naslov_postna_st": "2000"
+            },
+            ("44/7", "2100"): {
+                "stavba_stevilka": "5566",
+                "leto_izgradnje": 2018,
+                "neto_tloris": 234.7,
+                "stevilo_etaz": 2,
+                "tip": "Stanovanjska stavba",
+                "naslov_ulica": "Cesta Staneta Žagarja",
+                "naslov_hisna_st": "22",
+                "naslov_naselje": "Kranj",
+                "naslov_posta": "Kranj",
+                "naslov_postna_st": "4000"
+            },
+        }
+
+        inserted = session.execute(
+            insert(Parcela).returning(Parcela.id, Parcela.parcela_stevilka, Parcela.ko_sifra),
+            parcels
         )
-        session.add(kranj_building)
+        stavbe = [
+            {**buildings[(stevilka, ko_sifra)], "parcela_id": parcela_id}
+            for parcela_id, stevilka, ko_sifra in inserted
+            if (stevilka, ko_sifra) in buildings
+        ]
+        if stavbe:
+            session.execute(insert(Stavba), stavbe)
         
         logger.info("Database seeding completed successfully!")
 
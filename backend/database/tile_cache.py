@@ -0,0 +1,119 @@
+"""
+Vector Tile Cache for PropertyDetective
+Caches encoded (gzip-compressed) MVT blobs keyed by (z, x, y)
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "mvt:generation"
+
+
+class TileCache:
+    """
+    Cache of encoded parcel tiles.
+
+    Entries live in an in-process LRU; when REDIS_URL is set they are also
+    shared across workers through Redis. Redis keys carry a generation number
+    that parcel imports bump (see bump_tile_generation), so a data update
+    invalidates every cached tile at once without scanning keys.
+    """
+
+    def __init__(self, maxsize: int = 10000, redis_url: Optional[str] = None, ttl: int = 3600,
+                 generation_refresh: int = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation_refresh = generation_refresh
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, tile)
+        self._redis = None
+        self._generation = 0
+        self._generation_checked = 0.0
+
+        if redis_url:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.Redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("REDIS_URL is set but redis is not installed. Using in-process tile cache only.")
+
+    async def _current_generation(self) -> int:
+        """Generation from Redis, re-read at most every generation_refresh seconds"""
+        if self._redis is None or time.monotonic() - self._generation_checked < self.generation_refresh:
+            return self._generation
+        self._generation_checked = time.monotonic()
+        try:
+            generation = int(await self._redis.get(GENERATION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"Redis tile generation read failed: {e}")
+            return self._generation
+        if generation != self._generation:
+            # Data changed: local entries belong to the old generation
+            self._entries.clear()
+            self._generation = generation
+        return generation
+
+    async def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        generation = await self._current_generation()
+        key = (z, x, y)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, tile = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return tile
+            del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(f"mvt:{generation}:{z}:{x}:{y}")
+            except Exception as e:
+                logger.warning(f"Redis tile cache read failed: {e}")
+                return None
+            if value is not None:
+                self._remember(key, value)
+                return value
+        return None
+
+    async def set(self, z: int, x: int, y: int, tile: bytes):
+        self._remember((z, x, y), tile)
+        if self._redis is not None:
+            try:
+                await self._redis.setex(f"mvt:{self._generation}:{z}:{x}:{y}", self.ttl, tile)
+            except Exception as e:
+                logger.warning(f"Redis tile cache write failed: {e}")
+
+    def _remember(self, key: tuple, tile: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl, tile)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def bump_tile_generation():
+    """
+    Invalidate all cached tiles after parcel data changes
+
+    Called from the (sync) import scripts. Workers pick up the new generation
+    within generation_refresh seconds; without Redis, in-process entries
+    expire after the TTL.
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        return
+    try:
+        import redis
+        redis.Redis.from_url(redis_url).incr(GENERATION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not bump tile cache generation: {e}")
+
+
+# Shared across requests
+tile_cache = TileCache(
+    maxsize=int(os.getenv("TILE_CACHE_SIZE", "10000")),
+    redis_url=os.getenv("REDIS_URL")
+)
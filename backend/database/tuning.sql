@@ -0,0 +1,24 @@
+-- ============================================================
+-- Server tuning and index maintenance
+-- Run as a superuser (ALTER SYSTEM is not available on every managed host;
+-- there, set the same values in the provider's parameter settings).
+-- Compare `python debug_mvt.py --explain` before and after.
+-- ============================================================
+
+-- Room for bitmap heap scans and the ST_AsMVT / ST_Union aggregation without
+-- spilling to disk (per sort/hash node, per connection: keep pools small)
+ALTER SYSTEM SET work_mem = '64MB';
+
+-- Planner hint only (no allocation): roughly 75% of the server's RAM
+ALTER SYSTEM SET effective_cache_size = '6GB';
+
+SELECT pg_reload_conf();
+
+-- ------------------------------------------------------------
+-- Monthly: rebuild the spatial indexes bloated by parcel re-imports,
+-- without blocking reads (REINDEX CONCURRENTLY cannot run in a transaction)
+-- ------------------------------------------------------------
+-- REINDEX INDEX CONCURRENTLY idx_parcele_geom;
+-- REINDEX INDEX CONCURRENTLY idx_parcele_ko_sifra_geom;
+-- REINDEX INDEX CONCURRENTLY idx_parcele_geom_3857_spgist;
+-- REINDEX INDEX CONCURRENTLY idx_parcele_tiles_geom;
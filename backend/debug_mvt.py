@@ -1,5 +1,4 @@
 
-from sqlalchemy import create_engine, text
 import os
 import sys
 
@@ -7,40 +6,74 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-if not DATABASE_URL:
-    print("DATABASE_URL missing")
-    sys.exit(1)
-
-engine = create_engine(DATABASE_URL)
-
-query = text("""
-    WITH mvtgeom AS (
+# Inline copy of parcel_mvt() from database/schema.sql, so EXPLAIN shows the real plan.
+# Bound tile coordinates: one statement text, so Postgres can reuse the plan for every tile.
+# parcele_tiles holds pre-projected, subdivided pieces, so && is a pure index lookup and only
+# small slices are touched; pieces are restitched per parcel. ST_AsMVTGeom already clips to
+# the tile and returns NULL for rows outside it, so no ST_Intersects pass.
+MVT_SQL = """
+    WITH bounds AS (
+        -- Envelope computed once; the margin matches ST_AsMVTGeom's default 256/4096 buffer
+        SELECT ST_TileEnvelope(:z, :x, :y) AS env,
+               ST_TileEnvelope(:z, :x, :y, margin => 0.0625) AS env_margin
+    ),
+    parcels AS (
+        -- Restitch the subdivided pieces touching this tile into one feature per parcel
+        SELECT t.id, t.parcela_stevilka, t.ko_ime, ST_Union(t.geom_3857) AS geom_3857
+        FROM parcele_tiles t, bounds b
+        WHERE t.geom_3857 && b.env_margin
+        GROUP BY t.id, t.parcela_stevilka, t.ko_ime
+    ),
+    mvtgeom AS (
         SELECT 
-            id, 
-            parcela_stevilka, 
-            ko_ime,
-            ST_AsMVTGeom(
-                ST_Transform(ST_SetSRID(geom, 3794), 3857), 
-                ST_TileEnvelope(14, 8933, 5849)
-            ) AS geom
-        FROM parcele
-        WHERE ST_Intersects(
-            ST_Transform(ST_SetSRID(geom, 3794), 3857), 
-            ST_TileEnvelope(14, 8933, 5849)
-        )
+            p.id, 
+            p.parcela_stevilka, 
+            p.ko_ime,
+            ST_AsMVTGeom(p.geom_3857, b.env) AS geom
+        FROM parcels p, bounds b
     )
-    SELECT ST_AsMVT(mvtgeom.*) FROM mvtgeom;
-""")
-
-try:
-    with engine.connect() as conn:
-        print("Executing diagnostic MVT query...")
-        result = conn.execute(query).fetchone()
-        if result:
-            print(f"Success! Tile size: {len(result[0])} bytes")
-        else:
-            print("No data returned but query succeeded.")
-except Exception as e:
-    print(f"❌ SQL Error: {e}")
-    import traceback
-    traceback.print_exc()
+    SELECT ST_AsMVT(mvtgeom.*) FROM mvtgeom WHERE geom IS NOT NULL;
+"""
+
+
+def run_diagnostic(z: int, x: int, y: int, explain: bool = False) -> int:
+    # Imported here so a missing DATABASE_URL exits without loading SQLAlchemy
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(DATABASE_URL)
+    params = {"z": z, "x": x, "y": y}
+
+    try:
+        with engine.connect() as conn:
+            if explain:
+                # Shows which spatial index the planner picked and how many buffers it touched
+                plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {MVT_SQL}"), params)
+                for (line,) in plan:
+                    print(line)
+                return 0
+
+            print(f"Executing diagnostic MVT query for tile {z}/{x}/{y}...")
+            result = conn.execute(text(MVT_SQL), params).fetchone()
+            if result:
+                print(f"Success! Tile size: {len(result[0])} bytes")
+            else:
+                print("No data returned but query succeeded.")
+            return 0
+    except Exception as e:
+        print(f"❌ SQL Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    if not DATABASE_URL:
+        print("DATABASE_URL missing")
+        sys.exit(1)
+
+    # Tile to test: python debug_mvt.py [--explain] [z x y]
+    explain = "--explain" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--explain"]
+    z, x, y = (int(v) for v in args[:3]) if len(args) >= 3 else (14, 8933, 5849)
+
+    sys.exit(run_diagnostic(z, x, y, explain))
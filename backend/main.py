@@ -3,16 +3,33 @@ GNEP FastAPI Backend Application
 Main entry point for the API server
 """
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from typing import Optional, List
+import os
+import gzip
+import hashlib
+import asyncio
 import logging
-from datetime import datetime
-
-from property_detective import find_probable_parcels
-from database.connection import test_connection, initialize_database
+import traceback
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, UTC
+from decimal import Decimal
+
+import orjson
+
+from property_detective import find_probable_parcels_async
+from property_detective.analyzers.flood_risk import analyze_flood_risk
+from database.connection import (
+    test_async_connection, initialize_database, initialize_async_database, initialize_readonly_database,
+    create_pg_pool, check_database_setup, session_scope, readonly_session_scope
+)
+from database.tile_cache import tile_cache
+from database.s2_cells import point_cell
+from agent.prompts import PREDEFINED_QUESTIONS
 
 # Configure logging
 logging.basicConfig(
@@ -21,8 +38,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _orjson_default(obj):
+    """Fallback for types orjson doesn't serialize natively (NUMERIC columns)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+
+class APIResponse(ORJSONResponse):
+    """orjson-encoded response that also handles Decimal values from raw SQL results"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+# Seconds between background database pings backing /health
+DB_PROBE_INTERVAL = 5
+
+# Read once: the environment does not change while the process runs
+AI_CONFIGURED = bool(os.getenv("OPENAI_API_KEY"))
+
+
+async def _db_probe_loop(app: FastAPI):
+    """Refresh app.state.db_ok so /health answers without a database round-trip"""
+    while True:
+        await asyncio.sleep(DB_PROBE_INTERVAL)
+        app.state.db_ok = await test_async_connection()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database connections on startup and close them on shutdown"""
+    logger.info("Starting GNEP API server...")
+    engine = initialize_database()
+    initialize_async_database()
+    if initialize_readonly_database() is None:
+        logger.warning("DATABASE_URL_READONLY is not set. Agent SQL runs on the main role with keyword filtering.")
+    app.state.pg_pool = None
+    try:
+        app.state.pg_pool = await create_pg_pool()
+    except Exception as e:
+        # Like check_database_setup: come up anyway, /health reports the database
+        logger.error(f"Could not create the asyncpg pool: {e}")
+    
+    # Ensure PostGIS and SRID 3794 are present
+    check_database_setup(engine)
+
+    logger.info("Database initialized successfully")
+
+    # One OpenAI client per worker, shared by all agent requests
+    app.state.openai = None
+    app.state.semantic_cache = None
+    prewarm = None
+    try:
+        from agent.service import AgentService, create_openai_client, semantic_cache
+        from agent.local_provider import local_provider
+        if local_provider is not None:
+            # Loads in a worker thread; prewarm and requests wait for it
+            local_provider.start()
+        app.state.openai = create_openai_client()
+        app.state.semantic_cache = semantic_cache
+
+        # Warm the SQL cache for the predefined agent questions in the background:
+        # serving doesn't wait on up to one LLM round-trip per question
+        service = AgentService(None, app.state.openai)
+        if service.available:
+            prewarm = asyncio.create_task(service.prewarm())
+    except ImportError as e:
+        logger.warning(f"Skipping agent prewarm (Missing Lib): {e}")
+
+    app.state.db_ok = await test_async_connection()
+    db_probe = asyncio.create_task(_db_probe_loop(app))
+
+    yield
+
+    for task in (db_probe, prewarm):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    if app.state.semantic_cache is not None:
+        await app.state.semantic_cache.flush()
+    if app.state.openai is not None:
+        await app.state.openai.close()
+    if app.state.pg_pool is not None:
+        await app.state.pg_pool.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=APIResponse,
     title="GNEP API",
     description="AI-Powered Real Estate Matching for GURS Cadastral Data",
     version="1.0.0",
@@ -39,19 +149,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses; tiles arrive pre-compressed (Content-Encoding set) and are skipped
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Pydantic Models for API
 
 class ListingData(BaseModel):
     """Input model for real estate listing data"""
-    settlement: str = Field(..., description="Settlement or cadastral municipality name", example="Ljubljana - Center")
-    parcel_area_m2: float = Field(..., description="Parcel area in square meters", example=542.0, gt=0)
-    construction_year: Optional[int] = Field(None, description="Year of construction", example=1974, ge=1800, le=2030)
-    net_floor_area_m2: Optional[float] = Field(None, description="Net floor area in square meters", example=185.4, gt=0)
-    property_type: Optional[str] = Field(None, description="Property type", example="Hiša")
-    street_name: Optional[str] = Field(None, description="Street name", example="Slovenska cesta")
+    settlement: str = Field(..., description="Settlement or cadastral municipality name", examples=["Ljubljana - Center"])
+    parcel_area_m2: float = Field(..., description="Parcel area in square meters", examples=[542.0], gt=0)
+    construction_year: Optional[int] = Field(None, description="Year of construction", examples=[1974], ge=1800, le=2030)
+    net_floor_area_m2: Optional[float] = Field(None, description="Net floor area in square meters", examples=[185.4], gt=0)
+    property_type: Optional[str] = Field(None, description="Property type", examples=["Hiša"])
+    street_name: Optional[str] = Field(None, description="Street name", examples=["Slovenska cesta"])
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "settlement": "Ljubljana - Center",
                 "parcel_area_m2": 542.0,
@@ -61,6 +174,7 @@ class ListingData(BaseModel):
                 "street_name": "Slovenska cesta"
             }
         }
+    )
 
 
 class MatchResponse(BaseModel):
@@ -72,6 +186,11 @@ class MatchResponse(BaseModel):
     count: int
 
 
+# Built once: validates and serializes handler results in one compiled pass,
+# instead of MatchResponse(**result) plus FastAPI's response_model re-validation
+_match_adapter = TypeAdapter(MatchResponse)
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
@@ -83,108 +202,94 @@ class HealthResponse(BaseModel):
 
 # API Endpoints
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database connection on startup"""
-    logger.info("Starting GNEP API server...")
-    engine = initialize_database()
-    
-    # Ensure PostGIS and SRID 3794 are present
-    from database.connection import check_database_setup
-    check_database_setup(engine)
-    
-    logger.info("Database initialized successfully")
-
-
-
 class CoordinateSearch(BaseModel):
     """Input model for coordinate-based search"""
     lng: float
     lat: float
     address: Optional[str] = None
 
+# Point lookup, built entirely in SQL and cast to text, so the GeoJSON is never parsed
+# or re-encoded in Python. The point is transformed once (CTE) and geom stays bare on
+# one side; {candidates} picks the index path and ST_Intersects rechecks the candidates.
+PARCEL_AT_POINT_SQL = """
+    SELECT json_build_object(
+        'success', true,
+        'message', 'Found parcel ' || p.parcela_stevilka || ' in KO ' || p.ko_ime,
+        'matches', json_build_array(json_build_object(
+            'parcela', p.props,
+            'stavba', NULL,
+            'confidence', 100.0,
+            'score', 1.0,
+            'notes', json_build_array('Exact location match')
+        )),
+        'geojson', json_build_object(
+            'type', 'FeatureCollection',
+            'features', json_build_array(json_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(p.geom_web, 6)::json,
+                'properties', p.props
+            ))
+        ),
+        'count', 1
+    )::text
+    FROM (
+        WITH pt AS (
+            SELECT ST_Transform(ST_SetSRID(ST_Point($1, $2), 4326), 3794) AS geom
+        )
+        SELECT 
+            parcele.geom_web,
+            parcela_stevilka,
+            ko_ime,
+            json_build_object(
+                'id', id, 
+                'parcela_stevilka', parcela_stevilka, 
+                'ko_sifra', ko_sifra,
+                'ko_ime', ko_ime, 
+                'povrsina', CAST(povrsina AS FLOAT)
+            ) AS props
+        FROM parcele, pt
+        WHERE {candidates} AND ST_Intersects(parcele.geom, pt.geom)
+        LIMIT 1
+    ) p;
+"""
+
+# GiST on parcele.geom
+PARCEL_AT_POINT_GIST_SQL = PARCEL_AT_POINT_SQL.format(candidates="parcele.geom && pt.geom")
+
+# B-tree probe on the point's S2 cell (parcele_cells), no polygon search
+PARCEL_AT_POINT_S2_SQL = PARCEL_AT_POINT_SQL.format(
+    candidates="parcele.id IN (SELECT parcela_id FROM parcele_cells WHERE s2_cell = $3)"
+)
+
+
 @app.post("/api/find-parcel-by-point", response_model=MatchResponse, tags=["Search"])
 async def find_parcel_by_point_endpoint(data: CoordinateSearch):
-    """Find a parcel containing a specific point (lng, lat)"""
     """Find a parcel containing a specific point (lng, lat)"""
     # Use Raw SQL to bypass potential ORM/Shapely dependency issues on the server
-    from database.connection import session_scope
-    from sqlalchemy import text
-    import json
-    
     logger.info(f"Searching for parcel at coordinates: {data.lng}, {data.lat}")
     
     try:
-        with session_scope() as session:
-            # OPTIMIZED: Use index-friendly ST_Intersects and keep geom on one side
-            # We use ST_Transform on the input point only.
-            query = text("""
-                SELECT 
-                    id, 
-                    parcela_stevilka, 
-                    ko_sifra,
-                    ko_ime, 
-                    CAST(povrsina AS FLOAT) as povrsina, 
-                    ST_AsGeoJSON(ST_Transform(ST_Force2D(geom), 4326)) as geojson 
-                FROM parcele 
-                WHERE ST_Intersects(
-                    geom, 
-                    ST_Transform(ST_SetSRID(ST_Point(:lng, :lat), 4326), 3794)
-                ) 
-                LIMIT 1;
-            """)
-            
-            result = session.execute(query, {"lng": data.lng, "lat": data.lat}).mappings().first()
-            
-            if not result:
-                return {
-                    "success": False,
-                    "message": f"No parcel found at location: {data.address or 'Coordinates'}",
-                    "matches": [],
-                    "geojson": None,
-                    "count": 0
-                }
-                
-            # Parse GeoJSON string from DB
-            geometry = json.loads(result['geojson'])
-            
-            # Construct Match Object manually
-            match_dict = {
-                "parcela": {
-                    "id": result['id'],
-                    "parcela_stevilka": result['parcela_stevilka'],
-                    "ko_sifra": result['ko_sifra'],
-                    "ko_ime": result['ko_ime'],
-                    "povrsina": result['povrsina']
-                },
-                "stavba": None,
-                "confidence": 100.0,
-                "score": 1.0,
-                "notes": ["Exact location match"]
-            }
-            
-            # Construct FeatureCollection manually
-            feature_collection = {
-                "type": "FeatureCollection",
-                "features": [
-                    {
-                        "type": "Feature",
-                        "geometry": geometry,
-                        "properties": match_dict["parcela"]
-                    }
-                ]
-            }
+        async with app.state.pg_pool.acquire() as conn:
+            cell = point_cell(data.lat, data.lng)
+            payload = None
+            if cell is not None:
+                payload = await conn.fetchval(PARCEL_AT_POINT_S2_SQL, data.lng, data.lat, cell)
+            if payload is None:
+                # No S2 binding, or a miss (cells not built yet / stale after an import)
+                payload = await conn.fetchval(PARCEL_AT_POINT_GIST_SQL, data.lng, data.lat)
             
+        if payload is None:
             return {
-                "success": True,
-                "message": f"Found parcel {result['parcela_stevilka']} in KO {result['ko_ime']}",
-                "matches": [match_dict],
-                "geojson": feature_collection,
-                "count": 1
+                "success": False,
+                "message": f"No parcel found at location: {data.address or 'Coordinates'}",
+                "matches": [],
+                "geojson": None,
+                "count": 0
             }
+
+        return Response(content=payload, media_type="application/json")
             
     except Exception as e:
-        import traceback
         error_detail = "".join(traceback.format_exception(type(e), e, e.__traceback__))
         logger.error(f"Error in coordinate search: {error_detail}")
         # RETURN FULL DETAIL FOR DEBUGGING
@@ -209,69 +314,112 @@ async def root():
 async def health_check():
     """
     Health check endpoint for monitoring
-    Returns API status and database connection status
+    Returns API status and the database status from the last background ping
     """
-    db_connected = test_connection()
-    
+    db_connected = app.state.db_ok
+
     return HealthResponse(
         status="healthy" if db_connected else "unhealthy",
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=datetime.now(UTC).isoformat(),
         database_connected=db_connected,
-        ai_configured=bool(os.getenv("OPENAI_API_KEY")),
+        ai_configured=AI_CONFIGURED,
         version="1.0.0"
     )
 
-import os
-logger.info(f"Startup Environment Check: OPENAI_API_KEY {'Set' if os.getenv('OPENAI_API_KEY') else 'Missing'}")
-if os.getenv("OPENAI_API_KEY"):
+logger.info(f"Startup Environment Check: OPENAI_API_KEY {'Set' if AI_CONFIGURED else 'Missing'}")
+if AI_CONFIGURED:
     key = os.getenv("OPENAI_API_KEY")
     logger.info(f"API Key Preview: {key[:8]}...{key[-4:]}")
 
 
 
-from fastapi import Response
+# Highest zoom persisted in tile_cache (matches scripts/build_tile_cache.py)
+TILE_CACHE_MAX_ZOOM = 18
+
+# Cache miss: render live (parcel_mvt() in schema.sql), but persist only non-empty
+# tiles over parcels, as scripts/build_tile_cache.py does; walking empty parts of
+# the grid can't grow tile_cache
+TILE_MISS_SQL = """
+    WITH rendered AS (
+        SELECT parcel_mvt($1, $2, $3) AS mvt
+        WHERE EXISTS (SELECT 1 FROM parcele_tiles WHERE geom_3857 && ST_TileEnvelope($1, $2, $3))
+    ), stored AS (
+        INSERT INTO tile_cache (z, x, y, mvt)
+        SELECT $1, $2, $3, mvt FROM rendered WHERE length(mvt) > 0
+        ON CONFLICT (z, x, y) DO UPDATE SET mvt = EXCLUDED.mvt, rendered_at = CURRENT_TIMESTAMP
+    )
+    SELECT mvt FROM rendered
+"""
+
+# Tiles only change on parcel imports, but the URL stays the same (bump_tile_generation
+# only resets the server caches): browsers and CDNs keep a tile for an hour, then
+# revalidate it with If-None-Match (a 304 while unchanged)
+TILE_CACHE_CONTROL = "public, max-age=3600"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check with weak comparison: a list of tags, W/ prefixes or *"""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def _tile_response(blob: bytes, request: Request) -> Response:
+    """
+    Send a gzipped tile, decompressing only for clients that don't accept gzip
+
+    The weak ETag is shared by both encodings, so a matching If-None-Match gets
+    a bodiless 304 either way.
+    """
+    etag = f'W/"{hashlib.blake2b(blob, digest_size=8).hexdigest()}"'
+    headers = {"Cache-Control": TILE_CACHE_CONTROL, "ETag": etag, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if "gzip" not in request.headers.get("accept-encoding", ""):
+        return Response(content=gzip.decompress(blob), headers=headers,
+                        media_type="application/vnd.mapbox-vector-tile")
+    headers["Content-Encoding"] = "gzip"
+    return Response(content=blob, headers=headers, media_type="application/vnd.mapbox-vector-tile")
+
 
 @app.get("/api/tiles/parcels/{z}/{x}/{y}", tags=["Maps"])
-async def get_parcel_tiles(z: int, x: int, y: int):
+async def get_parcel_tiles(z: int, x: int, y: int, request: Request):
     """
     Serve Mapbox Vector Tiles (MVT) for parcels.
     Transforms GURS 3794 coordinates to Web Mercator 3857.
     """
-    from database.connection import session_scope
-    from sqlalchemy import text
-    
-    # Restrict zoom level to avoid huge queries
-    if z < 14:
+    # Restrict zoom level to avoid huge queries; coordinates outside the grid are empty
+    if z < 14 or not (0 <= x < 1 << z and 0 <= y < 1 << z):
         return Response(content=b"", media_type="application/vnd.mapbox-vector-tile")
+
+    cached = await tile_cache.get(z, x, y)
+    if cached is not None:
+        return _tile_response(cached, request)
         
     try:
-        with session_scope() as session:
-            # OPTIMIZED: Use index-friendly filter by transforming the TILE ENVELOPE to match DATA (3794)
-            # This allows the query to use the spatial index on the 'geom' column.
-            query = text("""
-                WITH mvtgeom AS (
-                    SELECT 
-                        id, 
-                        parcela_stevilka, 
-                        ko_ime,
-                        ST_AsMVTGeom(
-                            ST_Transform(ST_Force2D(geom), 3857), 
-                            ST_TileEnvelope(:z, :x, :y)
-                        ) AS geom
-                    FROM parcele
-                    WHERE geom && ST_Transform(ST_TileEnvelope(:z, :x, :y), 3794)
-                      AND ST_Intersects(geom, ST_Transform(ST_TileEnvelope(:z, :x, :y), 3794))
-                )
-                SELECT ST_AsMVT(mvtgeom.*, 'default', 4096, 'geom') 
-                FROM mvtgeom;
-            """)
-            
-            result = session.execute(query, {"z": z, "x": x, "y": y}).scalar()
-            
-            return Response(content=result or b"", media_type="application/vnd.mapbox-vector-tile")
+        async with app.state.pg_pool.acquire() as conn:
+            # Pre-rendered tile first (single primary-key lookup)
+            result = await conn.fetchval(
+                "SELECT mvt FROM tile_cache WHERE z = $1 AND x = $2 AND y = $3", z, x, y
+            )
+            if result is None and z > TILE_CACHE_MAX_ZOOM:
+                result = await conn.fetchval("SELECT parcel_mvt($1, $2, $3)", z, x, y)
+            elif result is None:
+                result = await conn.fetchval(TILE_MISS_SQL, z, x, y)
+            tile = bytes(result) if result else b""
+
+        # Compressed once here; cache hits are served as-is
+        blob = gzip.compress(tile, 6)
+        await tile_cache.set(z, x, y, blob)
+        return _tile_response(blob, request)
             
     except Exception as e:
-        import traceback
         error_detail = "".join(traceback.format_exception(type(e), e, e.__traceback__))
         logger.error(f"Error in MVT tile: {error_detail}")
         # Return detail in header or body (MVT returns body usually)
@@ -299,15 +447,18 @@ async def api_find_probable_parcels(listing: ListingData):
         # Convert Pydantic model to dict
         listing_dict = listing.model_dump()
         
-        # Call PropertyDetective
-        result = find_probable_parcels(listing_dict)
+        # Call PropertyDetective (async engine, DB waits don't block the worker)
+        result = await find_probable_parcels_async(listing_dict)
         
         logger.info(f"Found {result['count']} matches with confidence")
         
-        return MatchResponse(**result)
+        # response_model stays for the OpenAPI schema; a Response is passed through as-is
+        return Response(
+            content=_match_adapter.dump_json(_match_adapter.validate_python(result)),
+            media_type="application/json"
+        )
     
     except Exception as e:
-        import traceback
         error_detail = "".join(traceback.format_exception(type(e), e, e.__traceback__))
         logger.error(f"Error in find_probable_parcels: {error_detail}")
         raise HTTPException(
@@ -344,30 +495,57 @@ async def get_parcel_details(parcela_id: int):
     Returns cadastral data, ownership information, and buildings on the parcel.
     """
     try:
-        from database.connection import session_scope
-        from property_detective.models import Parcela
-        
-        with session_scope() as session:
-            parcela = session.query(Parcela).filter(Parcela.id == parcela_id).first()
-            
-            if not parcela:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Parcel with ID {parcela_id} not found"
-                )
-            
-            result = parcela.to_dict()
-            
-            # Add buildings
-            result['stavbe'] = [stavba.to_dict() for stavba in parcela.stavbe]
-            
-            # Add ownership (if available)
-            result['lastniki'] = [lastnik.to_dict() for lastnik in parcela.lastniki]
-            
-            return {
-                "success": True,
-                "data": result
-            }
+        # One round trip: parcel, buildings and owners aggregated to JSON in SQL
+        # (same shape as the ORM to_dict() methods).
+        async with app.state.pg_pool.acquire() as conn:
+            payload = await conn.fetchval("""
+                SELECT json_build_object(
+                    'success', true,
+                    'data', json_build_object(
+                        'id', p.id,
+                        'parcela_stevilka', p.parcela_stevilka,
+                        'ko_sifra', p.ko_sifra,
+                        'ko_ime', p.ko_ime,
+                        'povrsina', CAST(p.povrsina AS FLOAT),
+                        'created_at', p.created_at,
+                        'updated_at', p.updated_at,
+                        'stavbe', COALESCE((
+                            SELECT json_agg(json_build_object(
+                                'id', s.id,
+                                'parcela_id', s.parcela_id,
+                                'stavba_stevilka', s.stavba_stevilka,
+                                'leto_izgradnje', s.leto_izgradnje,
+                                'neto_tloris', CAST(NULLIF(s.neto_tloris, 0) AS FLOAT),
+                                'stevilo_etaz', s.stevilo_etaz,
+                                'tip', s.tip,
+                                'naslov', NULLIF(concat_ws(', ', s.naslov_ulica, s.naslov_hisna_st, s.naslov_naselje), '')
+                            ) ORDER BY s.id)
+                            FROM stavbe s WHERE s.parcela_id = p.id
+                        ), '[]'::json),
+                        'lastniki', COALESCE((
+                            SELECT json_agg(json_build_object(
+                                'id', l.id,
+                                'parcela_id', l.parcela_id,
+                                'ime', l.ime,
+                                'vrsta', l.vrsta,
+                                'delez', l.delez,
+                                'pravica', l.pravica
+                            ) ORDER BY l.id)
+                            FROM lastniki l WHERE l.parcela_id = p.id
+                        ), '[]'::json)
+                    )
+                )::text
+                FROM parcele p
+                WHERE p.id = $1;
+            """, parcela_id)
+
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Parcel with ID {parcela_id} not found"
+            )
+
+        return Response(content=payload, media_type="application/json")
     
     except HTTPException:
         raise
@@ -389,9 +567,6 @@ async def get_flood_risk(parcel_id: int):
     - Standing waters (Lakes)
     - Wetlands
     """
-    from property_detective.analyzers.flood_risk import analyze_flood_risk
-    from database.connection import session_scope
-    
     try:
         with session_scope() as session:
             result = analyze_flood_risk(parcel_id, session)
@@ -416,18 +591,18 @@ async def agent_chat(request: dict):
         logger.error(f"Missing Dependency for AI Agent: {e}")
         raise HTTPException(status_code=500, detail="AI Service Config Error (Missing Lib)")
 
-    from database.connection import session_scope
-    
     question = request.get("question")
-    if not question:
+    question_id = request.get("question_id")
+    if not question and question_id is None:
         raise HTTPException(status_code=400, detail="Missing question")
+    if question_id is not None and not isinstance(question_id, int):
+        raise HTTPException(status_code=400, detail="question_id must be an integer")
         
     try:
-        with session_scope() as session:
-            service = AgentService(session)
-            if not service.client:
-                 raise HTTPException(status_code=503, detail="AI Service Not Configured (Missing Key)")
-            return service.process_query(question)
+        async with readonly_session_scope() as session:
+            service = AgentService(session, app.state.openai)
+            # Returned as a Response so the rows skip jsonable_encoder and go straight to orjson
+            return APIResponse(await service.process_query(question, question_id, request.get("params")))
     except HTTPException:
         raise
     except Exception as e:
@@ -436,8 +611,7 @@ async def agent_chat(request: dict):
 
 @app.get("/api/agent/questions", tags=["Agent"])
 async def get_agent_questions():
-    """Return predefined example questions"""
-    from agent.prompts import PREDEFINED_QUESTIONS
+    """Return predefined example questions (list index is the question_id for /api/agent/chat)"""
     return {"questions": PREDEFINED_QUESTIONS}
 
 
@@ -493,13 +667,21 @@ async def internal_error_handler(request, exc):
     )
 
 
-# Run with: uvicorn main:app --reload --host 0.0.0.0 --port 8000
+# Run with: uvicorn main:app --reload --host 0.0.0.0 --port 8000 (development)
+# Production: uvloop event loop + httptools parser, one worker per core (WEB_CONCURRENCY).
+# Each worker opens its own DB pools, so workers x pool max_size must stay below
+# Postgres max_connections.
 if __name__ == "__main__":
     import uvicorn
+    reload = os.getenv("UVICORN_RELOAD") == "1"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True,
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        # uvicorn cannot reload with multiple workers
+        workers=1 if reload else int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        reload=reload,
         log_level="info"
     )
@@ -31,6 +31,13 @@ class MatchingConfig:
     # Settlement name fuzzy matching threshold (0-100)
     settlement_fuzzy_threshold: int = 80
     
+    # Filter candidates by settlement name (off until parcels carry real KO names)
+    settlement_filter: bool = False
+    
+    # pg_trgm similarity (0-1) for the SQL settlement filter; % only narrows to
+    # pg_trgm.similarity_threshold (0.3 by default), so values below that have no effect
+    settlement_similarity_threshold: float = 0.4
+    
     def get_parcel_area_range(self, area: float) -> tuple:
         """Calculate min/max range for parcel area"""
         tolerance_value = area * self.parcel_area_tolerance
@@ -61,6 +68,9 @@ class ScoringConfig:
     building_type_bonus: int = 10
     settlement_match_bonus: int = 5
     
+    # Street similarity (RapidFuzz token_set_ratio, 0-100) that earns the street bonus
+    street_match_min_ratio: int = 85
+    
     # Penalty multipliers for non-exact matches
     area_near_match_multiplier: float = 0.8  # 80% of points for ±0.5%
     area_fuzzy_match_multiplier: float = 0.6  # 60% of points for ±1%
@@ -79,6 +89,11 @@ class ScoringConfig:
     def calculate_confidence(self, score: int) -> float:
         """Convert score to confidence percentage"""
         return (score / self.max_possible_score) * 100
+    
+    def calculate_confidence_bps(self, score: int) -> int:
+        """Confidence in hundredths of a percent, rounded half up in integer math"""
+        max_score = self.max_possible_score
+        return (score * 20000 + max_score) // (2 * max_score)
 
 
 @dataclass
@@ -134,6 +149,8 @@ class PropertyDetectiveConfig:
             self.matching.max_results = int(max_results)
         if min_conf := os.getenv('MIN_CONFIDENCE'):
             self.matching.min_confidence = float(min_conf)
+        if settlement_filter := os.getenv('SETTLEMENT_FILTER'):
+            self.matching.settlement_filter = settlement_filter == '1'
 
 
 # Global default config instance
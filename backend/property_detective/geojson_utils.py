@@ -3,10 +3,9 @@ GeoJSON Utilities for PropertyDetective
 Converts parcel geometries to GeoJSON for web mapping
 """
 
-import json
-from typing import List, Optional
-from shapely.geometry import mapping
-from geoalchemy2.shape import to_shape
+from typing import Iterable, Iterator, List, Optional
+
+import orjson
 
 from .models import Parcela
 from .scoring import MatchScore
@@ -47,19 +46,44 @@ def parcels_to_geojson(
             ]
         }
     """
+    return {
+        "type": "FeatureCollection",
+        "features": list(iter_features(match_scores, config))
+    }
+
+
+def iter_features(
+    match_scores: Iterable[MatchScore],
+    config: GeoJSONConfig = None
+) -> Iterator[dict]:
+    """
+    Yield GeoJSON features one at a time (parcels without geometry are skipped)
+    
+    Args:
+        match_scores: MatchScore objects in rank order
+        config: GeoJSONConfig instance (uses default if None)
+    """
     if config is None:
         config = default_config.geojson
     
-    features = []
     for rank, match_score in enumerate(match_scores, start=1):
         feature = create_feature(match_score, rank, config)
         if feature:
-            features.append(feature)
+            yield feature
+
+
+def parcels_to_geojson_ndjson(
+    match_scores: Iterable[MatchScore],
+    config: GeoJSONConfig = None
+) -> Iterator[bytes]:
+    """
+    Encode features as newline-delimited GeoJSON, one line per feature
     
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    Peak memory is one feature, not the whole collection; pass the result
+    to a StreamingResponse (media_type="application/x-ndjson").
+    """
+    for feature in iter_features(match_scores, config):
+        yield orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
 
 
 def create_feature(
@@ -83,17 +107,11 @@ def create_feature(
     
     parcela = match_score.parcela
     
-    # Convert PostGIS geometry to Shapely, then to GeoJSON
-    if parcela.geom is None:
+    # GeoJSON text built and transformed to WGS84 by PostGIS (PropertyMatcher._load_geojson)
+    if parcela.geom_geojson is None:
         return None
     
-    # Convert geometry to shape
-    shape_geom = to_shape(parcela.geom)
-    
-    # Convert to WGS84 if needed (assuming source is EPSG:3794)
-    # Note: This would require pyproj for coordinate transformation
-    # For now, we'll use the geometry as-is and note the CRS
-    geojson_geom = mapping(shape_geom)
+    geojson_geom = orjson.loads(parcela.geom_geojson)
     
     # Build properties
     properties = {
@@ -105,7 +123,7 @@ def create_feature(
         
         # Match information
         'rank': rank,
-        'confidence': round(match_score.confidence, 2),
+        'confidence': match_score.confidence,
         'score': match_score.total_score,
         'score_breakdown': match_score.breakdown,
         
@@ -143,9 +161,10 @@ def save_geojson(geojson_data: dict, filepath: str):
         geojson_data: GeoJSON dict
         filepath: Output file path
     """
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(geojson_data, f, ensure_ascii=False, indent=2)
+    # orjson writes UTF-8 directly (no ensure_ascii escaping), hence binary mode
+    with open(filepath, 'wb') as f:
+        f.write(orjson.dumps(geojson_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
 
 # Export
-__all__ = ['parcels_to_geojson', 'create_feature', 'save_geojson']
+__all__ = ['parcels_to_geojson', 'iter_features', 'parcels_to_geojson_ndjson', 'create_feature', 'save_geojson']
@@ -3,19 +3,98 @@ PropertyDetective Matcher - Fuzzy Matching Algorithm
 Finds probable parcels matching real estate listing data
 """
 
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+import re
+import heapq
+from itertools import chain, islice
+from typing import Iterator, Optional
+from sqlalchemy.orm import Session, defer, raiseload, with_expression
+from sqlalchemy import Row, and_, func, select
 import logging
-from fuzzywuzzy import fuzz
+import numpy as np
 
-from .models import Parcela, Stavba
-from .scoring import MatchScore, calculate_match_score, rank_candidates, filter_by_confidence
+from .models import Parcela, Stavba, lowercase
+from .scoring import (
+    CandidateArrays, calculate_match_score, calculate_match_score_batch, top_k_from_totals
+)
 from .config import PropertyDetectiveConfig, default_config
-from database.connection import session_scope
+from .schemas import matches_to_builtins
+from database.connection import session_scope, async_session_scope
 
 logger = logging.getLogger(__name__)
 
+# Candidate rows fetched per round-trip from the server-side cursor
+YIELD_PER = 1000
+
+# Python side of Parcela.ko_ime_norm: lower(regexp_replace(ko_ime, '[[:punct:]]', '', 'g'))
+_PUNCT_RE = re.compile(r"[^\w\s]|_")
+
+
+def _rank_key(best_entry: tuple) -> tuple:
+    """Highest score first; ties keep query order (position)"""
+    return -best_entry[0], best_entry[1]
+
+
+def normalize_settlement(name: str) -> str:
+    """Normalize a settlement the way Postgres computes parcele.ko_ime_norm"""
+    return _PUNCT_RE.sub('', name.lower())
+
+
+class ParcelCandidate:
+    """Scoring fields of a candidate parcel, read from a Core row (no ORM hydration)"""
+    __slots__ = ('id', 'povrsina', 'ko_ime_lc', 'ko_ime_norm')
+    
+    def __init__(self, id, povrsina, ko_ime, ko_ime_norm):
+        self.id = id
+        self.povrsina = povrsina
+        self.ko_ime_lc = lowercase(ko_ime)
+        self.ko_ime_norm = ko_ime_norm
+
+
+class BuildingCandidate:
+    """Scoring fields of a candidate building, read from a Core row (no ORM hydration)"""
+    __slots__ = ('id', 'leto_izgradnje', 'neto_tloris', 'naslov_ulica_lc', 'tip_lc')
+    
+    def __init__(self, id, leto_izgradnje, neto_tloris, naslov_ulica, tip):
+        self.id = id
+        self.leto_izgradnje = leto_izgradnje
+        self.neto_tloris = neto_tloris
+        self.naslov_ulica_lc = lowercase(naslov_ulica)
+        self.tip_lc = lowercase(tip)
+
+
+# Columns selected per candidate, in constructor order. Text the scorer compares
+# case-insensitively is lowercased in Python by models.lowercase, like the ORM
+# winners re-scored later (Postgres lower() depends on the database collation)
+PARCEL_CANDIDATE_COLUMNS = (Parcela.id, Parcela.povrsina, Parcela.ko_ime, Parcela.ko_ime_norm)
+BUILDING_CANDIDATE_COLUMNS = (
+    Stavba.id, Stavba.leto_izgradnje, Stavba.neto_tloris, Stavba.naslov_ulica, Stavba.tip
+)
+_SPLIT = len(PARCEL_CANDIDATE_COLUMNS)
+
+
+def candidate_arrays(rows: list) -> CandidateArrays:
+    """
+    Transpose a batch of candidate rows into scoring columns
+    
+    One zip over the row tuples instead of one candidate object per row;
+    parcel-only rows get empty building columns.
+    """
+    columns = list(zip(*rows))
+    _, povrsina, ko_ime, _ = columns[:_SPLIT]
+    ko_ime_lc = map(lowercase, ko_ime)
+    if len(columns) == _SPLIT:
+        return CandidateArrays.from_columns(povrsina, ko_ime_lc)
+    _, leto_izgradnje, neto_tloris, naslov_ulica, tip = columns[_SPLIT:]
+    return CandidateArrays.from_columns(
+        povrsina, ko_ime_lc, leto_izgradnje, neto_tloris, map(lowercase, naslov_ulica), map(lowercase, tip)
+    )
+
+
+def split_candidate(row) -> tuple[ParcelCandidate, Optional[BuildingCandidate]]:
+    """(ParcelCandidate, Optional[BuildingCandidate]) of one candidate row"""
+    building = BuildingCandidate(*row[_SPLIT:]) if len(row) > _SPLIT else None
+    return ParcelCandidate(*row[:_SPLIT]), building
+
 
 class PropertyMatcher:
     """
@@ -31,7 +110,7 @@ class PropertyMatcher:
         """
         self.config = config if config else default_config
     
-    def find_probable_parcels(self, listing_data: dict) -> dict:
+    def find_probable_parcels(self, listing_data: dict, session: Optional[Session] = None) -> dict:
         """
         Find probable parcels matching listing data
         
@@ -46,6 +125,9 @@ class PropertyMatcher:
                 - net_floor_area_m2: float
                 - property_type: str ("Hiša", "Stanovanje", etc.)
                 - street_name: str
+            session: Optional open Session to run on, e.g. one shared across a
+                loop of listings; the caller owns its transaction. A new
+                session_scope() is opened when None
         
         Returns:
             Dictionary with results:
@@ -68,69 +150,40 @@ class PropertyMatcher:
             }
         
         try:
+            if session is not None:
+                return self._match(session, listing_data)
             with session_scope() as session:
-                # Step 1: Find candidate parcels
-                candidates = self._find_candidates(session, listing_data)
-                
-                if not candidates:
-                    return {
-                        'success': True,
-                        'message': 'No matching parcels found',
-                        'matches': [],
-                        'geojson': None,
-                        'count': 0
-                    }
-                
-                # Step 2: Calculate scores for all candidates
-                match_scores = []
-                for parcela, stavba in candidates:
-                    score = calculate_match_score(
-                        listing_data,
-                        parcela,
-                        stavba,
-                        self.config.scoring
-                    )
-                    match_scores.append(score)
-                
-                # Step 3: Filter by minimum confidence
-                filtered_scores = filter_by_confidence(
-                    match_scores,
-                    self.config.matching.min_confidence
-                )
-                
-                if not filtered_scores:
-                    return {
-                        'success': True,
-                        'message': f'Found candidates but none meet minimum confidence threshold of {self.config.matching.min_confidence}%',
-                        'matches': [],
-                        'geojson': None,
-                        'count': 0
-                    }
-                
-                # Step 4: Rank and get top N
-                top_matches = rank_candidates(
-                    filtered_scores,
-                    self.config.matching.max_results
-                )
-                
-                # Step 5: Convert to output format
-                from .geojson_utils import parcels_to_geojson
-                
-                matches_list = [self._match_to_dict(match) for match in top_matches]
-                geojson = parcels_to_geojson(top_matches, self.config.geojson)
-                
-                # Generate message
-                best_confidence = top_matches[0].confidence if top_matches else 0
-                message = f"AI je z {best_confidence:.1f}% verjetnostjo ugotovil, da gre za parcelo št. {top_matches[0].parcela.parcela_stevilka} v KO {top_matches[0].parcela.ko_ime}"
-                
-                return {
-                    'success': True,
-                    'message': message,
-                    'matches': matches_list,
-                    'geojson': geojson,
-                    'count': len(top_matches)
-                }
+                return self._match(session, listing_data)
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error during matching: {str(e)}',
+                'matches': [],
+                'geojson': None,
+                'count': 0
+            }
+    
+    async def find_probable_parcels_async(self, listing_data: dict) -> dict:
+        """
+        Async variant of find_probable_parcels for the API handlers
         
+        Same matching, run on the asyncpg engine: the sync matching code runs
+        through AsyncSession.run_sync, so every database wait yields to the
+        event loop instead of blocking the worker.
+        """
+        # Validate input
+        if not listing_data.get('settlement') or not listing_data.get('parcel_area_m2'):
+            return {
+                'success': False,
+                'message': 'Missing required fields: settlement and parcel_area_m2',
+                'matches': [],
+                'geojson': None,
+                'count': 0
+            }
+        
+        try:
+            async with async_session_scope() as session:
+                return await session.run_sync(self._match, listing_data)
         except Exception as e:
             return {
                 'success': False,
@@ -140,16 +193,97 @@ class PropertyMatcher:
                 'count': 0
             }
     
+    def _match(self, session: Session, listing_data: dict) -> dict:
+        """Run the matching steps on a (sync) session; input already validated"""
+        # Step 1: Find candidate parcels (rows streamed from a server-side cursor)
+        rows = self._find_candidates(session, listing_data)
+        min_confidence = self.config.matching.min_confidence
+        max_results = self.config.matching.max_results
+        
+        # Step 2 + 3: Score each YIELD_PER batch with NumPy as it streams in and keep
+        # only the running top N of those meeting the minimum confidence; candidate
+        # objects are built for the kept rows only
+        scanned = 0
+        passed = 0
+        best = []  # (total_score, position, parcela, stavba)
+        while batch := list(islice(rows, YIELD_PER)):
+            totals = calculate_match_score_batch(listing_data, candidate_arrays(batch), self.config.scoring)
+            keep = np.flatnonzero(self.config.scoring.calculate_confidence(totals) >= min_confidence)
+            passed += keep.size
+            # Equal scores keep query order, as rank_candidates does
+            keep = keep[top_k_from_totals(totals[keep], max_results)]
+            best = heapq.nsmallest(
+                max_results,
+                chain(best, ((int(totals[i]), scanned + int(i), *split_candidate(batch[i])) for i in keep)),
+                key=_rank_key
+            )
+            scanned += len(batch)
+        
+        if not scanned:
+            return {
+                'success': True,
+                'message': 'No matching parcels found',
+                'matches': [],
+                'geojson': None,
+                'count': 0
+            }
+        
+        if not passed:
+            return {
+                'success': True,
+                'message': f'Found candidates but none meet minimum confidence threshold of {self.config.matching.min_confidence}%',
+                'matches': [],
+                'geojson': None,
+                'count': 0
+            }
+        
+        # Step 4: Load the top N as ORM objects and build their full MatchScore
+        # (with breakdown), already ranked
+        parcele, stavbe = self._load_winners(session, best)
+        top_matches = [
+            calculate_match_score(
+                listing_data,
+                parcele[parcela.id],
+                stavbe[stavba.id] if stavba else None,
+                self.config.scoring
+            )
+            for _, _, parcela, stavba in best
+        ]
+        
+        # Step 5: Convert to output format
+        from .geojson_utils import parcels_to_geojson
+        
+        matches_list = matches_to_builtins(top_matches)
+        geojson = parcels_to_geojson(top_matches, self.config.geojson)
+        
+        # Generate message
+        best_confidence = top_matches[0].confidence if top_matches else 0
+        message = f"AI je z {best_confidence:.1f}% verjetnostjo ugotovil, da gre za parcelo št. {top_matches[0].parcela.parcela_stevilka} v KO {top_matches[0].parcela.ko_ime}"
+        
+        return {
+            'success': True,
+            'message': message,
+            'matches': matches_list,
+            'geojson': geojson,
+            'count': len(top_matches)
+        }
+    
     def _find_candidates(
         self,
         session: Session,
         listing_data: dict
-    ) -> List[tuple[Parcela, Optional[Stavba]]]:
+    ) -> Iterator[Row]:
         """
         Find candidate parcels using fuzzy SQL queries
         
+        Rows are fetched YIELD_PER at a time from a server-side cursor, so
+        memory stays flat however many parcels match the area range. Only the
+        scoring columns are selected, as Core rows; the winners are loaded as
+        ORM objects afterwards (_load_winners).
+        
         Returns:
-            List of tuples (Parcela, Optional[Stavba])
+            Iterator of rows: PARCEL_CANDIDATE_COLUMNS, followed by
+            BUILDING_CANDIDATE_COLUMNS when building data was given
         """
         # Extract search parameters
         settlement = listing_data['settlement']
@@ -159,17 +293,17 @@ class PropertyMatcher:
         area_min, area_max = self.config.matching.get_parcel_area_range(parcel_area)
         
         # Build base query for parcels
-        query = session.query(Parcela)
+        query = select(*PARCEL_CANDIDATE_COLUMNS)
         
-        # TEMPORARY FIX: Skip settlement filter since most parcels have "Imported" placeholder
+        # Off by default: most parcels still have the "Imported" placeholder as ko_ime
         # TODO: Add proper KO lookup table and update all parcel names
-        # settlement_filters = self._build_settlement_filter(settlement)
-        # query = query.filter(settlement_filters)
+        if self.config.matching.settlement_filter:
+            query = query.where(self._build_settlement_filter(settlement))
         
         logger.info(f"Searching for parcels with area {parcel_area}m² (±{self.config.matching.parcel_area_tolerance}%)")
         
         # Filter by parcel area (with tolerance)
-        query = query.filter(
+        query = query.where(
             and_(
                 Parcela.povrsina >= area_min,
                 Parcela.povrsina <= area_max
@@ -178,21 +312,30 @@ class PropertyMatcher:
         
         # If building data provided, join with stavbe table
         if ('construction_year' in listing_data or 'net_floor_area_m2' in listing_data):
-            return self._find_with_building_join(session, query, listing_data)
+            rows = self._find_with_building_join(session, query, listing_data)
         else:
             # Return parcels without building data
-            parcels = query.all()
-            return [(p, None) for p in parcels]
+            rows = session.execute(query.execution_options(yield_per=YIELD_PER))
+        
+        return rows
     
     def _build_settlement_filter(self, settlement: str):
-        """Build filter for settlement name with fuzzy matching"""
-        # Clean settlement name (remove district info)
-        main_settlement = settlement.split('-')[0].strip()
-        
-        # Simple pattern matching (can be enhanced with PostgreSQL full-text search)
-        return or_(
-            Parcela.ko_ime.ilike(f'%{main_settlement}%'),
-            Parcela.ko_ime.ilike(f'{main_settlement}%'),
+        """
+        Build filter for settlement name with fuzzy matching
+        
+        The whole fuzzy match happens in Postgres: no Python post-filter, so
+        settlement_similarity_threshold is the only threshold.
+        """
+        # Clean settlement name (remove district info), normalized like ko_ime_norm
+        main_settlement = normalize_settlement(settlement.split('-')[0].strip())
+        
+        # pg_trgm: % is answered by the trigram GIN index (idx_parcele_ko_ime_norm_trgm),
+        # unlike ILIKE '%...%' which scans; it applies the server's default
+        # pg_trgm.similarity_threshold (0.3), so the explicit similarity() check
+        # enforces the configured one without changing pooled connection state
+        return and_(
+            Parcela.ko_ime_norm.op('%')(main_settlement),
+            func.similarity(Parcela.ko_ime_norm, main_settlement) >= self.config.matching.settlement_similarity_threshold,
         )
     
     def _find_with_building_join(
@@ -200,12 +343,12 @@ class PropertyMatcher:
         session: Session,
         parcela_query,
         listing_data: dict
-    ) -> List[tuple[Parcela, Stavba]]:
+    ) -> Iterator[Row]:
         """
         Find candidates with building data join
         """
         # Join with stavbe table
-        query = parcela_query.join(Stavba, Parcela.id == Stavba.parcela_id)
+        query = parcela_query.join(Stavba, Parcela.id == Stavba.parcela_id).add_columns(*BUILDING_CANDIDATE_COLUMNS)
         
         # Add building filters if provided
         filters = []
@@ -231,34 +374,68 @@ class PropertyMatcher:
             )
         
         if filters:
-            query = query.filter(and_(*filters))
-        
-        # Execute query and get results
-        results = query.add_columns(Stavba).all()
+            query = query.where(and_(*filters))
         
-        # Results are tuples of (Parcela, Stavba)
-        return [(parcela, stavba) for parcela, stavba in results]
+        # Execute query and stream results
+        return session.execute(query.execution_options(yield_per=YIELD_PER))
     
-    def _match_to_dict(self, match_score: MatchScore) -> dict:
-        """Convert MatchScore to dictionary for JSON response"""
-        result = {
-            'parcela': match_score.parcela.to_dict(),
-            'confidence': round(match_score.confidence, 2),
-            'score': match_score.total_score,
-            'score_breakdown': match_score.breakdown,
-        }
+    def _load_winners(self, session: Session, best: list):
+        """
+        Load the top N candidates as ORM objects, two queries in total
+        
+        Parcels come with their simplified WGS84 GeoJSON rendered by PostGIS (geom_geojson);
+        relationships raise instead of lazy-loading, so output building can't
+        turn into 1+N queries.
+        
+        Returns:
+            ({parcela_id: Parcela}, {stavba_id: Stavba})
+        """
+        parcela_ids = [parcela.id for _, _, parcela, _ in best]
+        stavba_ids = [stavba.id for _, _, _, stavba in best if stavba]
+        # geom_web is already simplified and in WGS84; 6 decimals (~0.1 m) match its precision
+        geojson_expr = func.ST_AsGeoJSON(Parcela.geom_web, 6)
+        
+        parcele = session.execute(
+            select(Parcela)
+            .where(Parcela.id.in_(parcela_ids))
+            .options(defer(Parcela.geom), raiseload('*'), with_expression(Parcela.geom_geojson, geojson_expr))
+        ).scalars().all()
         
-        if match_score.stavba:
-            result['stavba'] = match_score.stavba.to_dict()
+        stavbe = []
+        if stavba_ids:
+            stavbe = session.execute(
+                select(Stavba).where(Stavba.id.in_(stavba_ids)).options(raiseload('*'))
+            ).scalars().all()
         
-        return result
+        return {p.id: p for p in parcele}, {s.id: s for s in stavbe}
 
 
 # Convenience function for direct use
-def find_probable_parcels(listing_data: dict, config: PropertyDetectiveConfig = None) -> dict:
+def find_probable_parcels(
+    listing_data: dict,
+    config: PropertyDetectiveConfig = None,
+    *,
+    session: Optional[Session] = None
+) -> dict:
     """
     Convenience function to find probable parcels
     
+    Args:
+        listing_data: Dictionary with listing information
+        config: Optional PropertyDetectiveConfig instance
+        session: Optional open Session to reuse (see PropertyMatcher.find_probable_parcels)
+    
+    Returns:
+        Dictionary with match results
+    """
+    matcher = PropertyMatcher(config)
+    return matcher.find_probable_parcels(listing_data, session=session)
+
+
+async def find_probable_parcels_async(listing_data: dict, config: PropertyDetectiveConfig = None) -> dict:
+    """
+    Convenience function to find probable parcels without blocking the event loop
+    
     Args:
         listing_data: Dictionary with listing information
         config: Optional PropertyDetectiveConfig instance
@@ -267,8 +444,8 @@ def find_probable_parcels(listing_data: dict, config: PropertyDetectiveConfig =
         Dictionary with match results
     """
     matcher = PropertyMatcher(config)
-    return matcher.find_probable_parcels(listing_data)
+    return await matcher.find_probable_parcels_async(listing_data)
 
 
 # Export
-__all__ = ['PropertyMatcher', 'find_probable_parcels']
+__all__ = ['PropertyMatcher', 'find_probable_parcels', 'find_probable_parcels_async']
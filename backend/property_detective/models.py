@@ -4,13 +4,22 @@ Maps to PostGIS database tables
 """
 
 from datetime import datetime
+from functools import cached_property
 from typing import Optional, List
 
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey
-from sqlalchemy.orm import DeclarativeBase, relationship, Mapped, mapped_column
+from sqlalchemy import Column, Computed, Integer, String, Numeric, DateTime, ForeignKey
+from sqlalchemy.orm import DeclarativeBase, relationship, Mapped, mapped_column, deferred, query_expression
 from geoalchemy2 import Geometry
-from geoalchemy2.shape import to_shape
-from shapely.geometry import shape
+
+
+def lowercase(value: Optional[str]) -> Optional[str]:
+    """
+    Lowercase text for case-insensitive scoring (None stays None)
+
+    The one place scored text is lowercased: both the ORM properties below and the
+    matcher's Core candidate rows use it, so a candidate scores the same either way.
+    """
+    return value.lower() if value is not None else None
 
 
 class Base(DeclarativeBase):
@@ -32,12 +41,29 @@ class Parcela(Base):
     parcela_stevilka: Mapped[str] = mapped_column(String(50), nullable=False)
     ko_sifra: Mapped[str] = mapped_column(String(10), nullable=False)
     ko_ime: Mapped[str] = mapped_column(String(100), nullable=False)
+    # Lowercased, punctuation-free ko_ime maintained by Postgres for fuzzy settlement matching
+    ko_ime_norm: Mapped[str] = mapped_column(
+        String(100),
+        Computed("lower(regexp_replace(ko_ime, '[[:punct:]]', '', 'g'))", persisted=True)
+    )
     
     # Parcel properties
     povrsina: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
     
     # Spatial data (Slovenian coordinate system D96/TM - EPSG:3794)
     geom = Column(Geometry('POLYGON', srid=3794))
+    # Web Mercator copy maintained by Postgres (vector tiles); never loaded by default
+    geom_3857 = deferred(Column(
+        Geometry('GEOMETRY', srid=3857),
+        Computed("ST_Transform(ST_Force2D(ST_SetSRID(geom, 3794)), 3857)", persisted=True)
+    ))
+    # Simplified (~1 m) WGS84 copy maintained by Postgres for GeoJSON responses; never loaded by default
+    geom_web = deferred(Column(
+        Geometry('GEOMETRY', srid=4326),
+        Computed("ST_Transform(ST_SimplifyPreserveTopology(ST_Force2D(ST_SetSRID(geom, 3794)), 1.0), 4326)", persisted=True)
+    ))
+    # GeoJSON text of geom_web rendered by PostGIS, loaded on demand via with_expression()
+    geom_geojson: Mapped[Optional[str]] = query_expression()
     
     # Metadata
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -62,6 +88,11 @@ class Parcela(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
     
+    @cached_property
+    def ko_ime_lc(self) -> str:
+        """Lowercased ko_ime for scoring, computed once per instance"""
+        return lowercase(self.ko_ime)
+    
     def get_geometry_wgs84(self):
         """Get geometry converted to WGS84 (EPSG:4326) for web mapping"""
         if self.geom:
@@ -123,6 +154,16 @@ class Stavba(Base):
             'naslov': self.get_full_address(),
         }
     
+    @cached_property
+    def naslov_ulica_lc(self) -> Optional[str]:
+        """Lowercased naslov_ulica for scoring, computed once per instance"""
+        return lowercase(self.naslov_ulica)
+    
+    @cached_property
+    def tip_lc(self) -> Optional[str]:
+        """Lowercased tip for scoring, computed once per instance"""
+        return lowercase(self.tip)
+    
     def get_full_address(self) -> Optional[str]:
         """Get formatted full address"""
         parts = []
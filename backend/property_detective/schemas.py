@@ -0,0 +1,91 @@
+"""
+Response Schemas for PropertyDetective
+msgspec Structs mirroring the ORM to_dict() output, converted to builtins in C
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import msgspec
+
+from .models import Parcela, Stavba
+from .scoring import MatchScore
+
+
+class ParcelaOut(msgspec.Struct):
+    """Same fields as Parcela.to_dict()"""
+    id: int
+    parcela_stevilka: str
+    ko_sifra: str
+    ko_ime: str
+    povrsina: float
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+class StavbaOut(msgspec.Struct):
+    """Same fields as Stavba.to_dict()"""
+    id: int
+    parcela_id: int
+    stavba_stevilka: Optional[str]
+    leto_izgradnje: Optional[int]
+    neto_tloris: Optional[float]
+    stevilo_etaz: Optional[int]
+    tip: Optional[str]
+    naslov: Optional[str]
+
+
+class MatchOut(msgspec.Struct, omit_defaults=True):
+    """One ranked match; 'stavba' is left out when the parcel has no building"""
+    parcela: ParcelaOut
+    confidence: float
+    score: int
+    score_breakdown: Dict[str, int]
+    stavba: Optional[StavbaOut] = None
+
+
+def parcela_out(parcela: Parcela) -> ParcelaOut:
+    return ParcelaOut(
+        id=parcela.id,
+        parcela_stevilka=parcela.parcela_stevilka,
+        ko_sifra=parcela.ko_sifra,
+        ko_ime=parcela.ko_ime,
+        povrsina=float(parcela.povrsina),
+        created_at=parcela.created_at,
+        updated_at=parcela.updated_at,
+    )
+
+
+def stavba_out(stavba: Stavba) -> StavbaOut:
+    return StavbaOut(
+        id=stavba.id,
+        parcela_id=stavba.parcela_id,
+        stavba_stevilka=stavba.stavba_stevilka,
+        leto_izgradnje=stavba.leto_izgradnje,
+        neto_tloris=float(stavba.neto_tloris) if stavba.neto_tloris else None,
+        stevilo_etaz=stavba.stevilo_etaz,
+        tip=stavba.tip,
+        naslov=stavba.get_full_address(),
+    )
+
+
+def matches_to_builtins(match_scores: List[MatchScore]) -> List[dict]:
+    """
+    Convert ranked matches to plain dicts for the JSON response
+
+    Datetimes become ISO strings inside msgspec's single to_builtins pass,
+    instead of per-field isoformat() calls in to_dict().
+    """
+    return msgspec.to_builtins([
+        MatchOut(
+            parcela=parcela_out(ms.parcela),
+            confidence=ms.confidence,
+            score=ms.total_score,
+            score_breakdown=ms.breakdown,
+            stavba=stavba_out(ms.stavba) if ms.stavba else None,
+        )
+        for ms in match_scores
+    ])
+
+
+__all__ = ['ParcelaOut', 'StavbaOut', 'MatchOut', 'matches_to_builtins']
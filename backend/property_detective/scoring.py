@@ -3,18 +3,38 @@ Scoring Algorithm for PropertyDetective
 Calculates match confidence scores for parcel candidates
 """
 
-from typing import Dict, List, Tuple, Optional
+import heapq
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple, Union, Optional
 from dataclasses import dataclass
 
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
 from .models import Parcela, Stavba
 from .config import ScoringConfig, default_config
 
+# Listing property_type words -> type category
+LISTING_TYPE_KEYWORDS = {
+    'hiša': 'house', 'house': 'house',
+    'stanovanje': 'apartment', 'apartment': 'apartment',
+}
+
+# Stavba tip word stems -> building category (stanovanjska, večstanovanjska, ...)
+STAVBA_TIP_STEMS = {'stanov': 'residential'}
+
+# Listing category -> building categories that earn the building type bonus
+BUILDING_TYPE_MATCHES = {'house': frozenset({'residential'})}
+
+_WORD_RE = re.compile(r'\w+')
+
 
 @dataclass
 class MatchScore:
     """Container for match score details"""
     total_score: int
-    confidence: float
+    confidence: float  # Percentage, already at two decimals (no round() when output is built)
     breakdown: Dict[str, int]
     parcela: Parcela
     stavba: Optional[Stavba] = None
@@ -23,7 +43,7 @@ class MatchScore:
         """Convert to dictionary for JSON serialization"""
         return {
             'total_score': self.total_score,
-            'confidence': round(self.confidence, 2),
+            'confidence': self.confidence,
             'breakdown': self.breakdown,
             'parcela_id': self.parcela.id,
             'stavba_id': self.stavba.id if self.stavba else None,
@@ -41,8 +61,8 @@ def calculate_match_score(
     
     Args:
         listing_data: Dictionary with listing information from scraper
-        parcela: Parcela ORM instance
-        stavba: Optional Stavba ORM instance (for houses/apartments)
+        parcela: Parcela ORM instance (or any object with its scoring attributes)
+        stavba: Optional Stavba ORM instance (for houses/apartments), same
         config: ScoringConfig instance (uses default if None)
     
     Returns:
@@ -61,6 +81,20 @@ def calculate_match_score(
     if config is None:
         config = default_config.scoring
     
+    total, breakdown = _score(listing_data, parcela, stavba, config)
+    
+    return MatchScore(
+        total_score=total,
+        # Hundredths rounded in integer math, so the float needs no round() later
+        confidence=config.calculate_confidence_bps(total) / 100,
+        breakdown=breakdown,
+        parcela=parcela,
+        stavba=stavba
+    )
+
+
+def _score(listing_data: dict, parcela, stavba, config: ScoringConfig) -> Tuple[int, Dict[str, int]]:
+    """Points per criterion for one candidate (body of calculate_match_score)"""
     score_breakdown = {}
     total = 0
     
@@ -68,7 +102,9 @@ def calculate_match_score(
     if 'parcel_area_m2' in listing_data and listing_data['parcel_area_m2']:
         listing_area = float(listing_data['parcel_area_m2'])
         parcela_area = float(parcela.povrsina)
-        area_diff_pct = abs(listing_area - parcela_area) / listing_area * 100
+        
+        # Equal areas (the common case for true matches) skip the percentage math
+        area_diff_pct = 0.0 if listing_area == parcela_area else abs(listing_area - parcela_area) / listing_area * 100
         
         if area_diff_pct <= 0.1:  # Exact match (within 0.1%)
             score_breakdown['parcel_area'] = config.parcel_area_weight
@@ -85,11 +121,9 @@ def calculate_match_score(
     if stavba and 'construction_year' in listing_data and listing_data['construction_year']:
         listing_year = int(listing_data['construction_year'])
         if stavba.leto_izgradnje:
-            year_diff = abs(listing_year - stavba.leto_izgradnje)
-            
-            if year_diff == 0:  # Exact match
+            if listing_year == stavba.leto_izgradnje:  # Exact match
                 score_breakdown['construction_year'] = config.construction_year_weight
-            elif year_diff <= 1:  # ±1 year
+            elif abs(listing_year - stavba.leto_izgradnje) <= 1:  # ±1 year
                 score_breakdown['construction_year'] = int(config.construction_year_weight * config.year_near_match_multiplier)
             else:
                 score_breakdown['construction_year'] = 0
@@ -101,7 +135,10 @@ def calculate_match_score(
         listing_floor_area = float(listing_data['net_floor_area_m2'])
         if stavba.neto_tloris:
             stavba_floor_area = float(stavba.neto_tloris)
-            floor_diff_pct = abs(listing_floor_area - stavba_floor_area) / listing_floor_area * 100
+            floor_diff_pct = (
+                0.0 if listing_floor_area == stavba_floor_area
+                else abs(listing_floor_area - stavba_floor_area) / listing_floor_area * 100
+            )
             
             if floor_diff_pct <= 0.1:  # Exact match (within 0.1 m²)
                 score_breakdown['building_area'] = config.building_area_weight
@@ -114,22 +151,22 @@ def calculate_match_score(
             
             total += score_breakdown['building_area']
     
-    # 4. Bonus: Street Name Match (+15 points)
+    # 4. Bonus: Street Name Match (+15 points); token set ratio tolerates word order,
+    # extra tokens ("cesta", house numbers) and punctuation
     if stavba and 'street_name' in listing_data and listing_data['street_name']:
         listing_street = listing_data['street_name'].lower()
-        if stavba.naslov_ulica and listing_street in stavba.naslov_ulica.lower():
+        min_ratio = config.street_match_min_ratio
+        if stavba.naslov_ulica_lc and fuzz.token_set_ratio(
+            listing_street, stavba.naslov_ulica_lc, processor=utils.default_process, score_cutoff=min_ratio
+        ) >= min_ratio:
             score_breakdown['street_match'] = config.street_match_bonus
             total += config.street_match_bonus
     
     # 5. Bonus: Building Type Match (+10 points)
-    if stavba and 'property_type' in listing_data:
-        listing_type = listing_data['property_type'].lower()
-        if stavba.tip:
-            # Simple matching (can be enhanced with mapping)
-            if 'hiša' in listing_type or 'house' in listing_type:
-                if 'stanov' in stavba.tip.lower():  # stanovanjska
-                    score_breakdown['building_type'] = config.building_type_bonus
-                    total += config.building_type_bonus
+    if stavba and stavba.tip_lc and listing_data.get('property_type'):
+        if _wanted_building_types(listing_data['property_type']) & _stavba_tip_types(stavba.tip_lc):
+            score_breakdown['building_type'] = config.building_type_bonus
+            total += config.building_type_bonus
     
     # 6. Bonus: Settlement Match (+5 points)
     if 'settlement' in listing_data and listing_data['settlement']:
@@ -137,22 +174,225 @@ def calculate_match_score(
         # Extract main settlement name (remove district info like "- Center")
         main_settlement = listing_settlement.split('-')[0].strip()
         
-        if main_settlement in parcela.ko_ime.lower():
+        if main_settlement in parcela.ko_ime_lc:
             score_breakdown['settlement_match'] = config.settlement_match_bonus
             total += config.settlement_match_bonus
     
-    # Calculate confidence percentage
-    confidence = config.calculate_confidence(total)
+    return total, score_breakdown
+
+
+# Upper bounds (inclusive) of each scoring tier, best tier first; same as calculate_match_score
+PARCEL_AREA_TIERS = np.array([0.1, 0.5, 1.0])  # % difference
+YEAR_TIERS = np.array([0, 1])  # years difference
+BUILDING_AREA_TIERS = np.array([0.1, 1.0, 2.0])  # % difference
+
+
+@lru_cache(maxsize=1024)
+def _wanted_building_types(property_type: str) -> frozenset:
+    """
+    Building categories that match a listing's property_type
     
-    return MatchScore(
-        total_score=total,
-        confidence=confidence,
-        breakdown=score_breakdown,
-        parcela=parcela,
-        stavba=stavba
+    Words are looked up in LISTING_TYPE_KEYWORDS once per distinct
+    property_type; new keywords only need a table entry.
+    """
+    categories = {LISTING_TYPE_KEYWORDS.get(word) for word in _WORD_RE.findall(property_type.lower())}
+    return frozenset().union(*(BUILDING_TYPE_MATCHES.get(c, ()) for c in categories))
+
+
+@lru_cache(maxsize=1024)
+def _stavba_tip_types(tip_lc: str) -> frozenset:
+    """Building categories of a (lowercased) stavba tip, from STAVBA_TIP_STEMS"""
+    return frozenset(
+        category
+        for word in _WORD_RE.findall(tip_lc)
+        for stem, category in STAVBA_TIP_STEMS.items()
+        if stem in word
     )
 
 
+def _tier_points(diffs: np.ndarray, tiers: np.ndarray, points: List[int]) -> np.ndarray:
+    """
+    Points per candidate for a tiered feature, branchless
+    
+    searchsorted gives the first tier whose bound is >= the difference;
+    differences past the last bound index the trailing 0.
+    """
+    return np.array(points + [0], dtype=np.int64)[np.searchsorted(tiers, diffs, side='left')]
+
+
+def _contains_mask(needle: str, haystacks: Iterable[Optional[str]], n: int) -> np.ndarray:
+    """
+    Boolean array of `needle in haystack` (False for None/empty)
+    
+    Candidates repeat a handful of values (one ko_ime per settlement, a few
+    streets and building types), so each distinct value is scanned once.
+    """
+    hits = {}
+    
+    def contains(haystack):
+        hit = hits.get(haystack)
+        if hit is None:
+            hit = hits[haystack] = bool(haystack) and needle in haystack
+        return hit
+    
+    return np.fromiter(map(contains, haystacks), dtype=bool, count=n)
+
+
+def _street_mask(listing_street: str, streets: List[Optional[str]], min_ratio: int) -> np.ndarray:
+    """
+    Boolean array of token_set_ratio(listing_street, street) >= min_ratio
+    
+    Distinct streets are scored in one RapidFuzz cdist call (C++, all cores).
+    """
+    unique = list({street for street in streets if street})
+    if not unique:
+        return np.zeros(len(streets), dtype=bool)
+    ratios = process.cdist(
+        [listing_street], unique, scorer=fuzz.token_set_ratio,
+        processor=utils.default_process, score_cutoff=min_ratio, workers=-1
+    )[0]
+    matched = {street for street, ratio in zip(unique, ratios) if ratio >= min_ratio}
+    return np.fromiter((street in matched for street in streets), dtype=bool, count=len(streets))
+
+
+@dataclass
+class CandidateArrays:
+    """
+    Scoring fields of a candidate batch, one contiguous column per field
+    
+    Numeric fields are arrays with 0 for no building / unknown value; text
+    fields are lowercased (None when missing).
+    """
+    povrsina: np.ndarray  # float64
+    ko_ime_lc: List[Optional[str]]
+    leto_izgradnje: np.ndarray  # int64
+    neto_tloris: np.ndarray  # float64
+    naslov_ulica_lc: List[Optional[str]]
+    tip_lc: List[Optional[str]]
+    
+    def __len__(self) -> int:
+        return len(self.povrsina)
+    
+    @classmethod
+    def from_columns(
+        cls,
+        povrsina: Sequence,
+        ko_ime_lc: Sequence[Optional[str]],
+        leto_izgradnje: Optional[Sequence] = None,
+        neto_tloris: Optional[Sequence] = None,
+        naslov_ulica_lc: Optional[Sequence[Optional[str]]] = None,
+        tip_lc: Optional[Sequence[Optional[str]]] = None
+    ) -> 'CandidateArrays':
+        """Build from per-field value sequences (e.g. transposed query rows); building fields default to none"""
+        n = len(povrsina)
+        missing = (None,) * n
+        return cls(
+            povrsina=np.fromiter(map(float, povrsina), dtype=np.float64, count=n),
+            ko_ime_lc=list(ko_ime_lc),
+            leto_izgradnje=np.fromiter((v or 0 for v in leto_izgradnje or missing), dtype=np.int64, count=n),
+            neto_tloris=np.fromiter((float(v) if v else 0.0 for v in neto_tloris or missing), dtype=np.float64, count=n),
+            naslov_ulica_lc=list(naslov_ulica_lc or missing),
+            tip_lc=list(tip_lc or missing),
+        )
+    
+    @classmethod
+    def from_candidates(cls, candidates: List[Tuple[Parcela, Optional[Stavba]]]) -> 'CandidateArrays':
+        """Build from (parcel, Optional[building]) pairs"""
+        stavbe = [s for _, s in candidates]
+        return cls.from_columns(
+            [p.povrsina for p, _ in candidates],
+            [p.ko_ime_lc for p, _ in candidates],
+            [s.leto_izgradnje if s else None for s in stavbe],
+            [s.neto_tloris if s else None for s in stavbe],
+            [s.naslov_ulica_lc if s else None for s in stavbe],
+            [s.tip_lc if s else None for s in stavbe],
+        )
+
+
+def calculate_match_score_batch(
+    listing_data: dict,
+    candidates: Union[CandidateArrays, List[Tuple[Parcela, Optional[Stavba]]]],
+    config: ScoringConfig = None
+) -> np.ndarray:
+    """
+    Vectorized total scores for a batch of candidates
+    
+    Same points as calculate_match_score, computed with NumPy over the whole
+    batch instead of one Python call per candidate. Only totals are returned;
+    build MatchScore objects (with breakdown) for the winners only.
+    
+    Args:
+        listing_data: Dictionary with listing information
+        candidates: CandidateArrays, or (parcel, Optional[building]) tuples
+            (ORM instances or any objects with their scoring attributes)
+        config: ScoringConfig instance (uses default if None)
+    
+    Returns:
+        int64 array of total scores, aligned with candidates
+    """
+    if config is None:
+        config = default_config.scoring
+    
+    if not isinstance(candidates, CandidateArrays):
+        candidates = CandidateArrays.from_candidates(candidates)
+    n = len(candidates)
+    totals = np.zeros(n, dtype=np.int64)
+    
+    # 1. Parcel Area Matching
+    if listing_data.get('parcel_area_m2'):
+        listing_area = float(listing_data['parcel_area_m2'])
+        area_diff_pct = np.abs(listing_area - candidates.povrsina) / listing_area * 100
+        totals += _tier_points(area_diff_pct, PARCEL_AREA_TIERS, [
+            config.parcel_area_weight,
+            int(config.parcel_area_weight * config.area_near_match_multiplier),
+            int(config.parcel_area_weight * config.area_fuzzy_match_multiplier),
+        ])
+    
+    # 2. Construction Year Matching (0 = no building / unknown year)
+    if listing_data.get('construction_year'):
+        listing_year = int(listing_data['construction_year'])
+        years = candidates.leto_izgradnje
+        year_diff = np.abs(listing_year - years)
+        totals += np.where(years != 0, _tier_points(year_diff, YEAR_TIERS, [
+            config.construction_year_weight,
+            int(config.construction_year_weight * config.year_near_match_multiplier),
+        ]), 0)
+    
+    # 3. Building Floor Area Matching (0 = no building / unknown area)
+    if listing_data.get('net_floor_area_m2'):
+        listing_floor_area = float(listing_data['net_floor_area_m2'])
+        floor_areas = candidates.neto_tloris
+        floor_diff_pct = np.abs(listing_floor_area - floor_areas) / listing_floor_area * 100
+        totals += np.where(floor_areas != 0, _tier_points(floor_diff_pct, BUILDING_AREA_TIERS, [
+            config.building_area_weight,
+            int(config.building_area_weight * config.area_near_match_multiplier),
+            int(config.building_area_weight * config.area_fuzzy_match_multiplier),
+        ]), 0)
+    
+    # 4-6. String bonuses, each distinct value tested once
+    if listing_data.get('street_name'):
+        listing_street = listing_data['street_name'].lower()
+        totals += config.street_match_bonus * _street_mask(
+            listing_street, candidates.naslov_ulica_lc, config.street_match_min_ratio
+        )
+    
+    if listing_data.get('property_type'):
+        wanted = _wanted_building_types(listing_data['property_type'])
+        if wanted:
+            totals += config.building_type_bonus * np.fromiter(
+                (bool(tip_lc and wanted & _stavba_tip_types(tip_lc)) for tip_lc in candidates.tip_lc),
+                dtype=bool, count=n
+            )
+    
+    if listing_data.get('settlement'):
+        main_settlement = listing_data['settlement'].lower().split('-')[0].strip()
+        totals += config.settlement_match_bonus * _contains_mask(
+            main_settlement, candidates.ko_ime_lc, n
+        )
+    
+    return totals
+
+
 def rank_candidates(
     match_scores: List[MatchScore],
     max_results: int = 3
@@ -167,11 +407,25 @@ def rank_candidates(
     Returns:
         Sorted list of top match scores
     """
-    # Sort by total score descending
-    sorted_scores = sorted(match_scores, key=lambda x: x.total_score, reverse=True)
+    # Top N by total score without sorting the rest (ties keep input order, like sorted())
+    return heapq.nlargest(max_results, match_scores, key=lambda x: x.total_score)
+
+
+def top_k_from_totals(totals: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest totals, highest first
     
-    # Return top N results
-    return sorted_scores[:max_results]
+    np.argpartition narrows to the k best without a full sort; ties keep
+    input order, as in rank_candidates.
+    """
+    if k <= 0 or totals.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < totals.size:
+        kth = np.partition(totals, totals.size - k)[totals.size - k]
+        top = np.flatnonzero(totals >= kth)
+    else:
+        top = np.arange(totals.size)
+    return top[np.argsort(-totals[top], kind='stable')][:k]
 
 
 def filter_by_confidence(
@@ -192,4 +446,7 @@ def filter_by_confidence(
 
 
 # Export
-__all__ = ['MatchScore', 'calculate_match_score', 'rank_candidates', 'filter_by_confidence']
+__all__ = [
+    'MatchScore', 'CandidateArrays', 'calculate_match_score', 'calculate_match_score_batch',
+    'rank_candidates', 'top_k_from_totals', 'filter_by_confidence'
+]
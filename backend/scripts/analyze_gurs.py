@@ -6,11 +6,14 @@ import zipfile
 def analyze_zip(zip_path):
     print(f"📦 Checking: {os.path.basename(zip_path)}")
     try:
-        if not zipfile.is_zipfile(zip_path):
+        # Opening parses the central directory once; is_zipfile() would parse it again
+        try:
+            zf = zipfile.ZipFile(zip_path, 'r')
+        except zipfile.BadZipFile:
             print("   ❌ Not a valid zip file.")
             return
 
-        with zipfile.ZipFile(zip_path, 'r') as zf:
+        with zf:
             files = zf.namelist()
             
             # Check for Shapefiles (.shp)
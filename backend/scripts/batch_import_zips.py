@@ -1,9 +1,9 @@
 import os
 import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor
 import geopandas as gpd
 from sqlalchemy import create_engine
-import pandas as pd
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -11,13 +11,52 @@ logger = logging.getLogger(__name__)
 # Add backend to path to import connection.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 try:
-    from database.connection import get_engine
+    from database.connection import get_engine, refresh_parcel_tiles
 except ImportError:
     # Fallback if run from root
-    from backend.database.connection import get_engine
+    from backend.database.connection import get_engine, refresh_parcel_tiles
+from chunked_reader import read_chunks, reproject, set_reproject_threads
+from bulk_copy import copy_gdf, create_staging_table, merge_staging_table
+
+# Rename columns to match schema (handle common GURS variants)
+COLUMN_MAP = {
+    'PAR_ST': 'parcela_stevilka',
+    'PARCELA_ST': 'parcela_stevilka',
+    'KO_SIFRA': 'ko_sifra', 
+    'KO_IME': 'ko_ime',
+    'POVRSINA': 'povrsina',
+    'POV_PARC': 'povrsina',
+    'STAVBA_ST': 'stavba_stevilka',
+    'ST_ETAZ': 'stevilo_etaz',
+    'LETO_IZG': 'leto_izgradnje',
+    'NETO_TLOR': 'neto_tloris',
+    'DELEZ': 'delez',
+    'VRSTA': 'vrsta',
+    'IME': 'ime',
+    'PRIIMEK': 'priimek',
+    'NAZIV': 'ime' # For companies
+}
+
+def prepare_chunk(gdf):
+    """Reproject and map one chunk of GURS features to the table schema"""
+    # Reproject if needed
+    gdf = reproject(gdf, "EPSG:3794")
+    
+    gdf = gdf.rename(columns=COLUMN_MAP)
+    
+    # Ensure we only have lowercase columns (Postgres convention)
+    gdf.columns = [c.lower() for c in gdf.columns]
+    
+    # Set geometry column and rename
+    if 'geometry' in gdf.columns:
+        gdf = gdf.set_geometry('geometry')
+    gdf = gdf.rename_geometry('geom')
+    
+    # created_at/updated_at come from the column defaults (ensure_timestamp_defaults)
+    return gdf
 
 def import_from_zip(zip_path, shapefile_name, table_name, engine):
-    """Import shapefile directly from ZIP"""
+    """Import shapefile directly from ZIP, streamed in chunks"""
     logger.info(f"\n📦 Importing from ZIP: {os.path.basename(zip_path)}")
     logger.info(f"   Target shapefile: {shapefile_name}")
     
@@ -26,63 +65,32 @@ def import_from_zip(zip_path, shapefile_name, table_name, engine):
         zip_url = f"zip://{zip_path}!{shapefile_name}"
         logger.info(f"   Reading from: {zip_url}")
         
-        gdf = gpd.read_file(zip_url)
-        logger.info(f"   ✅ Loaded {len(gdf)} records")
-        logger.info(f"   Columns: {list(gdf.columns)[:10]}")
-        
-        # Reproject if needed
-        if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
-            logger.info(f"   -> Reprojecting to EPSG:3794...")
-            gdf = gdf.to_crs("EPSG:3794")
+        total = 0
+        columns = []
         
-        # Rename columns to match schema (handle common GURS variants)
-        column_map = {
-            'PAR_ST': 'parcela_stevilka',
-            'PARCELA_ST': 'parcela_stevilka',
-            'KO_SIFRA': 'ko_sifra', 
-            'KO_IME': 'ko_ime',
-            'POVRSINA': 'povrsina',
-            'POV_PARC': 'povrsina',
-            'STAVBA_ST': 'stavba_stevilka',
-            'ST_ETAZ': 'stevilo_etaz',
-            'LETO_IZG': 'leto_izgradnje',
-            'NETO_TLOR': 'neto_tloris',
-            'DELEZ': 'delez',
-            'VRSTA': 'vrsta',
-            'IME': 'ime',
-            'PRIIMEK': 'priimek',
-            'NAZIV': 'ime' # For companies
-        }
-        gdf.rename(columns=column_map, inplace=True)
+        # Chunks land in an unlogged, index-free staging table when the target exists
+        staging = create_staging_table(table_name, engine)
         
-        # Ensure we only have lowercase columns (Postgres convention)
-        gdf.columns = [c.lower() for c in gdf.columns]
-        
-        logger.info(f"   -> Mapped columns: {list(gdf.columns)[:10]}")
-
-        # Set geometry column and rename
-        if 'geometry' in gdf.columns:
-            gdf = gdf.set_geometry('geometry')
-        gdf = gdf.rename_geometry('geom')
-        
-        # Add metadata
-        now = pd.Timestamp.now()
-        gdf['created_at'] = now
-        gdf['updated_at'] = now
+        # One chunk in memory at a time: read, map, insert, drop
+        for chunk in read_chunks(zip_url):
+            if total == 0:
+                logger.info(f"   Columns: {list(chunk.columns)[:10]}")
+            gdf = prepare_chunk(chunk)
+            if total == 0:
+                logger.info(f"   -> Mapped columns: {list(gdf.columns)[:10]}")
+                logger.info(f"   -> Inserting into {table_name}...")
+            
+            copy_gdf(gdf, staging or table_name, engine)
+            columns = list(gdf.columns)
+            total += len(gdf)
+            logger.info(f"   ... {total} records")
         
-        # Insert into database
-        logger.info(f"   -> Inserting into {table_name}...")
-        gdf.to_postgis(
-            table_name,
-            engine,
-            if_exists='append',
-            index=False,
-            dtype={'geom': 'Geometry'},
-            chunksize=5000
-        )
+        if staging:
+            logger.info(f"   -> Moving staged rows into {table_name}...")
+            merge_staging_table(staging, table_name, columns, engine)
         
-        logger.info(f"   🎉 Successfully imported {len(gdf)} records to {table_name}")
-        return len(gdf)
+        logger.info(f"   🎉 Successfully imported {total} records to {table_name}")
+        return total
         
     except Exception as e:
         logger.error(f"   ❌ Error: {e}")
@@ -95,7 +103,7 @@ def import_from_shapefile(shapefile_path, table_name, engine, zone_type=None):
     logger.info(f"\n📂 Importing Shapefile: {os.path.basename(shapefile_path)}")
     
     try:
-        gdf = gpd.read_file(shapefile_path)
+        gdf = gpd.read_file(shapefile_path, engine='pyogrio', use_arrow=True)
         logger.info(f"   ✅ Loaded {len(gdf)} records")
         
         if len(gdf) == 0:
@@ -103,31 +111,19 @@ def import_from_shapefile(shapefile_path, table_name, engine, zone_type=None):
             return 0
             
         # Reproject if needed
-        if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
-            logger.info(f"   -> Reprojecting to EPSG:3794...")
-            gdf = gdf.to_crs("EPSG:3794")
+        gdf = reproject(gdf, "EPSG:3794")
         
         # Set geometry column and rename
         gdf = gdf.set_geometry('geometry')
         gdf = gdf.rename_geometry('geom')
         
-        # Add metadata
-        now = pd.Timestamp.now()
-        gdf['created_at'] = now
-        gdf['updated_at'] = now
+        # Add metadata (created_at/updated_at come from the column defaults)
         if zone_type:
             gdf['zone_type'] = zone_type
         
         # Insert into database
         logger.info(f"   -> Inserting into {table_name}...")
-        gdf.to_postgis(
-            table_name,
-            engine,
-            if_exists='append',
-            index=False,
-            dtype={'geom': 'Geometry'},
-            chunksize=5000
-        )
+        copy_gdf(gdf, table_name, engine)
         
         logger.info(f"   🎉 Imported {len(gdf)} records to {table_name}")
         return len(gdf)
@@ -136,34 +132,74 @@ def import_from_shapefile(shapefile_path, table_name, engine, zone_type=None):
         logger.error(f"   ❌ Error: {e}")
         return 0
 
-def main():
+GURS_DIR = 'gurs_data/KN_SLO_STAVBE_SLO_20260111'
+HYDRO_DIR = 'gurs_data/DTM_SLO_HIDROGRAFIJA_20260110'
+
+# Independent layers, one target table each: (zip_path, shapefile_name, table_name)
+ZIP_IMPORTS = [
+    # 1. Parcels (Base Layer)
+    (f'{GURS_DIR}/KN_SLO_PARCELE_SLO_20260111/KN_SLO_PARCELE_SLO_parcele_20260111.zip',
+     'KN_SLO_PARCELE_SLO_PARCELE_poligon.shp', 'parcele'),
+    # 2. Buildable Parcels (Gradbene Parcele)
+    (f'{GURS_DIR}/KN_SLO_PARCELE_SLO_20260111/KN_SLO_PARCELE_SLO_gradbene_parcele_20260111.zip',
+     'KN_SLO_PARCELE_SLO_GRADBENE_PARCELE.shp', 'gradbene_parcele'),
+    # 4. Building Attributes (critical for search)
+    (f'{GURS_DIR}/KN_SLO_STAVBE_SLO_stavbe_20260111.zip',
+     'KN_SLO_STAVBE_SLO_STAVBE_tocka.shp', 'stavbe_attributes'),
+    # 5. Building-Parcel Links (critical for linking)
+    (f'{GURS_DIR}/KN_SLO_STAVBE_SLO_stavbe_parcele_20260111.zip',
+     'KN_SLO_STAVBE_SLO_STAVBE_PARCELE_poligon.shp', 'stavbe_parcele'),
+    # 6. Hydrography - Flowing Water (Lines)
+    (f'{HYDRO_DIR}/DTM_SLO_HIDROGRAFIJA_HY_TEKOCE_VODE_L_20260110.zip',
+     'DTM_SLO_HIDROGRAFIJA_HY_TEKOCEVODE_L_line.shp', 'water_flowing_lines'),
+    # 7. Hydrography - Flowing Water (Polygons)
+    (f'{HYDRO_DIR}/DTM_SLO_HIDROGRAFIJA_HY_TEKOCE_VODE_P_20260110.zip',
+     'DTM_SLO_HIDROGRAFIJA_HY_TEKOCEVODE_P_poligon.shp', 'water_flowing_polygons'),
+    # 8. Hydrography - Standing Water
+    (f'{HYDRO_DIR}/DTM_SLO_HIDROGRAFIJA_HY_STOJECE_VODE_P_20260110.zip',
+     'DTM_SLO_HIDROGRAFIJA_HY_STOJECEVODE_P_poligon.shp', 'water_standing'),
+]
+
+# Layers imported at once; each worker holds one chunk and one COPY connection
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '4'))
+
+def _init_worker(workers):
+    """Split the reprojection threads between the layer processes"""
+    set_reproject_threads(workers)
+
+def _import_one(task):
+    """Worker: import one ZIP layer over the worker's own connections"""
+    zip_path, shapefile_name, table_name = task
     engine = get_engine()
-    
+    # Forked from the parent: drop inherited pooled connections without closing them
+    engine.dispose(close=False)
+    try:
+        return import_from_zip(zip_path, shapefile_name, table_name, engine)
+    finally:
+        engine.dispose()
+
+def main():
     logger.info("🚀 BATCH IMPORT FROM ZIP FILES")
     logger.info("=" * 60)
     
     total_imported = 0
     
-    # 1. Parcels (Base Layer)
-    count = import_from_zip(
-        'gurs_data/KN_SLO_STAVBE_SLO_20260111/KN_SLO_PARCELE_SLO_20260111/KN_SLO_PARCELE_SLO_parcele_20260111.zip',
-        'KN_SLO_PARCELE_SLO_PARCELE_poligon.shp',
-        'parcele',
-        engine
-    )
-    total_imported += count
-
-    # 2. Buildable Parcels (Gradbene Parcele)
-    count = import_from_zip(
-        'gurs_data/KN_SLO_STAVBE_SLO_20260111/KN_SLO_PARCELE_SLO_20260111/KN_SLO_PARCELE_SLO_gradbene_parcele_20260111.zip',
-        'KN_SLO_PARCELE_SLO_GRADBENE_PARCELE.shp',
-        'gradbene_parcele',
-        engine
-    )
-    total_imported += count
+    # Layers go to distinct tables, so they load in parallel: GDAL parsing in
+    # one worker overlaps COPY into Postgres in another
+    with ProcessPoolExecutor(max_workers=IMPORT_WORKERS, initializer=_init_worker, initargs=(IMPORT_WORKERS,)) as pool:
+        counts = dict(zip(
+            (table_name for _, _, table_name in ZIP_IMPORTS),
+            pool.map(_import_one, ZIP_IMPORTS)
+        ))
+    total_imported += sum(counts.values())
+    
+    engine = get_engine()
+    if counts['parcele']:
+        logger.info("   -> Refreshing parcel tile source...")
+        refresh_parcel_tiles(engine)
 
-    # 3. Valuation Zones (EMV)
-    emv_dir = 'gurs_data/KN_SLO_STAVBE_SLO_20260111/emv_vredn_cone_17_VSE_2025'
+    # 3. Valuation Zones (EMV), all into one table, so sequential
+    emv_dir = f'{GURS_DIR}/emv_vredn_cone_17_VSE_2025'
     if os.path.exists(emv_dir):
         # Import key zones: Residential (STA), House (HIS), Industrial (IND), Tourism (TUR), Mixed (KME)
         zones = ['STA', 'HIS', 'IND', 'TUR', 'KME']
@@ -174,51 +210,6 @@ def main():
                 total_imported += count
     else:
         logger.warning(f"⚠️ Valuation zones directory not found: {emv_dir}")
-
-    # 4. Building Attributes (critical for search)
-    count = import_from_zip(
-        'gurs_data/KN_SLO_STAVBE_SLO_20260111/KN_SLO_STAVBE_SLO_stavbe_20260111.zip',
-        'KN_SLO_STAVBE_SLO_STAVBE_tocka.shp',
-        'stavbe_attributes',
-        engine
-    )
-    total_imported += count
-    
-    # 5. Building-Parcel Links (critical for linking)
-    count = import_from_zip(
-        'gurs_data/KN_SLO_STAVBE_SLO_20260111/KN_SLO_STAVBE_SLO_stavbe_parcele_20260111.zip',
-        'KN_SLO_STAVBE_SLO_STAVBE_PARCELE_poligon.shp',
-        'stavbe_parcele',
-        engine
-    )
-    total_imported += count
-    
-    # 6. Hydrography - Flowing Water (Lines)
-    count = import_from_zip(
-        'gurs_data/DTM_SLO_HIDROGRAFIJA_20260110/DTM_SLO_HIDROGRAFIJA_HY_TEKOCE_VODE_L_20260110.zip',
-        'DTM_SLO_HIDROGRAFIJA_HY_TEKOCEVODE_L_line.shp',
-        'water_flowing_lines',
-        engine
-    )
-    total_imported += count
-
-    # 7. Hydrography - Flowing Water (Polygons)
-    count = import_from_zip(
-        'gurs_data/DTM_SLO_HIDROGRAFIJA_20260110/DTM_SLO_HIDROGRAFIJA_HY_TEKOCE_VODE_P_20260110.zip',
-        'DTM_SLO_HIDROGRAFIJA_HY_TEKOCEVODE_P_poligon.shp',
-        'water_flowing_polygons',
-        engine
-    )
-    total_imported += count
-
-    # 8. Hydrography - Standing Water
-    count = import_from_zip(
-        'gurs_data/DTM_SLO_HIDROGRAFIJA_20260110/DTM_SLO_HIDROGRAFIJA_HY_STOJECE_VODE_P_20260110.zip',
-        'DTM_SLO_HIDROGRAFIJA_HY_STOJECEVODE_P_poligon.shp',
-        'water_standing',
-        engine
-    )
-    total_imported += count
     
     logger.info("\n" + "=" * 60)
     logger.info(f"✨ BATCH IMPORT COMPLETE!")
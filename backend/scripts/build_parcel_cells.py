@@ -0,0 +1,65 @@
+import os
+import sys
+import logging
+import argparse
+from sqlalchemy import text
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add backend to path to import connection.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.connection import get_engine
+from database.s2_cells import S2_LEVEL, covering_cells, s2_available
+
+# Parcel bounding boxes in WGS84, the input the S2 coverer works on
+PARCEL_BOUNDS_SQL = text("""
+    SELECT id, ST_YMin(b), ST_XMin(b), ST_YMax(b), ST_XMax(b)
+    FROM (SELECT id, ST_Transform(ST_Envelope(geom), 4326) AS b FROM parcele) s;
+""")
+
+INSERT_CELLS_SQL = text("""
+    INSERT INTO parcele_cells (s2_cell, parcela_id) VALUES (:s2_cell, :parcela_id)
+    ON CONFLICT DO NOTHING;
+""")
+
+
+def build_parcel_cells(batch_size):
+    """Rebuild parcele_cells from the current parcele table (run after parcel imports)"""
+    if not s2_available():
+        logger.error("❌ s2geometry is not installed (pip install s2geometry).")
+        sys.exit(1)
+
+    engine = get_engine()
+    total = 0
+
+    # One transaction: lookups keep seeing the old cells until the rebuild commits
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE parcele_cells;"))
+
+        rows = conn.execution_options(stream_results=True).execute(PARCEL_BOUNDS_SQL)
+        batch = []
+        for parcela_id, lat_min, lng_min, lat_max, lng_max in rows:
+            batch.extend(
+                {"s2_cell": cell, "parcela_id": parcela_id}
+                for cell in covering_cells(lat_min, lng_min, lat_max, lng_max)
+            )
+            if len(batch) >= batch_size:
+                conn.execute(INSERT_CELLS_SQL, batch)
+                total += len(batch)
+                batch = []
+                logger.info(f"   ... {total} cells")
+
+        if batch:
+            conn.execute(INSERT_CELLS_SQL, batch)
+            total += len(batch)
+
+    logger.info(f"✨ parcele_cells rebuilt: {total} level-{S2_LEVEL} cells")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index parcels by the S2 cells they cover")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    build_parcel_cells(args.batch_size)
@@ -0,0 +1,76 @@
+import os
+import sys
+import math
+import logging
+import argparse
+from sqlalchemy import text
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add backend to path to import connection.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.connection import get_engine
+
+# Half the width of the Web Mercator world (EPSG:3857), in meters
+WEB_MERCATOR_HALF = 20037508.342789244
+
+# One tile column per statement: renders every non-empty tile in x = :x
+RENDER_COLUMN_SQL = text("""
+    INSERT INTO tile_cache (z, x, y, mvt)
+    SELECT :z, :x, y, parcel_mvt(:z, :x, y)
+    FROM generate_series(:y_min, :y_max) AS y
+    WHERE EXISTS (
+        SELECT 1 FROM parcele_tiles WHERE geom_3857 && ST_TileEnvelope(:z, :x, y)
+    )
+    ON CONFLICT (z, x, y) DO UPDATE SET mvt = EXCLUDED.mvt, rendered_at = CURRENT_TIMESTAMP;
+""")
+
+
+def tile_range(extent, z):
+    """Tile x/y ranges covering a 3857 extent (xmin, ymin, xmax, ymax) at zoom z"""
+    xmin, ymin, xmax, ymax = extent
+    size = 2 * WEB_MERCATOR_HALF / (1 << z)
+    x_min = int(math.floor((xmin + WEB_MERCATOR_HALF) / size))
+    x_max = int(math.floor((xmax + WEB_MERCATOR_HALF) / size))
+    # Tile rows count down from the top edge
+    y_min = int(math.floor((WEB_MERCATOR_HALF - ymax) / size))
+    y_max = int(math.floor((WEB_MERCATOR_HALF - ymin) / size))
+    return x_min, x_max, y_min, y_max
+
+
+def build_tile_cache(min_zoom, max_zoom):
+    """Pre-render the parcel tile pyramid into tile_cache"""
+    engine = get_engine()
+
+    with engine.connect() as conn:
+        extent = conn.execute(text("""
+            SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+            FROM (SELECT ST_Extent(geom_3857) AS e FROM parcele_tiles) s;
+        """)).fetchone()
+
+    if extent is None or extent[0] is None:
+        logger.warning("⚠️ parcele_tiles is empty, nothing to render.")
+        return
+
+    for z in range(min_zoom, max_zoom + 1):
+        x_min, x_max, y_min, y_max = tile_range(extent, z)
+        logger.info(f"🗺️ Zoom {z}: columns {x_min}-{x_max}, rows {y_min}-{y_max}")
+
+        for x in range(x_min, x_max + 1):
+            # Commit per column so progress survives interruptions
+            with engine.begin() as conn:
+                conn.execute(RENDER_COLUMN_SQL, {"z": z, "x": x, "y_min": y_min, "y_max": y_max})
+
+        logger.info(f"   ✅ Zoom {z} done")
+
+    logger.info("✨ Tile cache build complete!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render parcel vector tiles into tile_cache")
+    parser.add_argument("--min-zoom", type=int, default=14)
+    parser.add_argument("--max-zoom", type=int, default=18)
+    args = parser.parse_args()
+
+    build_tile_cache(args.min_zoom, args.max_zoom)
@@ -0,0 +1,238 @@
+import io
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+from sqlalchemy import create_engine, event, inspect, text
+
+SRID = 3794
+
+# Session settings for one-shot loads: a crash loses at most the last commits,
+# which a rerun from the source files restores
+BULK_SESSION_SETTINGS = {
+    'synchronous_commit': 'off',
+    'work_mem': '256MB',
+    'maintenance_work_mem': '1GB',
+}
+
+# Pool for the import scripts: parallel workers each hold a COPY connection
+# plus metadata queries; pre-ping drops connections the server timed out
+BULK_POOL_OPTIONS = {
+    'pool_size': 8,
+    'max_overflow': 4,
+    'pool_pre_ping': True,
+    # Any remaining executemany (e.g. to_postgis) sent as multi-row VALUES pages
+    'executemany_mode': 'values_plus_batch',
+    'insertmanyvalues_page_size': 10000,
+}
+
+# Natural keys of tables with a unique constraint on them (parcele.unique_parcela);
+# merge_staging_table keeps one staged row per key and skips keys already loaded
+UNIQUE_KEYS = {'parcele': ('parcela_stevilka', 'ko_sifra')}
+
+# Single type id -> vectorized multi constructor, for loading into MULTI* geometry columns
+_MULTI_TYPES = {0: shapely.multipoints, 1: shapely.multilinestrings, 3: shapely.multipolygons}
+
+
+@lru_cache(maxsize=None)
+def create_bulk_engine(url):
+    """
+    Engine whose connections are tuned for bulk loading (BULK_SESSION_SETTINGS)
+
+    Commits (one per COPY chunk) return without waiting for the WAL flush.
+    Set on connect, so every pooled connection gets them. One engine per URL
+    per process: repeated get_engine() calls share its pool.
+    """
+    engine = create_engine(url, **BULK_POOL_OPTIONS)
+
+    @event.listens_for(engine, 'connect')
+    def _tune_session(dbapi_connection, connection_record):
+        with dbapi_connection.cursor() as cur:
+            for name, value in BULK_SESSION_SETTINGS.items():
+                cur.execute("SELECT set_config(%s, %s, false)", (name, value))
+        dbapi_connection.commit()
+
+    return engine
+
+
+def repeated_category(value, n):
+    """Length-n categorical of one value: int8 codes instead of n string references"""
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[value])
+
+
+def ensure_timestamp_defaults(table_name, engine):
+    """
+    created_at/updated_at filled by Postgres (DEFAULT CURRENT_TIMESTAMP)
+
+    Import chunks leave both columns out, so no N-row timestamp columns are
+    built, encoded and sent; adds them to tables to_postgis created without.
+    The catalog is checked first: ALTER TABLE takes an ACCESS EXCLUSIVE lock,
+    so a live table that already has both defaults is left alone.
+    """
+    with engine.begin() as conn:
+        defaults = dict(conn.execute(text(
+            "SELECT column_name, column_default FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table "
+            "AND column_name IN ('created_at', 'updated_at');"
+        ), {'table': table_name}).all())
+        for column in ('created_at', 'updated_at'):
+            if column not in defaults:
+                conn.execute(text(
+                    f"ALTER TABLE {table_name} ADD COLUMN {column} TIMESTAMP DEFAULT CURRENT_TIMESTAMP;"
+                ))
+            elif defaults[column] is None:
+                conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column} SET DEFAULT CURRENT_TIMESTAMP;"))
+
+
+def copy_gdf(gdf, table_name, engine, srid=SRID):
+    """
+    Append a GeoDataFrame to table_name with COPY ... FROM STDIN
+
+    One COPY per chunk instead of to_postgis' batched INSERTs: no per-row
+    parse/plan and no per-row WKBElement binding. Geometries are serialized
+    to hex EWKB in one vectorized shapely call, which the geometry input
+    function reads directly. A missing table is created by to_postgis from
+    the chunk's (empty) schema.
+    """
+    if not inspect(engine).has_table(table_name):
+        gdf.iloc[:0].to_postgis(table_name, engine, if_exists='append', index=False, dtype={'geom': 'Geometry'})
+        ensure_timestamp_defaults(table_name, engine)
+
+    geom_col = gdf.geometry.name
+    df = pd.DataFrame(gdf.drop(columns=geom_col))
+    geoms = np.asarray(gdf.geometry.values)
+    if (_target_geometry_type(table_name, geom_col, engine) or '').startswith('MULTI'):
+        geoms = _promote_to_multi(geoms.copy())
+    df[geom_col] = shapely.to_wkb(shapely.set_srid(geoms, srid), hex=True, include_srid=True)
+
+    # Integer columns read as float because of NULLs ("1974.0") would fail INTEGER input
+    for col in df.columns:
+        values = df[col]
+        if values.dtype.kind == 'f' and values.dropna().mod(1).eq(0).all():
+            df[col] = values.astype('Int64')
+
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+
+    columns = ', '.join(f'"{c}"' for c in df.columns)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            cur.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV)', buf)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _target_geometry_type(table_name, geom_col, engine):
+    """Declared geometry type of a column (e.g. 'MULTIPOLYGON'), None if unregistered"""
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT type FROM geometry_columns WHERE f_table_name = :table AND f_geometry_column = :col"),
+            {'table': table_name, 'col': geom_col}
+        ).scalar()
+
+
+def _promote_to_multi(geoms):
+    """Wrap single geometries as one-part multis, as to_postgis does for mixed layers"""
+    type_ids = shapely.get_type_id(geoms)
+    for single, multi in _MULTI_TYPES.items():
+        mask = type_ids == single
+        count = np.count_nonzero(mask)
+        if count:
+            # indices: part i goes into output geometry i, in one GEOS loop
+            geoms[mask] = multi(geoms[mask], indices=np.arange(count))
+    return geoms
+
+
+def dump_sample(gdf, table_name, engine, out=None):
+    """
+    Load gdf into a throwaway copy of table_name and print it as CSV
+
+    For checking an importer's mapping on a few features (--sample N): rows
+    go through the same COPY path into {table_name}_sample (UNLOGGED, same
+    columns, defaults and generated columns), are written back with
+    COPY ... TO STDOUT, and the table is dropped. table_name itself is never
+    written, and its id sequences aren't advanced: serial columns of the
+    sample draw from an identity sequence of their own.
+    """
+    sample = f"{table_name}_sample"
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {sample};"))
+        if inspect(conn).has_table(table_name):
+            conn.execute(text(
+                f"CREATE UNLOGGED TABLE {sample} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING GENERATED);"
+            ))
+            serial_columns = conn.execute(text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table "
+                "AND column_default LIKE 'nextval(%';"
+            ), {'table': sample}).scalars().all()
+            for column in serial_columns:
+                conn.execute(text(
+                    f'ALTER TABLE {sample} ALTER COLUMN "{column}" DROP DEFAULT, '
+                    f'ALTER COLUMN "{column}" ADD GENERATED BY DEFAULT AS IDENTITY;'
+                ))
+    try:
+        copy_gdf(gdf, sample, engine)
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(f"COPY {sample} TO STDOUT WITH (FORMAT CSV, HEADER)", out or sys.stdout)
+        finally:
+            raw.close()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {sample};"))
+
+
+def create_staging_table(table_name, engine):
+    """
+    UNLOGGED, index-free copy of table_name's columns to COPY chunks into
+
+    Returns the staging table name, or None when table_name doesn't exist yet
+    (the first chunk then creates it directly). Chunks skip WAL and index
+    maintenance; merge_staging_table moves the rows over in one statement.
+    The copy has column names and types only (CREATE TABLE AS ... WITH NO
+    DATA): no defaults, so staged rows don't draw ids from table_name's
+    sequence, and no generated expressions or constraints. The merge lists
+    the chunk columns, so ids, timestamps and generated columns come from
+    table_name on insert.
+    """
+    if not inspect(engine).has_table(table_name):
+        return None
+    ensure_timestamp_defaults(table_name, engine)
+    staging = f"{table_name}_stg"
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging};"))
+        conn.execute(text(
+            f"CREATE UNLOGGED TABLE {staging} WITH (autovacuum_enabled = false) "
+            f"AS SELECT * FROM {table_name} WITH NO DATA;"
+        ))
+    return staging
+
+
+def merge_staging_table(staging, table_name, columns, engine):
+    """
+    Move the staged rows into table_name in one transaction and drop the staging table
+
+    For tables in UNIQUE_KEYS, duplicates are resolved in the same statement:
+    DISTINCT ON keeps one staged row per key, ON CONFLICT DO NOTHING
+    skips keys the table already has. Without it one repeated key would
+    abort the whole merge.
+    """
+    # Explicit columns: generated columns (e.g. parcele.geom_3857) are computed on insert
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    select = f"SELECT {column_list} FROM {staging}"
+    conflict = ""
+    key = UNIQUE_KEYS.get(table_name)
+    if key and set(key) <= set(columns):
+        key_list = ', '.join(f'"{c}"' for c in key)
+        select = f"SELECT DISTINCT ON ({key_list}) {column_list} FROM {staging} ORDER BY {key_list}"
+        conflict = f" ON CONFLICT ({key_list}) DO NOTHING"
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {table_name} ({column_list}) {select}{conflict};"))
+        conn.execute(text(f"DROP TABLE {staging};"))
@@ -2,7 +2,7 @@
 import os
 import sys
 import zipfile
-import geopandas as gpd
+import pyogrio
 
 def check_headers(data_dir):
     # Find the zip
@@ -19,15 +19,15 @@ def check_headers(data_dir):
 
     print(f"📦 Zip: {zip_path}")
     
-    # Read first row
+    # Read the layer header only (field names from the .dbf), no features
     try:
         with zipfile.ZipFile(zip_path, 'r') as zf:
              shps = [n for n in zf.namelist() if n.endswith("PARCELE_poligon.shp")]
              shp_name = shps[0]
              
         full_path = f"zip://{zip_path}!{shp_name}"
-        gdf = gpd.read_file(full_path, rows=1)
-        print(f"📊 COLUMNS: {list(gdf.columns)}")
+        info = pyogrio.read_info(full_path)
+        print(f"📊 COLUMNS: {list(info['fields']) + ['geometry']}")
     except Exception as e:
         print(f"❌ Error: {e}")
 
@@ -0,0 +1,115 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pyogrio
+import shapely
+import geopandas as gpd
+from pyproj import CRS, Transformer
+from pyproj.network import set_network_enabled
+
+# Transformers use the locally installed grids only: never block an import
+# on downloading PROJ grid files
+set_network_enabled(False)
+
+# Features per chunk: large enough for efficient inserts, small enough that
+# peak memory is a few hundred MB instead of the whole national dataset
+CHUNK_SIZE = 50000
+
+# Threads splitting a chunk's coordinates; PROJ releases the GIL while transforming.
+# Import process pools divide the cores between workers (set_reproject_threads)
+REPROJECT_THREADS = os.cpu_count() or 1
+
+# Below this many vertices one call beats the thread hand-off
+MIN_THREADED_POINTS = 100000
+
+_local = threading.local()
+
+# (pid, executor): one long-lived pool per process, so its threads keep their
+# cached transformers across chunks; a forked worker builds its own
+_pool = (None, None)
+
+
+def read_chunks(path, chunksize=CHUNK_SIZE, columns=None):
+    """
+    Yield a vector file (shapefile, zip:// URL, ...) as GeoDataFrames of at
+    most chunksize features
+
+    The file is opened once and streamed as Arrow record batches, so only one
+    chunk is in memory at a time and each chunk continues where the last one
+    stopped (skip_features would rescan a zip from the start for every chunk).
+    columns limits the attribute fields decoded (None = all).
+    """
+    with pyogrio.open_arrow(path, columns=columns, batch_size=chunksize) as (meta, reader):
+        geometry_name = meta['geometry_name'] or 'wkb_geometry'
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            df = batch.to_pandas()
+            geometry = shapely.from_wkb(df.pop(geometry_name).values)
+            yield gpd.GeoDataFrame(df, geometry=geometry, crs=meta['crs'])
+
+
+@lru_cache(maxsize=None)
+def _epsg_code(crs):
+    return CRS.from_user_input(crs).to_epsg()
+
+
+def _transformer(source_crs, target_crs):
+    """This thread's Transformer (pyproj transformers must not be shared across threads)"""
+    transformers = _local.__dict__.setdefault('transformers', {})
+    key = (source_crs, target_crs)
+    if key not in transformers:
+        transformers[key] = Transformer.from_crs(source_crs, target_crs, always_xy=True)
+    return transformers[key]
+
+
+def set_reproject_threads(workers):
+    """Split the reprojection threads between import processes (call in each worker)"""
+    global REPROJECT_THREADS
+    REPROJECT_THREADS = max(1, (os.cpu_count() or 1) // workers)
+
+
+def _executor():
+    global _pool
+    pid, pool = _pool
+    if pid != os.getpid():
+        pool = ThreadPoolExecutor(max_workers=REPROJECT_THREADS, thread_name_prefix='reproject')
+        _pool = (os.getpid(), pool)
+    return pool
+
+
+def _transform_coords(xy, source_crs, target_crs):
+    """Transform an (N, 2) coordinate array, split across REPROJECT_THREADS threads"""
+    def transform(part):
+        x, y = _transformer(source_crs, target_crs).transform(part[:, 0], part[:, 1])
+        return np.column_stack((x, y))
+
+    if REPROJECT_THREADS == 1 or len(xy) < MIN_THREADED_POINTS:
+        return transform(xy)
+    parts = _executor().map(transform, np.array_split(xy, REPROJECT_THREADS))
+    return np.concatenate(list(parts))
+
+
+def reproject(gdf, target_crs="EPSG:3794"):
+    """
+    Reproject a chunk with bulk PROJ calls over all its vertices
+
+    shapely.transform hands every coordinate of every geometry to the
+    transformer as one (N, 2) float64 array and writes the result back;
+    large arrays are transformed in parallel slices. CRSs are compared by
+    EPSG code, so WKT variants of the target are not reprojected; a chunk
+    without a CRS (shapefile without .prj) is taken to be in the target.
+    """
+    if gdf.crs is None:
+        return gdf.set_crs(target_crs)
+    if gdf.crs.to_epsg() == _epsg_code(target_crs):
+        return gdf
+    source_crs = gdf.crs.to_wkt()
+    geoms = shapely.transform(
+        np.asarray(gdf.geometry.values),
+        lambda xy: _transform_coords(xy, source_crs, target_crs)
+    )
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=target_crs, name=gdf.geometry.name))
@@ -1,10 +1,14 @@
 import os
 import sys
 import logging
+import argparse
 import geopandas as gpd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import pandas as pd
 
+from chunked_reader import read_chunks, reproject
+from bulk_copy import copy_gdf, create_bulk_engine, create_staging_table, dump_sample, merge_staging_table
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -14,68 +18,76 @@ def get_engine():
     if not DATABASE_URL:
         logger.error("❌ DATABASE_URL missing.")
         sys.exit(1)
-    return create_engine(DATABASE_URL)
+    return create_bulk_engine(DATABASE_URL)
 
-def import_buildings(shapefile_path, engine):
-    """Import building footprints from shapefile"""
+def prepare_chunk(gdf, offset):
+    """Map one chunk of building features to the stavbe schema"""
+    # Check CRS
+    gdf = reproject(gdf, "EPSG:3794")
+    
+    # stavbe table needs: stavba_id, parcela_id, leto_izgradnje, neto_tloris, geom
+    df_import = pd.DataFrame()
+    
+    # Try to map common column names
+    if 'STAVBA_ID' in gdf.columns:
+        df_import['stavba_id'] = gdf['STAVBA_ID']
+    elif 'ID' in gdf.columns:
+        df_import['stavba_id'] = gdf['ID']
+    else:
+        # Sequential ids continue across chunks
+        df_import['stavba_id'] = range(offset + 1, offset + len(gdf) + 1)
+    
+    df_import['geom'] = gdf['geometry']
+    
+    # created_at/updated_at come from the column defaults (ensure_timestamp_defaults)
+    
+    # Convert to GeoDataFrame
+    return gpd.GeoDataFrame(df_import, geometry='geom', crs="EPSG:3794")
+
+def import_buildings(shapefile_path, engine, sample=None):
+    """Import building footprints from shapefile, streamed in chunks"""
     logger.info("\n🏢 STARTING BUILDINGS IMPORT...")
     logger.info(f"   📂 Reading: {os.path.basename(shapefile_path)}")
     
+    if sample:
+        # Dry run: read only the first features and print them as loaded
+        logger.info(f"   🔎 Sampling {sample} buildings (stavbe is not modified)...")
+        gdf = next(read_chunks(shapefile_path, chunksize=sample), None)
+        if gdf is not None:
+            dump_sample(prepare_chunk(gdf, 0), 'stavbe', engine)
+        return
+    
     try:
-        # Read shapefile
-        gdf = gpd.read_file(shapefile_path)
-        logger.info(f"   ✅ Loaded {len(gdf)} buildings")
-        
-        # Check CRS
-        if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
-            logger.info(f"   -> Reprojecting from {gdf.crs} to EPSG:3794...")
-            gdf = gdf.to_crs("EPSG:3794")
+        total = 0
+        columns = []
         
-        # Show columns
-        logger.info(f"   ℹ️  Columns: {list(gdf.columns)}")
+        # Chunks land in an unlogged, index-free staging table when stavbe exists
+        staging = create_staging_table('stavbe', engine)
         
-        # Sample data
-        logger.info("\n   Sample building:")
-        for col in gdf.columns[:5]:
-            logger.info(f"      {col}: {gdf[col].iloc[0]}")
+        # One chunk in memory at a time: read, map, insert, drop
+        for gdf in read_chunks(shapefile_path):
+            if total == 0:
+                # Show columns
+                logger.info(f"   ℹ️  Columns: {list(gdf.columns)}")
+                
+                # Sample data
+                logger.info("\n   Sample building:")
+                for col in gdf.columns[:5]:
+                    logger.info(f"      {col}: {gdf[col].iloc[0]}")
+                
+                logger.info("   -> Inserting into database (this will take several minutes)...")
+            
+            gdf_import = prepare_chunk(gdf, total)
+            copy_gdf(gdf_import, staging or 'stavbe', engine)
+            columns = list(gdf_import.columns)
+            total += len(gdf_import)
+            logger.info(f"   ... {total} buildings")
         
-        # Map to database schema
-        # stavbe table needs: stavba_id, parcela_id, leto_izgradnje, neto_tloris, geom
-        logger.info("\n   -> Preparing for database import...")
+        if staging:
+            logger.info("   -> Moving staged rows into stavbe...")
+            merge_staging_table(staging, 'stavbe', columns, engine)
         
-        df_import = pd.DataFrame()
-        
-        # Try to map common column names
-        if 'STAVBA_ID' in gdf.columns:
-            df_import['stavba_id'] = gdf['STAVBA_ID']
-        elif 'ID' in gdf.columns:
-            df_import['stavba_id'] = gdf['ID']
-        else:
-            df_import['stavba_id'] = range(1, len(gdf) + 1)
-        
-        df_import['geom'] = gdf['geometry']
-        
-        # Add timestamps
-        now = pd.Timestamp.now()
-        df_import['created_at'] = now
-        df_import['updated_at'] = now
-        
-        # Convert to GeoDataFrame
-        gdf_import = gpd.GeoDataFrame(df_import, geometry='geom', crs="EPSG:3794")
-        
-        # Insert into database
-        logger.info("   -> Inserting into database (this will take several minutes)...")
-        
-        gdf_import.to_postgis(
-            'stavbe',
-            engine,
-            if_exists='append',
-            index=False,
-            dtype={'geom': 'Geometry'},
-            chunksize=5000
-        )
-        
-        logger.info(f"\n🎉 Successfully imported {len(gdf)} buildings!")
+        logger.info(f"\n🎉 Successfully imported {total} buildings!")
         
     except Exception as e:
         logger.error(f"   ❌ Error: {e}")
@@ -83,14 +95,15 @@ def import_buildings(shapefile_path, engine):
         traceback.print_exc()
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python import_buildings.py <shapefile_path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Import building footprints into stavbe")
+    parser.add_argument("shapefile_path")
+    parser.add_argument("--sample", type=int, metavar="N",
+                        help="load only the first N buildings into a temporary table and print them")
+    args = parser.parse_args()
     
-    shapefile = sys.argv[1]
     engine = get_engine()
     
-    import_buildings(shapefile, engine)
+    import_buildings(args.shapefile_path, engine, sample=args.sample)
     
     logger.info("\n✨ Buildings import complete!")
 
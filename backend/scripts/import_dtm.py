@@ -1,8 +1,14 @@
 import os
 import sys
+import math
+import fnmatch
 import logging
+from concurrent.futures import ProcessPoolExecutor
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.windows import Window
+import numba
+from numba import njit, prange
 from sqlalchemy import create_engine, text
 import numpy as np
 
@@ -66,24 +72,141 @@ def create_terrain_tables(engine):
     
     logger.info("   ✅ Terrain tables created")
 
+# Tiles processed by import_dtm_data (0 = all)
+DTM_SAMPLE_TILES = int(os.getenv('DTM_SAMPLE_TILES', '3'))
+
+# DTM raster names (various possible formats)
+DTM_PATTERNS = ['*DTM*.tif', '*dmv*.tif', '*DEM*.tif', '*elevation*.tif']
+
+# Compass sectors for the dominant aspect (terrain_cache.aspect)
+ASPECT_SECTORS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+
+# fastmath without nnan/ninf, so nodata NaNs still propagate and can be tested
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def slope_aspect(z, xres, yres):
+    """
+    Slope (degrees) and aspect (compass degrees, downslope direction) by
+    central differences; NaN on the border, at nodata and (aspect) on flats.
+    """
+    rows, cols = z.shape
+    slope = np.full((rows, cols), np.nan, dtype=np.float32)
+    aspect = np.full((rows, cols), np.nan, dtype=np.float32)
+    for r in prange(1, rows - 1):
+        for c in range(1, cols - 1):
+            dzdx = (z[r, c + 1] - z[r, c - 1]) / (2.0 * xres)
+            # Rows run south, so this is -dz/dnorth
+            dzdy = (z[r + 1, c] - z[r - 1, c]) / (2.0 * yres)
+            slope[r, c] = math.degrees(math.atan(math.sqrt(dzdx * dzdx + dzdy * dzdy)))
+            if dzdx != 0.0 or dzdy != 0.0:
+                aspect[r, c] = (math.degrees(math.atan2(-dzdx, dzdy)) + 360.0) % 360.0
+    return slope, aspect
+
+@njit(cache=True)
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Combine two (count, mean, M2) partials (Chan et al.)"""
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def nan_stats(a):
+    """
+    Count, min, max, mean and M2 (sum of squared deviations) of the non-NaN
+    values in one pass over a 2-D array, instead of one pass per statistic
+    
+    Rows are reduced in parallel (Welford per row), then merged.
+    """
+    rows, cols = a.shape
+    counts = np.zeros(rows, dtype=np.int64)
+    mins = np.full(rows, np.inf)
+    maxs = np.full(rows, -np.inf)
+    means = np.zeros(rows)
+    m2s = np.zeros(rows)
+    for r in prange(rows):
+        n, mn, mx, mean, m2 = 0, np.inf, -np.inf, 0.0, 0.0
+        for c in range(cols):
+            x = a[r, c]
+            if not np.isnan(x):
+                n += 1
+                delta = x - mean
+                mean += delta / n
+                m2 += delta * (x - mean)
+                mn = min(mn, x)
+                mx = max(mx, x)
+        counts[r], mins[r], maxs[r], means[r], m2s[r] = n, mn, mx, mean, m2
+    
+    n, mean, m2 = 0, 0.0, 0.0
+    for r in range(rows):
+        n, mean, m2 = _merge_moments(n, mean, m2, counts[r], means[r], m2s[r])
+    return n, mins.min() if rows else np.inf, maxs.max() if rows else -np.inf, mean, m2
+
 def process_dtm_tile(dtm_file):
-    """Process a single DTM tile and extract statistics"""
+    """
+    Process a single DTM tile and extract statistics
+
+    Reads one raster block at a time (plus a 1-pixel halo for the slope
+    differences), so peak memory is a block, not the whole tile.
+    """
     logger.info(f"   -> Processing: {os.path.basename(dtm_file)}")
     
     try:
         with rasterio.open(dtm_file) as src:
-            # Read elevation data
-            elevation = src.read(1)
+            xres, yres = src.res
+            bounds = Window(0, 0, src.width, src.height)
+            
+            elev_min, elev_max = np.inf, -np.inf
+            count, mean, m2 = 0, 0.0, 0.0
+            slope_sum, slope_count = 0.0, 0
+            aspect_sin, aspect_cos = 0.0, 0.0
+            
+            for _, win in src.block_windows(1):
+                halo = Window(win.col_off - 1, win.row_off - 1, win.width + 2, win.height + 2).intersection(bounds)
+                z = src.read(1, window=halo, masked=True).astype(np.float32).filled(np.nan)
+                
+                # The block itself inside the halo read
+                r0, c0 = win.row_off - halo.row_off, win.col_off - halo.col_off
+                block = z[r0:r0 + win.height, c0:c0 + win.width]
+                n_b, min_b, max_b, mean_b, m2_b = nan_stats(block)
+                if n_b:
+                    elev_min = min(elev_min, float(min_b))
+                    elev_max = max(elev_max, float(max_b))
+                    count, mean, m2 = _merge_moments(count, mean, m2, n_b, mean_b, m2_b)
+                
+                slope, aspect = slope_aspect(z, xres, yres)
+                slope = slope[r0:r0 + win.height, c0:c0 + win.width]
+                aspect = aspect[r0:r0 + win.height, c0:c0 + win.width]
+                n_s, _, _, mean_s, _ = nan_stats(slope)
+                slope_sum += mean_s * n_s
+                slope_count += n_s
+                aspect_rad = np.radians(aspect[~np.isnan(aspect)])
+                aspect_sin += float(np.sin(aspect_rad).sum())
+                aspect_cos += float(np.cos(aspect_rad).sum())
+            
+            if count == 0:
+                logger.warning("      ⚠️  Tile has no valid elevation data")
+                return None
+            
+            # Dominant downslope direction: circular mean of the pixel aspects
+            mean_aspect = (np.degrees(np.arctan2(aspect_sin, aspect_cos)) + 360.0) % 360.0
             
             # Calculate basic statistics
             stats = {
-                'min': float(np.nanmin(elevation)),
-                'max': float(np.nanmax(elevation)),
-                'mean': float(np.nanmean(elevation)),
-                'std': float(np.nanstd(elevation))
+                'min': elev_min,
+                'max': elev_max,
+                'mean': mean,
+                'std': float(np.sqrt(m2 / count)),
+                'count': count,
+                'avg_slope': slope_sum / slope_count if slope_count else None,
+                'aspect': ASPECT_SECTORS[int((mean_aspect + 22.5) // 45) % 8] if aspect_sin or aspect_cos else None,
             }
             
             logger.info(f"      Elevation: {stats['min']:.1f}m - {stats['max']:.1f}m (avg: {stats['mean']:.1f}m)")
+            if stats['avg_slope'] is not None:
+                logger.info(f"      Slope: {stats['avg_slope']:.1f}° avg, facing {stats['aspect']}")
             
             return stats
             
@@ -91,18 +214,21 @@ def process_dtm_tile(dtm_file):
         logger.error(f"      ❌ Error: {e}")
         return None
 
+def _init_worker(workers):
+    """Split the Numba thread pool between the tile processes"""
+    numba.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
 def import_dtm_data(data_dir, engine):
     """Import DTM (Digital Terrain Model) data"""
     logger.info("\n🗻 STARTING DTM IMPORT...")
     
-    # Look for DTM files (various possible formats)
-    dtm_patterns = ['*DTM*.tif', '*dmv*.tif', '*DEM*.tif', '*elevation*.tif']
-    dtm_files = []
-    
-    for pattern in dtm_patterns:
-        import glob
-        found = glob.glob(os.path.join(data_dir, '**', pattern), recursive=True)
-        dtm_files.extend(found)
+    # Look for DTM files (various possible formats); one walk tests every pattern
+    dtm_files = [
+        os.path.join(root, f)
+        for root, _, files in os.walk(data_dir)
+        for f in files
+        if any(fnmatch.fnmatchcase(f, pattern) for pattern in DTM_PATTERNS)
+    ]
     
     if not dtm_files:
         logger.warning("   ⚠️  No DTM files found")
@@ -114,9 +240,22 @@ def import_dtm_data(data_dir, engine):
     
     logger.info(f"   📂 Found {len(dtm_files)} DTM files")
     
-    # Process first few tiles to verify
-    for dtm_file in dtm_files[:3]:
-        process_dtm_tile(dtm_file)
+    # Process the first DTM_SAMPLE_TILES tiles to verify (0 = all), one tile per
+    # process; each worker's Numba kernels get an equal share of the cores
+    sample = dtm_files[:DTM_SAMPLE_TILES] if DTM_SAMPLE_TILES else dtm_files
+    workers = min(len(sample), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+        results = [stats for stats in pool.map(process_dtm_tile, sample) if stats]
+    
+    if results:
+        # Merge per-tile moments into stats over all processed tiles
+        count, mean, m2 = 0, 0.0, 0.0
+        for stats in results:
+            count, mean, m2 = _merge_moments(count, mean, m2, stats['count'], stats['mean'], stats['std'] ** 2 * stats['count'])
+        logger.info(
+            f"   Overall: {min(r['min'] for r in results):.1f}m - {max(r['max'] for r in results):.1f}m "
+            f"(avg: {mean:.1f}m, std: {np.sqrt(m2 / count):.1f}m) over {len(results)} tiles"
+        )
     
     logger.info(f"\n   ℹ️  DTM files are ready for processing")
     logger.info(f"   Next step: Implement terrain analysis algorithms")
@@ -3,9 +3,14 @@ import os
 import sys
 import logging
 import geopandas as gpd
-from sqlalchemy import create_engine
 from geoalchemy2 import Geometry, WKTElement
 
+# Add backend to path to import connection.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.connection import refresh_parcel_tiles
+from chunked_reader import reproject
+from bulk_copy import create_bulk_engine
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -27,14 +32,15 @@ def import_data(file_path, table_name):
 
     logger.info(f"Reading file: {file_path}...")
     try:
-        # Read file using geopandas (supports shp, gpkg, geojson, etc.)
-        gdf = gpd.read_file(file_path)
+        # Read file using geopandas (supports shp, gpkg, geojson, etc.); pyogrio
+        # decodes columnar through Arrow instead of feature-by-feature
+        gdf = gpd.read_file(file_path, engine='pyogrio', use_arrow=True)
         logger.info(f"Loaded {len(gdf)} rows matching CRS: {gdf.crs}")
 
         # Ensure CRS is EPSG:3794 (Slovenian Grid)
-        if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
+        if gdf.crs is not None and gdf.crs.to_epsg() != 3794:
             logger.info("Reprojecting to EPSG:3794...")
-            gdf = gdf.to_crs("EPSG:3794")
+        gdf = reproject(gdf, "EPSG:3794")
 
         # Rename columns to match our schema if necessary
         # This mapping depends on the exact GURS file format
@@ -47,8 +53,8 @@ def import_data(file_path, table_name):
         }
         # gdf = gdf.rename(columns=column_mapping)
 
-        # Create engine
-        engine = create_engine(DATABASE_URL)
+        # Shared, pooled engine (reused across import_data calls)
+        engine = create_bulk_engine(DATABASE_URL)
 
         # Write to PostGIS
         logger.info(f"Writing to table {table_name}...")
@@ -61,6 +67,10 @@ def import_data(file_path, table_name):
         )
         logger.info("Import successful!")
 
+        if table_name == 'parcele':
+            logger.info("Refreshing parcel tile source...")
+            refresh_parcel_tiles(engine)
+
     except Exception as e:
         logger.error(f"Error importing data: {e}")
 
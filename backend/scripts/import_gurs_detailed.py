@@ -2,15 +2,22 @@
 import os
 import sys
 import logging
+import argparse
 import zipfile
 import tempfile
 import shutil
-import pandas as pd
-import geopandas as gpd
-from sqlalchemy import create_engine, text
-from geoalchemy2 import Geometry, WKTElement
+from sqlalchemy import text
 import warnings
 
+# Add backend to path to import connection.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.connection import refresh_parcel_tiles
+import pandas as pd
+from bulk_copy import (
+    copy_gdf, create_bulk_engine, create_staging_table, dump_sample, merge_staging_table, repeated_category
+)
+from chunked_reader import read_chunks, reproject
+
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
@@ -24,17 +31,51 @@ def get_engine():
     if not DATABASE_URL:
         logger.error("❌ DATABASE_URL missing.")
         sys.exit(1)
-    return create_engine(DATABASE_URL)
+    return create_bulk_engine(DATABASE_URL)
+
+def _iter_zips_containing(directory, part_of_name):
+    """Yields zip files containing a specific string in their name, depth-first."""
+    pending = [directory]
+    while pending:
+        subdirs = []
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                # DirEntry carries the type from readdir, so files need no stat()
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif part_of_name in entry.name and entry.name.endswith(".zip"):
+                    yield entry.path
+        pending.extend(reversed(subdirs))
 
 def find_zip_containing(directory, part_of_name):
-    """Finds a zip file containing a specific string in its name."""
-    for root, dirs, files in os.walk(directory):
-        for f in files:
-            if part_of_name in f and f.endswith(".zip"):
-                return os.path.join(root, f)
-    return None
-
-def import_parcels(data_dir, engine):
+    """Finds a zip file containing a specific string in its name; stops at the first match."""
+    return next(_iter_zips_containing(directory, part_of_name), None)
+
+# DBF fields the parcel mapping reads; the rest are never decoded
+PARCEL_FIELDS = ['ST_PARCELE', 'KO_ID', 'POVRSINA']
+
+def prepare_parcel_chunk(gdf):
+    """Reproject one chunk of GURS parcels and map it to parcele's columns"""
+    gdf = reproject(gdf, "EPSG:3794")
+
+    # Map Columns to DB Schema
+    # GURS SHP Headers: [EID_PARCELA, SIGLA, SIFRA_KO, PARCELA, ...]
+    # DB Schema: parcele(parcela_stevilka, ko_sifra, ko_ime, povrsina, geom)
+    
+    # We need KO_IME. The shapefile usually only has SIFRA_KO (Code).
+    # We might need to default 'ko_ime' to 'Unknown' or lookup later.
+    # A chunk holds a few hundred distinct KO codes: categoricals store them
+    # once, and each row as a small integer code
+    ko_sifra = pd.Categorical(gdf.pop('KO_ID'))
+    
+    # Columns are renamed and added in place on the chunk, no second frame is built
+    gdf = gdf.rename(columns={'ST_PARCELE': 'parcela_stevilka', 'POVRSINA': 'povrsina'}).rename_geometry('geom')
+    gdf['ko_sifra'] = ko_sifra.rename_categories(ko_sifra.categories.astype(str))
+    gdf['ko_ime'] = repeated_category('Imported', len(gdf))  # Default placeholder as SHP lacks name
+    gdf['povrsina'] = gdf['povrsina'].astype(float).fillna(0.0)
+    return gdf
+
+def import_parcels(data_dir, engine, sample=None):
     logger.info("\n🚜 STARTING PARCELS IMPORT...")
     
     zip_path = find_zip_containing(data_dir, "KN_SLO_PARCELE_SLO_parcele_")
@@ -52,54 +93,40 @@ def import_parcels(data_dir, engine):
                 return
             shp_name = shps[0]
             
-        full_path = f"zip://{zip_path}!{shp_name}"
-        logger.info(f"   📐 Reading Shapefile (this takes RAM)...")
+        full_path = f"/vsizip/{zip_path}/{shp_name}"
         
-        # Read chunks or full? 800MB might be heavy for full read.
-        # Geopandas reads full file. If 800MB file, it takes ~2-3GB RAM. Should be OK for modern dev machine.
-        gdf = gpd.read_file(full_path)
-        logger.info(f"   ✅ Leaded {len(gdf)} parcels.")
+        if sample:
+            # Dry run: read only the first features and print them as loaded
+            logger.info(f"   🔎 Sampling {sample} parcels (parcele is not modified)...")
+            chunk = next(read_chunks(full_path, chunksize=sample, columns=PARCEL_FIELDS), None)
+            if chunk is not None:
+                dump_sample(prepare_parcel_chunk(chunk), 'parcele', engine)
+            return
         
-        if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
-             logger.info(f"   -> Reprojecting to EPSG:3794...")
-             gdf = gdf.to_crs("EPSG:3794")
-
-        # Map Columns to DB Schema
-        # GURS SHP Headers: [EID_PARCELA, SIGLA, SIFRA_KO, PARCELA, ...]
-        # DB Schema: parcele(parcela_stevilka, ko_sifra, ko_ime, povrsina, geom)
-        
-        # We need KO_IME. The shapefile usually only has SIFRA_KO (Code).
-        # We might need to default 'ko_ime' to 'Unknown' or lookup later.
-        
-        logger.info("   -> Mapping columns (Corrected)...")
-        df_import = pd.DataFrame()
-        df_import['parcela_stevilka'] = gdf['ST_PARCELE'] 
-        df_import['ko_sifra'] = gdf['KO_ID'].astype(str)
-        df_import['ko_ime'] = 'Imported' # Default placeholder as SHP lacks name
-        df_import['povrsina'] = gdf['POVRSINA'].astype(float).fillna(0.0)
-        df_import['geom'] = gdf['geometry']
-        
-        # Explicitly set timestamps to avoid overhead/errors with defaults during COPY
-        now = pd.Timestamp.now()
-        df_import['created_at'] = now
-        df_import['updated_at'] = now
-        
-        # Insert using GeoPandas to_postgis
-        logger.info("   -> Inserting into DB (This may take a few minutes)...")
+        logger.info(f"   📐 Streaming Shapefile in chunks...")
         
-        # Chunksize is important for DB performance
-        df_import =  gpd.GeoDataFrame(df_import, geometry='geom', crs="EPSG:3794")
+        # One chunk (~50k parcels) in memory at a time: read, reproject, map, COPY.
+        # Chunks land in an unlogged staging table; created_at/updated_at come
+        # from the column defaults
+        staging = create_staging_table('parcele', engine)
+        total = 0
+        columns = []
+        for chunk in read_chunks(full_path, columns=PARCEL_FIELDS):
+            df_import = prepare_parcel_chunk(chunk)
+            del chunk
+            copy_gdf(df_import, staging or 'parcele', engine)
+            columns = list(df_import.columns)
+            total += len(df_import)
+            logger.info(f"   ... {total} parcels")
         
-        df_import.to_postgis(
-            'parcele', 
-            engine, 
-            if_exists='append', 
-            index=False, 
-            dtype={'geom': Geometry('POLYGON', srid=3794)},
-            chunksize=5000
-        )
+        if staging:
+            logger.info("   -> Moving staged parcels into parcele...")
+            merge_staging_table(staging, 'parcele', columns, engine)
         
-        logger.info("   🎉 Parcels Imported Successfully!")
+        logger.info(f"   🎉 {total} Parcels Imported Successfully!")
+
+        logger.info("   -> Refreshing parcel tile source...")
+        refresh_parcel_tiles(engine)
         
     except Exception as e:
         logger.error(f"   ❌ Error importing Parcels: {e}")
@@ -115,14 +142,15 @@ def import_buildings(data_dir, engine):
     logger.warning("   -> Strategy: We will proceed with PARCELS ONLY first, as that enables the Map Search.")
     
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python backend/scripts/import_gurs_detailed.py <gurs_data_folder>")
-        sys.exit(1)
-        
-    data_dir = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Import GURS parcels into parcele")
+    parser.add_argument("data_dir", help="GURS data folder")
+    parser.add_argument("--sample", type=int, metavar="N",
+                        help="load only the first N parcels into a temporary table and print them")
+    args = parser.parse_args()
+    
     engine = get_engine()
     
-    import_parcels(data_dir, engine)
+    import_parcels(args.data_dir, engine, sample=args.sample)
     
     logger.info("\n🚀 Process Finished.")
 
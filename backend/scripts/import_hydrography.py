@@ -5,9 +5,14 @@ import logging
 import zipfile
 import tempfile
 import glob
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import geopandas as gpd
-from sqlalchemy import create_engine, text
-from geoalchemy2 import Geometry, WKTElement
+import pyogrio
+from sqlalchemy import text
+
+from bulk_copy import copy_gdf, create_bulk_engine, repeated_category
+from chunked_reader import reproject, set_reproject_threads
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,10 +24,16 @@ def get_engine():
     if not DATABASE_URL:
         logger.error("❌ DATABASE_URL missing.")
         sys.exit(1)
-    return create_engine(DATABASE_URL)
+    return create_bulk_engine(DATABASE_URL)
+
+# Archives imported at once; concurrent COPYs into water_bodies don't block each other
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '4'))
+
+# Memory for the one-off GIST build after the load (the server default is 64MB)
+INDEX_BUILD_MEM = os.getenv('INDEX_BUILD_MEM', '1GB')
 
 def create_table(engine):
-    """Create water_bodies table"""
+    """Create water_bodies table; its GIST index is built after the load (create_geom_index)"""
     with engine.connect() as conn:
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS water_bodies (
@@ -32,10 +43,23 @@ def create_table(engine):
                 geom GEOMETRY(MultiPolygon, 3794),
                 original_file VARCHAR(255)
             );
-            CREATE INDEX IF NOT EXISTS idx_water_bodies_geom ON water_bodies USING GIST(geom);
         """))
         conn.commit()
 
+def drop_geom_index(engine):
+    """Drop the GIST index so COPY doesn't maintain it row by row"""
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS idx_water_bodies_geom;"))
+        conn.commit()
+
+def create_geom_index(engine):
+    """Build the GIST index once over all loaded rows (sorted bulk build)"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT set_config('maintenance_work_mem', :mem, true);"), {'mem': INDEX_BUILD_MEM})
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_water_bodies_geom ON water_bodies USING GIST(geom);"))
+        conn.execute(text("ANALYZE water_bodies;"))
+        conn.commit()
+
 def import_zip(zip_path, engine):
     """Import a single ZIP file containing Shapefiles"""
     filename = os.path.basename(zip_path)
@@ -62,7 +86,10 @@ def import_zip(zip_path, engine):
             logger.info(f"   📄 Reading Shapefile: {shp_name}")
             
             try:
-                gdf = gpd.read_file(shp_file)
+                # Try to find Name field in the header; only it and the geometry are decoded
+                fields = pyogrio.read_info(shp_file)['fields']
+                name_cols = [c for c in fields if 'IME' in c.upper() or 'NAME' in c.upper()]
+                gdf = gpd.read_file(shp_file, engine='pyogrio', use_arrow=True, columns=name_cols[:1])
                 
                 if gdf.empty:
                     logger.warning("      ⚠️ Unknown CRS or empty file. Skipping.")
@@ -81,46 +108,59 @@ def import_zip(zip_path, engine):
                         logger.error(f"      ❌ No geometry column found in {shp_name}")
                         continue
 
-                # Ensure CRS is correct (GURS is usually EPSG:3794 or 3912)
-                if gdf.crs is None:
-                    # Assume 3794 if not set, or let user define
-                    gdf.set_crs(epsg=3794, inplace=True) 
+                # Ensure CRS is correct (GURS is usually EPSG:3794 or 3912): D48 sources
+                # are reprojected, a file without a CRS is taken to be in 3794
+                gdf = reproject(gdf)
                 
                 # We need to standardize columns
                 # GURS usually has 'IME' for name. 
                 # We will map whatever we can to our schema.
                 
+                # Per-file constants are categoricals: one string, int8 codes per row
                 target_gdf = gpd.GeoDataFrame()
                 target_gdf['geom'] = gdf.geometry
-                target_gdf['original_file'] = filename
+                target_gdf['original_file'] = repeated_category(filename, len(gdf))
                 
                 # Infer type from filename
                 if 'TEKOCE' in filename:
-                    target_gdf['type'] = 'RUNNING_WATER'
+                    water_type = 'RUNNING_WATER'
                 elif 'STOJECE' in filename:
-                    target_gdf['type'] = 'STANDING_WATER'
+                    water_type = 'STANDING_WATER'
                 elif 'MOKROTNE' in filename:
-                    target_gdf['type'] = 'WETLAND'
+                    water_type = 'WETLAND'
                 elif 'MORJE' in filename:
-                    target_gdf['type'] = 'SEA'
+                    water_type = 'SEA'
                 else:
-                    target_gdf['type'] = 'OTHER'
+                    water_type = 'OTHER'
+                target_gdf['type'] = repeated_category(water_type, len(gdf))
 
-                # Try to find Name field
-                name_cols = [c for c in gdf.columns if 'IME' in c.upper() or 'NAME' in c.upper()]
                 if name_cols:
                     target_gdf['name'] = gdf[name_cols[0]]
                 else:
                     target_gdf['name'] = None
 
-                # Write to DB
+                # Write to DB (COPY promotes polygons to the column's MultiPolygon)
                 logger.info(f"      💾 Writing {len(target_gdf)} features to DB...")
-                target_gdf.to_postgis('water_bodies', engine, if_exists='append', index=False, dtype={'geom': Geometry('MultiPolygon', srid=3794)})
+                copy_gdf(target_gdf.set_geometry('geom'), 'water_bodies', engine)
                 logger.info("      ✅ Done.")
 
             except Exception as e:
                 logger.error(f"      ❌ Error importing {shp_name}: {e}")
 
+def _init_worker(workers):
+    """Split the reprojection threads between the archive processes"""
+    set_reproject_threads(workers)
+
+def _import_one(zip_path):
+    """Worker: import one archive over the worker's own connections"""
+    engine = get_engine()
+    # Forked from the parent: drop inherited pooled connections without closing them
+    engine.dispose(close=False)
+    try:
+        import_zip(zip_path, engine)
+    finally:
+        engine.dispose()
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python import_hydrography.py <data_folder>")
@@ -131,16 +171,22 @@ def main():
     
     # Initialize DB
     create_table(engine)
+    drop_geom_index(engine)
     
     # Find all ZIPs
     # Prioritize Polygons (_P_)
-    search_pattern = os.path.join(data_dir, "**", "*_P_*.zip")
-    zip_files = glob.glob(search_pattern, recursive=True)
+    zip_files = [str(path) for path in Path(data_dir).rglob("*_P_*.zip")]
     
     logger.info(f"Found {len(zip_files)} ZIP files to import.")
     
-    for zip_file in zip_files:
-        import_zip(zip_file, engine)
+    # Archives are independent; table DDL ran above, in the parent
+    if zip_files:
+        workers = min(IMPORT_WORKERS, len(zip_files))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+            list(pool.map(_import_one, zip_files))
+    
+    logger.info("🗂️ Building spatial index...")
+    create_geom_index(engine)
         
     logger.info("🌊 Hydrography Import Complete!")
 
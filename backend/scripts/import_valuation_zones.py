@@ -2,9 +2,11 @@ import os
 import sys
 import logging
 import geopandas as gpd
-from sqlalchemy import create_engine, text
 import glob
 
+from bulk_copy import copy_gdf, create_bulk_engine, repeated_category
+from chunked_reader import reproject
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -14,7 +16,28 @@ def get_engine():
     if not DATABASE_URL:
         logger.error("❌ DATABASE_URL missing.")
         sys.exit(1)
-    return create_engine(DATABASE_URL)
+    return create_bulk_engine(DATABASE_URL)
+
+# Map zone codes to categories
+ZONE_CATEGORIES = {
+    'DRZ': 'Državne ceste',
+    'GAR': 'Garaže',
+    'GOZ': 'Gozd',
+    'HIS': 'Hiše',
+    'IND': 'Industrijske',
+    'INP': 'Industrijske parcele',
+    'KDS': 'Kmetijske',
+    'KME': 'Kmetijske',
+    'PNB': 'Poslovne stavbe',
+    'PNE': 'Poslovne enote',
+    'PNP': 'Poslovne parcele',
+    'PPL': 'Parcele',
+    'PPP': 'Parcele',
+    'SDP': 'Stanovanja',
+    'STA': 'Stanovanja',
+    'STZ': 'Stanovanjske zgradbe',
+    'TUR': 'Turistične'
+}
 
 def import_valuation_zones(data_dir, engine):
     """Import GURS valuation zone shapefiles"""
@@ -38,58 +61,22 @@ def import_valuation_zones(data_dir, engine):
         logger.info(f"   -> Processing zone: {zone_code}")
         
         try:
-            # Read shapefile
-            gdf = gpd.read_file(shp_file)
+            # Read shapefile; zone attributes come from the file name, so no DBF fields are decoded
+            gdf = gpd.read_file(shp_file, engine='pyogrio', use_arrow=True, columns=[])
             
             # Ensure correct CRS
-            if gdf.crs and gdf.crs.to_string() != "EPSG:3794":
-                gdf = gdf.to_crs("EPSG:3794")
+            gdf = reproject(gdf, "EPSG:3794")
             
             logger.info(f"      Loaded {len(gdf)} zones")
             
-            # Prepare for database
-            df_import = gdf.copy()
-            df_import['zone_code'] = zone_code
-            
-            # Map zone codes to categories
-            zone_categories = {
-                'DRZ': 'Državne ceste',
-                'GAR': 'Garaže',
-                'GOZ': 'Gozd',
-                'HIS': 'Hiše',
-                'IND': 'Industrijske',
-                'INP': 'Industrijske parcele',
-                'KDS': 'Kmetijske',
-                'KME': 'Kmetijske',
-                'PNB': 'Poslovne stavbe',
-                'PNE': 'Poslovne enote',
-                'PNP': 'Poslovne parcele',
-                'PPL': 'Parcele',
-                'PPP': 'Parcele',
-                'SDP': 'Stanovanja',
-                'STA': 'Stanovanja',
-                'STZ': 'Stanovanjske zgradbe',
-                'TUR': 'Turistične'
-            }
-            
-            df_import['zone_category'] = zone_categories.get(zone_code, 'Other')
-            df_import['geom'] = df_import['geometry']
-            
-            # Select only needed columns
-            cols_to_keep = ['zone_code', 'zone_category', 'geom']
-            df_import = df_import[cols_to_keep]
-            
-            # Convert to GeoDataFrame
-            gdf_import = gpd.GeoDataFrame(df_import, geometry='geom', crs="EPSG:3794")
+            # Only the geometry is read, so the frame is renamed rather than copied;
+            # per-file constants are categoricals
+            gdf_import = gdf.rename_geometry('geom')
+            gdf_import['zone_code'] = repeated_category(zone_code, len(gdf))
+            gdf_import['zone_category'] = repeated_category(ZONE_CATEGORIES.get(zone_code, 'Other'), len(gdf))
             
             # Insert into database
-            gdf_import.to_postgis(
-                'valuation_zones',
-                engine,
-                if_exists='append',
-                index=False,
-                dtype={'geom': 'Geometry'}
-            )
+            copy_gdf(gdf_import, 'valuation_zones', engine)
             
             total_zones += len(gdf)
             logger.info(f"      ✅ Imported {len(gdf)} zones")
@@ -103,17 +90,21 @@ def create_schema(engine):
     """Create valuation tables if they don't exist"""
     logger.info("📋 Creating valuation schema...")
     
-    with engine.connect() as conn:
-        # Read and execute schema file
-        schema_file = os.path.join(os.path.dirname(__file__), '..', 'database', 'valuation_schema.sql')
-        if os.path.exists(schema_file):
-            with open(schema_file, 'r') as f:
-                schema_sql = f.read()
-                conn.execute(text(schema_sql))
-                conn.commit()
-            logger.info("   ✅ Schema created")
-        else:
-            logger.warning("   ⚠️  Schema file not found, tables may not exist")
+    # Read and execute schema file, verbatim on the DBAPI cursor (no bind parsing)
+    schema_file = os.path.join(os.path.dirname(__file__), '..', 'database', 'valuation_schema.sql')
+    if os.path.exists(schema_file):
+        with open(schema_file, 'r') as f:
+            schema_sql = f.read()
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(schema_sql)
+            conn.commit()
+        finally:
+            conn.close()
+        logger.info("   ✅ Schema created")
+    else:
+        logger.warning("   ⚠️  Schema file not found, tables may not exist")
 
 def main():
     if len(sys.argv) < 2:
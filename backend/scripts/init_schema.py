@@ -1,6 +1,5 @@
 import os
 import sys
-from sqlalchemy import text
 
 # Add backend to path to import connection.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -21,14 +20,21 @@ def run_schema_init():
     engine = get_engine()
     
     try:
-        with engine.connect() as conn:
-            # Execute the entire schema as one block if possible, or split if needed.
-            # SQLAlchemy text() usually handles multiple statements for postgres.
-            conn.execute(text(schema_sql))
+        # Sent verbatim on the DBAPI cursor: the server splits the statements, and
+        # text() would treat ':name' inside function bodies and literals as binds
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(schema_sql)
             conn.commit()
-            print("✅ Schema initialized successfully!")
+        finally:
+            conn.close()
+        print("✅ Schema initialized successfully!")
     except Exception as e:
         print(f"❌ Error initializing schema: {e}")
+        # The script runs as one transaction: a failure leaves none of it applied
+        # (e.g. no flood_risk() function), so make it fail the deploy step too
+        sys.exit(1)
 
 if __name__ == "__main__":
     run_schema_init()
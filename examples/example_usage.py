@@ -3,7 +3,7 @@ Example usage of PropertyDetective module
 Demonstrates how to find probable parcels for a real estate listing
 """
 
-import json
+import orjson
 from property_detective import find_probable_parcels
 from property_detective.geojson_utils import save_geojson
 
@@ -20,7 +20,7 @@ listing_data = {
 def main():
     print("🔍 GNEP PropertyDetective - Example Usage\n")
     print("Finding probable parcels for:")
-    print(json.dumps(listing_data, indent=2))
+    print(orjson.dumps(listing_data, option=orjson.OPT_INDENT_2).decode())
     print("\n" + "="*60 + "\n")
     
     # Call PropertyDetective